@@ -3,9 +3,14 @@ Model definitions and configurations
 """
 
 from .llm import get_reasoning_model, get_generation_model, get_embeddings_model
+from .schemas import CastInput, IntentAnalysis, PipelineResponse, ReplyCandidate
 
 __all__ = [
     "get_reasoning_model",
     "get_generation_model",
-    "get_embeddings_model"
+    "get_embeddings_model",
+    "CastInput",
+    "IntentAnalysis",
+    "PipelineResponse",
+    "ReplyCandidate"
 ] 
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Micro-batching of concurrent single-text embedding requests
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+# Returns one vector per text, or an exception for a text that failed on its own
+EmbedBatchFn = Callable[[List[str]], Awaitable[List[Any]]]
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding calls into batched upstream calls.
+
+    Texts submitted within ``max_wait`` seconds of the first pending text (or
+    until ``max_batch_size`` texts are queued) are sent as one request. A text
+    that fails on its own only fails the callers waiting for that text.
+    """
+
+    def __init__(
+        self,
+        embed_batch: EmbedBatchFn,
+        max_batch_size: int = 256,
+        max_wait: float = 0.01,
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> List[float]:
+        """Queue a text and wait for its embedding"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        """Send everything queued so far as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """Embed a batch, sending duplicate texts upstream only once"""
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = await self.embed_batch(unique_texts)
+            by_text = dict(zip(unique_texts, vectors, strict=True))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for text, future in batch:
+            if future.done():
+                continue
+            if isinstance(by_text[text], BaseException):
+                future.set_exception(by_text[text])
+            else:
+                future.set_result(by_text[text])
@@ -2,50 +2,552 @@
 Centralized LLM model configurations
 """
 
+import asyncio
+import contextvars
+import copy
+import functools
+import json
 import os
-from typing import Any, Dict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
 
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, BadRequestError
+
+from ..services.embedding_cache import EmbeddingCache, normalize_text
+from ..services.metrics import REGISTRY, observe_llm_call
+from ..services.redis_cache import (
+    close_redis_client,
+    decode_vector,
+    encode_vector,
+    redis_tier,
+)
+from ..services.response_cache import ResponseCache
+from ..services.tracing import span
+from .embedding_batcher import EmbeddingBatcher
+from .rate_limiter import PRIORITIES, RequestScheduler
+from .single_flight import Outcome, SingleFlight
 
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 # Model names
 REASONING_MODEL = "o4-mini"
 GENERATION_MODEL = "gpt-4.1-mini"
 EMBEDDINGS_MODEL = "text-embedding-3-small"
 
+# Shared HTTP connection pool settings
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+
+# Per-model request timeouts in seconds (reasoning calls run much longer)
+DEFAULT_TIMEOUT = float(os.getenv("OPENAI_DEFAULT_TIMEOUT", "60"))
+MODEL_TIMEOUTS = {
+    REASONING_MODEL: float(os.getenv("OPENAI_REASONING_TIMEOUT", "120")),
+    GENERATION_MODEL: float(os.getenv("OPENAI_GENERATION_TIMEOUT", "60")),
+    EMBEDDINGS_MODEL: float(os.getenv("OPENAI_EMBEDDINGS_TIMEOUT", "30")),
+}
+
+# Per-model budgets as (requests per minute, tokens per minute); 0 = no limit.
+# Calls over budget are queued, not failed
+MODEL_RATE_LIMITS = {
+    REASONING_MODEL: (
+        int(os.getenv("OPENAI_REASONING_RPM", "0")),
+        int(os.getenv("OPENAI_REASONING_TPM", "0")),
+    ),
+    GENERATION_MODEL: (
+        int(os.getenv("OPENAI_GENERATION_RPM", "0")),
+        int(os.getenv("OPENAI_GENERATION_TPM", "0")),
+    ),
+    EMBEDDINGS_MODEL: (
+        int(os.getenv("OPENAI_EMBEDDINGS_RPM", "0")),
+        int(os.getenv("OPENAI_EMBEDDINGS_TPM", "0")),
+    ),
+}
+
+# Adaptive (AIMD) per-model concurrency: starting limit and ceiling, and how
+# often a rate-limited call is retried before the error reaches the caller
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "32"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", str(OPENAI_MAX_CONNECTIONS)))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "6"))
+# Retries of connection errors, timeouts and 5xx responses. The scheduler is
+# the only retry layer: the client's own retries would hold a concurrency slot
+# and hide 429s from the limit
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+# A call this many times slower than the model's average cuts its limit.
+# Embedding latency follows batch size (1 to 2048 texts) rather than load, so
+# only 429s cut the embeddings limit
+LLM_LATENCY_BACKOFF_RATIO = float(os.getenv("LLM_LATENCY_BACKOFF_RATIO", "3"))
+
+# Share of the concurrency limit that normal and background calls may use;
+# the remainder is reserved for the priority classes above them
+LLM_PRIORITY_SHARES = {
+    "normal": float(os.getenv("LLM_NORMAL_PRIORITY_SHARE", "0.75")),
+    "background": float(os.getenv("LLM_BACKGROUND_PRIORITY_SHARE", "0.5")),
+}
+
+# Completion size assumed when estimating a chat call's tokens up front
+LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "500"))
+
+# Embedding batching: upstream list-input size, and the window in which
+# concurrent single-text calls are coalesced (0 disables coalescing)
+EMBEDDINGS_MAX_BATCH_SIZE = int(os.getenv("EMBEDDINGS_MAX_BATCH_SIZE", "2048"))
+EMBEDDINGS_COALESCE_MAX_SIZE = int(os.getenv("EMBEDDINGS_COALESCE_MAX_SIZE", "256"))
+EMBEDDINGS_COALESCE_WINDOW_MS = float(os.getenv("EMBEDDINGS_COALESCE_WINDOW_MS", "10"))
+
+# Optional reduced output size for text-embedding-3 models (unset = model default)
+EMBEDDINGS_DIMENSIONS = int(os.getenv("EMBEDDINGS_DIMENSIONS", "0")) or None
+# Max tokens the embeddings model accepts per input text
+EMBEDDINGS_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDINGS_MAX_INPUT_TOKENS", "8191"))
+
+# Embedding cache: in-process LRU size and optional SQLite file for the disk tier
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+
+# Expiry of embeddings in the shared Redis tier (used when REDIS_CACHE_URL is
+# set; structured responses keep RESPONSE_CACHE_TTL_SECONDS there too)
+EMBEDDING_REDIS_TTL_SECONDS = float(os.getenv("EMBEDDING_REDIS_TTL_SECONDS", "604800"))
+
+# Exact-match cache for get_structured_response(cache=True) calls
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+
+_client: Optional[AsyncOpenAI] = None
+
+# Token usage accumulated by the innermost track_token_usage() block
+_token_usage: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar(
+    "llm_token_usage", default=None
+)
+
+# Priority class of LLM calls made in the current context (see call_priority)
+_call_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "llm_call_priority", default="normal"
+)
+
+
+def _build_client() -> AsyncOpenAI:
+    """Create an async OpenAI client backed by a tuned connection pool"""
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    )
+    return AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        http_client=http_client,
+        max_retries=0,  # retried by the scheduler (see OPENAI_MAX_RETRIES)
+    )
+
+
+def get_client() -> AsyncOpenAI:
+    """Get the shared OpenAI client, creating it lazily outside the app lifespan"""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+async def init_client() -> AsyncOpenAI:
+    """Open the shared OpenAI client (called on application startup)"""
+    return get_client()
+
+
+async def close_client() -> None:
+    """Close the shared OpenAI client, its connection pool and the cache tiers"""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+    _embedding_cache.close()
+    await close_redis_client()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def truncate_for_embedding(text: str) -> str:
+    """Cut text so it cannot exceed EMBEDDINGS_MAX_INPUT_TOKENS.
+
+    Every token covers at least one UTF-8 byte, so keeping that many bytes is
+    a safe bound without a tokenizer.
+    """
+    data = text.encode("utf-8")
+    if len(data) <= EMBEDDINGS_MAX_INPUT_TOKENS:
+        return text
+    return data[:EMBEDDINGS_MAX_INPUT_TOKENS].decode("utf-8", errors="ignore")
+
+
+def exceeds_embedding_input_limit(text: str) -> bool:
+    """Whether text is (by estimate) too long for the embeddings model"""
+    return estimate_tokens(text) > EMBEDDINGS_MAX_INPUT_TOKENS
+
+
+@contextmanager
+def track_token_usage() -> Iterator[Dict[str, int]]:
+    """Accumulate the token usage reported by LLM calls made inside the block
+    (including tasks started from it)"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    token = _token_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _token_usage.reset(token)
+
+
+@contextmanager
+def call_priority(priority: str) -> Iterator[None]:
+    """Schedule LLM calls made inside the block (including tasks started from
+    it) with a priority class: high, normal or background"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority {priority!r}, expected one of {PRIORITIES}")
+    token = _call_priority.set(priority)
+    try:
+        yield
+    finally:
+        _call_priority.reset(token)
+
+
+def get_call_priority() -> str:
+    """Get the priority class LLM calls in the current context run with"""
+    return _call_priority.get()
+
+
+def _record_usage(usage: Any) -> Dict[str, int]:
+    """Add an API response's usage to the active track_token_usage() block"""
+    counts = {
+        key: getattr(usage, key, None) or 0
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+    }
+    tracked = _token_usage.get()
+    if tracked is not None:
+        for key, count in counts.items():
+            tracked[key] += count
+    return counts
+
+
+def get_model_timeout(model: str) -> float:
+    """Get the request timeout for a model"""
+    return MODEL_TIMEOUTS.get(model, DEFAULT_TIMEOUT)
+
+
+_schedulers: Dict[str, RequestScheduler] = {}
+
+
+def get_scheduler(model: str) -> RequestScheduler:
+    """Get the rate limiting scheduler for a model"""
+    scheduler = _schedulers.get(model)
+    if scheduler is None:
+        requests_per_minute, tokens_per_minute = MODEL_RATE_LIMITS.get(model, (0, 0))
+        scheduler = _schedulers[model] = RequestScheduler(
+            model,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            initial_concurrency=LLM_INITIAL_CONCURRENCY,
+            max_concurrency=LLM_MAX_CONCURRENCY,
+            max_rate_limit_retries=LLM_RATE_LIMIT_RETRIES,
+            max_error_retries=OPENAI_MAX_RETRIES,
+            latency_backoff_ratio=(
+                0 if model == EMBEDDINGS_MODEL else LLM_LATENCY_BACKOFF_RATIO
+            ),
+            priority_shares=LLM_PRIORITY_SHARES,
+        )
+    return scheduler
+
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Get per-model queueing (per priority), concurrency limit and 429 counters"""
+    return {model: scheduler.get_stats() for model, scheduler in _schedulers.items()}
+
+
+_response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_SIZE,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    remote=redis_tier("responses", RESPONSE_CACHE_TTL_SECONDS),
+)
+
+# Identical concurrent requests share one upstream call
+_chat_flights = SingleFlight("chat")
+_embedding_flights = SingleFlight("embeddings")
+
+
 async def get_structured_response(
     model: str,
     messages: list[Dict[str, str]],
     response_format: Dict[str, Any],
-    temperature: float = 1.0
+    temperature: float = 1.0,
+    cache: bool = False,
+    on_fresh: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
 ) -> Dict[str, Any]:
-    """Get structured response from OpenAI API"""
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-        response_format={"type": "json_object"}
-    )
-    
+    """Get structured response from OpenAI API.
+
+    With cache=True the response to an identical request (model, messages,
+    response_format and temperature) made in the last
+    RESPONSE_CACHE_TTL_SECONDS is reused; opt in only for steps whose
+    output may be served again verbatim. Identical requests already in
+    flight are always shared. ``on_fresh`` is awaited once per upstream
+    call with its response, so not on cache hits or for callers that
+    joined a shared call.
+    """
+    key = ResponseCache.make_key(model, messages, response_format, temperature)
+    use_cache = cache and RESPONSE_CACHE_SIZE > 0
+    if use_cache:
+        cached = await _response_cache.get(key)
+        if cached is not None:
+            with span("llm.chat", model=model, cache_hit=True):
+                return cached
+
+    async def request() -> Dict[str, Any]:
+        response = await _request_structured_response(model, messages, temperature)
+        if on_fresh is not None:
+            await on_fresh(copy.deepcopy(response))
+        return response
+
+    result = await _chat_flights.run(key, request)
+    if use_cache:
+        await _response_cache.set(key, result)
+    # Callers sharing a request each get their own copy to modify
+    return copy.deepcopy(result)
+
+
+async def _metered(
+    model: str, kind: str, request: Callable[[], Awaitable[Any]]
+) -> Any:
+    """Make one upstream attempt, counting and timing it on its own (time
+    spent queued or backing off before a retry is not part of it)"""
+    with observe_llm_call(model, kind) as metered:
+        response = await request()
+        metered(getattr(response, "usage", None))
+    return response
+
+
+async def _request_structured_response(
+    model: str, messages: list[Dict[str, str]], temperature: float
+) -> Dict[str, Any]:
+    """Make one chat completion call in JSON mode and parse the result"""
+    with span("llm.chat", model=model) as current:
+        estimated_tokens = LLM_COMPLETION_TOKEN_ESTIMATE + sum(
+            estimate_tokens(str(message.get("content", ""))) for message in messages
+        )
+        response = await get_scheduler(model).run(
+            lambda: _metered(
+                model,
+                "chat",
+                lambda: get_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    response_format={"type": "json_object"},
+                    timeout=get_model_timeout(model),
+                ),
+            ),
+            estimated_tokens,
+            get_call_priority(),
+        )
+        current.set(**_record_usage(getattr(response, "usage", None)))
+
     # Parse the JSON response
     try:
-        import json
         return json.loads(response.choices[0].message.content)
     except Exception as e:
         raise ValueError(f"Failed to parse response: {str(e)}")
 
-async def get_embeddings(text: str) -> list[float]:
-    """Get embeddings from OpenAI API"""
-    response = client.embeddings.create(
-        model=EMBEDDINGS_MODEL,
-        input=text
+
+async def _request_embeddings(texts: List[str]) -> List[List[float]]:
+    """Embed up to EMBEDDINGS_MAX_BATCH_SIZE texts in one upstream call"""
+    params: Dict[str, Any] = {}
+    if EMBEDDINGS_DIMENSIONS:
+        params["dimensions"] = EMBEDDINGS_DIMENSIONS
+    with span(
+        "llm.embeddings_request", model=EMBEDDINGS_MODEL, texts=len(texts)
+    ) as current:
+        response = await get_scheduler(EMBEDDINGS_MODEL).run(
+            lambda: _metered(
+                EMBEDDINGS_MODEL,
+                "embeddings",
+                lambda: get_client().embeddings.create(
+                    model=EMBEDDINGS_MODEL,
+                    input=texts,
+                    timeout=get_model_timeout(EMBEDDINGS_MODEL),
+                    **params,
+                ),
+            ),
+            sum(estimate_tokens(text) for text in texts),
+            get_call_priority(),
+        )
+        current.set(**_record_usage(getattr(response, "usage", None)))
+    return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+async def _request_embeddings_isolating(texts: List[str]) -> List[Any]:
+    """Embed texts in one upstream call; if the request is rejected as invalid,
+    split it in halves and retry until the rejected texts are isolated, so
+    only they get the error in place of a vector"""
+    try:
+        return await _request_embeddings(texts)
+    except BadRequestError as e:
+        if len(texts) == 1:
+            return [e]
+        mid = len(texts) // 2
+        first, second = await asyncio.gather(
+            _request_embeddings_isolating(texts[:mid]),
+            _request_embeddings_isolating(texts[mid:]),
+        )
+        return first + second
+
+
+async def _fetch_embeddings(
+    texts: List[str], return_exceptions: bool = False
+) -> List[Any]:
+    """Embed texts upstream, splitting them into concurrent size-limited requests.
+
+    With return_exceptions, texts rejected as invalid get their own error and
+    any other failed request yields its exception in place of each of its
+    texts' vectors, instead of failing every text.
+    """
+    chunks = [
+        texts[i : i + EMBEDDINGS_MAX_BATCH_SIZE]
+        for i in range(0, len(texts), EMBEDDINGS_MAX_BATCH_SIZE)
+    ]
+    request = (
+        _request_embeddings_isolating if return_exceptions else _request_embeddings
     )
-    return response.data[0].embedding
+    results = await asyncio.gather(
+        *[request(chunk) for chunk in chunks], return_exceptions=return_exceptions
+    )
+    vectors: List[Any] = []
+    for chunk, chunk_vectors in zip(chunks, results, strict=True):
+        if isinstance(chunk_vectors, BaseException):
+            vectors.extend([chunk_vectors] * len(chunk))
+        else:
+            vectors.extend(chunk_vectors)
+    return vectors
+
+
+_embedding_batcher = EmbeddingBatcher(
+    functools.partial(_fetch_embeddings, return_exceptions=True),
+    max_batch_size=EMBEDDINGS_COALESCE_MAX_SIZE,
+    max_wait=EMBEDDINGS_COALESCE_WINDOW_MS / 1000,
+)
+
+_embedding_cache = EmbeddingCache(
+    max_entries=EMBEDDING_CACHE_SIZE,
+    disk_path=EMBEDDING_CACHE_PATH,
+    remote=redis_tier(
+        "embeddings",
+        EMBEDDING_REDIS_TTL_SECONDS,
+        encode=encode_vector,
+        decode=decode_vector,
+    ),
+)
+
+
+def _embedding_cache_key(text: str) -> str:
+    return EmbeddingCache.make_key(EMBEDDINGS_MODEL, EMBEDDINGS_DIMENSIONS, text)
+
+
+async def get_embeddings_batch(
+    texts: List[str], return_exceptions: bool = False
+) -> List[Any]:
+    """Get embeddings for many texts, one vector per text in input order.
+
+    With return_exceptions, texts whose upstream request failed get the
+    exception in place of a vector; otherwise the first failure is raised.
+    """
+    if not texts:
+        return []
+
+    with span(
+        "llm.embeddings_batch", model=EMBEDDINGS_MODEL, texts=len(texts)
+    ) as current:
+        keys = [_embedding_cache_key(text) for text in texts]
+        vectors = await _embedding_cache.get_many(keys)
+
+        to_fetch: Dict[str, str] = {}
+        for key, text in zip(keys, texts, strict=True):
+            if key not in vectors:
+                to_fetch.setdefault(key, normalize_text(text))
+        current.set(cache_hits=len(texts) - len(to_fetch), fetched=len(to_fetch))
+
+        if to_fetch:
+            async def fetch(missing: List[str]) -> Outcome:
+                results = await _fetch_embeddings(
+                    [to_fetch[key] for key in missing], return_exceptions=True
+                )
+                fetched, errors = {}, {}
+                for key, result in zip(missing, results, strict=True):
+                    if isinstance(result, BaseException):
+                        errors[key] = result
+                    else:
+                        fetched[key] = result
+                await _embedding_cache.set_many(fetched)
+                return fetched, errors
+
+            vectors.update(
+                await _embedding_flights.run_many(
+                    list(to_fetch), fetch, return_exceptions=True
+                )
+            )
+
+        results = [vectors[key] for key in keys]
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+        return results
+
+
+async def get_embeddings(text: str) -> list[float]:
+    """Get embeddings from OpenAI API, coalescing concurrent calls into batches"""
+    with span("llm.embeddings", model=EMBEDDINGS_MODEL) as current:
+        key = _embedding_cache_key(text)
+        cached = await _embedding_cache.get_many([key])
+        current.set(cache_hit=key in cached)
+        if key in cached:
+            return cached[key]
+
+        async def fetch() -> List[float]:
+            normalized = normalize_text(text)
+            if EMBEDDINGS_COALESCE_WINDOW_MS <= 0:
+                embedding = (await _fetch_embeddings([normalized]))[0]
+            else:
+                embedding = await _embedding_batcher.embed(normalized)
+            await _embedding_cache.set_many({key: embedding})
+            return embedding
+
+        return await _embedding_flights.run(key, fetch)
+
+
+def get_embedding_cache_stats() -> Dict[str, int]:
+    """Get embedding cache hit/miss/eviction counters"""
+    return _embedding_cache.get_stats()
+
+
+def get_response_cache_stats() -> Dict[str, int]:
+    """Get structured response cache hit/miss/expiry counters"""
+    return _response_cache.get_stats()
+
+
+def get_coalesced_call_stats() -> Dict[str, int]:
+    """Get how many calls joined an identical request already in flight"""
+    return {
+        "chat": _chat_flights.coalesced,
+        "embeddings": _embedding_flights.coalesced,
+    }
+
+
+REGISTRY.register_cache("embeddings", get_embedding_cache_stats)
+REGISTRY.register_cache("structured_responses", get_response_cache_stats)
 
 # Factory functions to ensure consistent model creation
 def get_reasoning_model() -> str:
@@ -0,0 +1,336 @@
+"""
+Client-side rate limiting and adaptive concurrency for OpenAI calls
+
+Each model gets a RequestScheduler that queues calls until they fit the
+model's requests-per-minute and tokens-per-minute budgets and a concurrency
+limit. The limit follows AIMD: it grows by about one slot per limit's worth
+of successful calls and is cut multiplicatively on 429s or when latency
+climbs well above its recent average. Rate-limited calls are retried after
+backing off instead of failing the caller, as are (a few times) connection
+errors, timeouts and 5xx responses; this is the only retry layer, so the
+OpenAI client's own retries should be off.
+
+Calls carry a priority class ("high", "normal" or "background"). Queued
+high-priority calls are admitted first, and lower classes may only use a
+share of the concurrency limit, which keeps the rest reserved for the
+classes above them.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+from ..services.metrics import LLM_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Priority classes, highest first
+PRIORITIES = ("high", "normal", "background")
+PRIORITY_RANKS = {priority: rank for rank, priority in enumerate(PRIORITIES)}
+
+
+class TokenBucket:
+    """Budget of `rate_per_minute` units, refilled continuously.
+
+    Waiters are served by priority, then in arrival order. `capacity` bounds
+    the burst (by default ten seconds' worth, as providers enforce per-minute
+    limits over shorter windows).
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity if capacity is not None else max(self.rate * 10, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._waiters: List[List[Any]] = []
+        self._sequence = itertools.count()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1, priority: str = "normal") -> float:
+        """Wait until `amount` units are available and take them; returns the wait"""
+        amount = min(amount, self.capacity)
+        started = time.monotonic()
+        entry = [PRIORITY_RANKS[priority], next(self._sequence), amount]
+        heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                self._refill()
+                head = self._waiters[0]
+                if head is entry and self.tokens >= amount:
+                    heapq.heappop(self._waiters)
+                    self.tokens -= amount
+                    return time.monotonic() - started
+                # Sleep until the head of the queue can be served, then re-check
+                # (a higher-priority arrival may have become the head)
+                await asyncio.sleep(max((head[2] - self.tokens) / self.rate, 0.001))
+        except asyncio.CancelledError:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) units after the actual cost is known"""
+        self._refill()
+        self.tokens = max(-self.capacity, min(self.capacity, self.tokens - amount))
+
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency limit adjusted by additive increase / multiplicative decrease.
+
+    `shares` caps how much of the limit each priority class (together with
+    the classes below it) may use; e.g. a background share of 0.5 keeps half
+    the slots free for high and normal calls.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 100,
+        decrease_cooldown: float = 1.0,
+        shares: Optional[Dict[str, float]] = None,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_cooldown = decrease_cooldown
+        self.shares = {priority: 1.0 for priority in PRIORITIES}
+        self.shares.update(shares or {})
+        self.in_flight_by_priority = {priority: 0 for priority in PRIORITIES}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {
+            priority: deque() for priority in PRIORITIES
+        }
+        self._last_decrease = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self.in_flight_by_priority.values())
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def _can_admit(self, priority: str) -> bool:
+        limit = int(self.limit)
+        if self.in_flight >= limit:
+            return False
+        # Slots used by this class and the classes below it
+        rank = PRIORITY_RANKS[priority]
+        used = sum(self.in_flight_by_priority[p] for p in PRIORITIES[rank:])
+        return used < max(1, int(self.shares[priority] * limit))
+
+    async def acquire(self, priority: str = "normal") -> None:
+        """Wait for a free slot, behind queued calls of the same or higher priority"""
+        rank = PRIORITY_RANKS[priority]
+        ahead = any(self._waiters[p] for p in PRIORITIES[: rank + 1])
+        if not ahead and self._can_admit(priority):
+            self.in_flight_by_priority[priority] += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the caller gave up
+                self.release(priority)
+            elif waiter in self._waiters[priority]:
+                self._waiters[priority].remove(waiter)
+            raise
+
+    def release(self, priority: str = "normal") -> None:
+        self.in_flight_by_priority[priority] -= 1
+        self._wake()
+
+    def on_success(self) -> None:
+        """Additive increase: about +1 slot per `limit` successful calls"""
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wake()
+
+    def on_overload(self, factor: float) -> None:
+        """Multiplicative decrease, at most once per cooldown so one burst of
+        errors doesn't collapse the limit"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * factor)
+
+    def _wake(self) -> None:
+        for priority in PRIORITIES:
+            waiters = self._waiters[priority]
+            while waiters and self._can_admit(priority):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self.in_flight_by_priority[priority] += 1
+                    waiter.set_result(None)
+
+
+class RequestScheduler:
+    """Admits calls to one model within its rate budgets and concurrency limit"""
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        initial_concurrency: int = 32,
+        max_concurrency: int = 100,
+        min_concurrency: int = 1,
+        max_rate_limit_retries: int = 6,
+        max_error_retries: int = 2,
+        latency_backoff_ratio: float = 3.0,
+        rate_limit_decrease: float = 0.5,
+        latency_decrease: float = 0.9,
+        priority_shares: Optional[Dict[str, float]] = None,
+    ):
+        self.name = name
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            min(initial_concurrency, max_concurrency),
+            min_concurrency,
+            max_concurrency,
+            shares=priority_shares,
+        )
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.max_error_retries = max_error_retries
+        self.latency_backoff_ratio = latency_backoff_ratio
+        self.rate_limit_decrease = rate_limit_decrease
+        self.latency_decrease = latency_decrease
+        self.latency_average: Optional[float] = None
+        self.stats = {
+            "calls": 0,
+            "rate_limited": 0,
+            "retried_errors": 0,
+            "slow_calls": 0,
+        }
+        self.queue_wait_seconds = {priority: 0.0 for priority in PRIORITIES}
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        priority: str = "normal",
+    ) -> T:
+        """Run `call` once it fits the budgets, retrying it after 429s and
+        transient errors (connection errors, timeouts and 5xx responses).
+
+        estimated_tokens is charged up front and reconciled with the
+        response's `usage.total_tokens` afterwards.
+        """
+        if priority not in PRIORITY_RANKS:
+            raise ValueError(
+                f"Unknown priority {priority!r}, expected one of {PRIORITIES}"
+            )
+        attempt = 0
+        error_attempt = 0
+        while True:
+            await self._admit(estimated_tokens, priority)
+            started = time.perf_counter()
+            try:
+                result = await call()
+            except RateLimitError as e:
+                self.concurrency.release(priority)
+                self.concurrency.on_overload(self.rate_limit_decrease)
+                self.stats["rate_limited"] += 1
+                if attempt >= self.max_rate_limit_retries:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                logger.warning(
+                    f"{self.name} rate limited, retrying in {delay:.1f}s "
+                    f"(concurrency limit {self.concurrency.limit:.1f})"
+                )
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except (APIConnectionError, InternalServerError) as e:
+                self.concurrency.release(priority)
+                if error_attempt >= self.max_error_retries:
+                    raise
+                delay = self._retry_delay(e, error_attempt)
+                logger.warning(
+                    f"{self.name} request failed ({type(e).__name__}), "
+                    f"retrying in {delay:.1f}s"
+                )
+                self.stats["retried_errors"] += 1
+                error_attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.concurrency.release(priority)
+                raise
+
+            self.concurrency.release(priority)
+            self._observe_latency(time.perf_counter() - started)
+            if self.tokens is not None:
+                usage = getattr(result, "usage", None)
+                actual = getattr(usage, "total_tokens", None)
+                if actual is not None:
+                    self.tokens.adjust(actual - estimated_tokens)
+            self.stats["calls"] += 1
+            return result
+
+    async def _admit(self, estimated_tokens: int, priority: str) -> None:
+        started = time.monotonic()
+        if self.requests is not None:
+            await self.requests.acquire(1, priority)
+        if self.tokens is not None and estimated_tokens:
+            await self.tokens.acquire(estimated_tokens, priority)
+        await self.concurrency.acquire(priority)
+        waited = time.monotonic() - started
+        self.queue_wait_seconds[priority] += waited
+        LLM_QUEUE_WAIT.observe(waited, model=self.name, priority=priority)
+
+    def _observe_latency(self, latency: float) -> None:
+        """Grow the limit after a call, or cut it if the call was far slower
+        than average (never, with latency_backoff_ratio 0)"""
+        average = self.latency_average
+        ratio = self.latency_backoff_ratio
+        if ratio and average is not None and latency > average * ratio:
+            # Latency far above normal means the provider is saturating
+            self.stats["slow_calls"] += 1
+            self.concurrency.on_overload(self.latency_decrease)
+        else:
+            self.concurrency.on_success()
+        self.latency_average = (
+            latency if average is None else 0.9 * average + 0.1 * latency
+        )
+
+    @staticmethod
+    def _retry_delay(error: Exception, attempt: int) -> float:
+        """Honour Retry-After when the provider sends it, else back off exponentially"""
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            return max(float(headers.get("retry-after")), 0.0)
+        except (TypeError, ValueError):
+            return min(0.5 * 2 ** attempt, 30) * random.uniform(0.8, 1.2)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "in_flight_by_priority": dict(self.concurrency.in_flight_by_priority),
+            "queued": self.concurrency.queued,
+            "queue_wait_seconds": {
+                priority: round(wait, 6)
+                for priority, wait in self.queue_wait_seconds.items()
+            },
+        }
@@ -0,0 +1,115 @@
+"""
+Single-flight sharing of identical in-flight calls
+"""
+
+import asyncio
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from ..services.metrics import LLM_COALESCED
+
+T = TypeVar("T")
+
+# A shared call's outcome: a result per key that succeeded and an exception
+# per key that failed on its own
+Outcome = Tuple[Dict[Hashable, T], Dict[Hashable, BaseException]]
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers asking for
+    a key already in flight wait for that call instead of starting another.
+
+    Every waiter gets the same result (or exception). The shared call runs as
+    its own task, so one waiter giving up doesn't cancel it for the others;
+    it is cancelled once every waiter has given up.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.coalesced = 0
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Get the result for one key, calling `call` unless it is in flight"""
+        async def call_one(keys: List[Hashable]) -> Outcome:
+            return {key: await call()}, {}
+
+        return (await self.run_many([key], call_one))[key]
+
+    async def run_many(
+        self,
+        keys: Sequence[Hashable],
+        call: Callable[[List[Hashable]], Awaitable[Outcome]],
+        return_exceptions: bool = False,
+    ) -> Dict[Hashable, Any]:
+        """Get results for several keys. Keys already in flight join those
+        calls; the rest are passed to one `call`, which returns the results of
+        the keys that succeeded and the exceptions of those that failed.
+
+        A key's exception (or, if the whole call failed, the call's) is raised,
+        or with return_exceptions returned as that key's result.
+        """
+        keys = list(dict.fromkeys(keys))
+        joined = {key: self._tasks[key] for key in keys if key in self._tasks}
+        own = [key for key in keys if key not in joined]
+
+        tasks: Dict[int, Tuple[asyncio.Future, List[Hashable]]] = {}
+        for key, task in joined.items():
+            tasks.setdefault(id(task), (task, []))[1].append(key)
+        if own:
+            task = asyncio.ensure_future(call(own))
+            for key in own:
+                self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(own, done))
+            tasks[id(task)] = (task, own)
+        if joined:
+            self.coalesced += len(joined)
+            LLM_COALESCED.inc(len(joined), kind=self.kind)
+        for task, _ in tasks.values():
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+
+        results: Dict[Hashable, Any] = {}
+        try:
+            for task, task_keys in tasks.values():
+                try:
+                    values, errors = await asyncio.shield(task)
+                except Exception as e:
+                    values, errors = {}, dict.fromkeys(task_keys, e)
+                for key in task_keys:
+                    if key in errors and not return_exceptions:
+                        raise errors[key]
+                    results[key] = errors[key] if key in errors else values[key]
+        finally:
+            for task, _ in tasks.values():
+                self._release(task)
+        return {key: results[key] for key in keys}
+
+    def _release(self, task: asyncio.Future) -> None:
+        """Drop a waiter; cancel the call when nobody is waiting for it anymore"""
+        self._waiters[task] -= 1
+        if self._waiters[task] > 0:
+            return
+        del self._waiters[task]
+        if not task.done():
+            # Later callers must start a fresh call rather than join this one
+            for key in [key for key, t in self._tasks.items() if t is task]:
+                del self._tasks[key]
+            task.cancel()
+
+    def _forget(self, keys: List[Hashable], task: asyncio.Future) -> None:
+        for key in keys:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        if not task.cancelled():
+            # Mark the exception retrieved in case every waiter gave up
+            task.exception()
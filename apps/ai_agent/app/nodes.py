@@ -2,74 +2,240 @@
 Node definitions for LangGraph workflows
 """
 
+import asyncio
+import hashlib
+import heapq
+import inspect
 import json
-from typing import Any, Dict
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
 
-from scipy.spatial.distance import cosine
+import numpy as np
 
 from .models.llm import (
+    estimate_tokens,
     get_embeddings,
+    get_embeddings_batch,
     get_generation_model,
     get_reasoning_model,
     get_structured_response,
+    truncate_for_embedding,
 )
 from .prompts import (
     CONTENT_DISCOVERY_PROMPT,
     EMBEDDINGS_PROMPT,
+    FUSED_REPLY_PROMPT,
     INTENT_CHECK_PROMPT,
     REPLY_GENERATION_PROMPT,
     USER_SUMMARY_PROMPT,
+    VIRAL_HOOK_PROMPT,
+    VIRAL_HOOKS_BATCH_PROMPT,
 )
+from .services.clustering import cluster_embeddings, normalize_rows
+from .services.intent_classifier import get_intent_classifier, record_intent_decision
+from .services.metrics import REGISTRY, timed_node
+from .services.redis_cache import (
+    decode_json,
+    decode_vector,
+    encode_json,
+    encode_vector,
+    redis_tier,
+)
+from .services.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Viral reply suggestions: max concurrent LLM calls and per-call timeout (seconds)
+VIRAL_HOOKS_CONCURRENCY = int(os.getenv("VIRAL_HOOKS_CONCURRENCY", "4"))
+VIRAL_HOOK_TIMEOUT = float(os.getenv("VIRAL_HOOK_TIMEOUT", "45"))
+# "per_cast" (one call per cast) or "batched" (one call for all casts);
+# can be overridden per request with state["viral_hooks_mode"]
+VIRAL_HOOKS_MODES = ("per_cast", "batched")
+VIRAL_HOOKS_MODE = os.getenv("VIRAL_HOOKS_MODE", "per_cast")
+if VIRAL_HOOKS_MODE not in VIRAL_HOOKS_MODES:
+    logger.warning(
+        f"Unknown VIRAL_HOOKS_MODE {VIRAL_HOOKS_MODE!r}, expected one of "
+        f"{VIRAL_HOOKS_MODES}; using per_cast"
+    )
+    VIRAL_HOOKS_MODE = "per_cast"
+
+# Topic extraction: prompt token budget per chunk of casts, max casts per chunk
+# and max chunks in flight at once
+TOPIC_CHUNK_TOKEN_BUDGET = int(os.getenv("TOPIC_CHUNK_TOKEN_BUDGET", "2000"))
+TOPIC_CHUNK_MAX_CASTS = int(os.getenv("TOPIC_CHUNK_MAX_CASTS", "50"))
+TOPIC_EXTRACTION_CONCURRENCY = int(os.getenv("TOPIC_EXTRACTION_CONCURRENCY", "4"))
+
+# Minimum cosine similarity for casts to be grouped into one trending cluster
+TRENDING_CLUSTER_SIMILARITY = float(os.getenv("TRENDING_CLUSTER_SIMILARITY", "0.5"))
+# Most casts clustered per request (clustering is O(N²) in time and memory);
+# those with the least engagement are dropped
+TRENDING_MAX_CASTS = int(os.getenv("TRENDING_MAX_CASTS", "2000"))
+
+# Trending clusters computed for an identical set of casts are reused for
+# TRENDING_CLUSTER_CACHE_TTL_SECONDS (shared through Redis when configured)
+TRENDING_CLUSTER_CACHE_SIZE = int(os.getenv("TRENDING_CLUSTER_CACHE_SIZE", "64"))
+TRENDING_CLUSTER_CACHE_TTL_SECONDS = float(
+    os.getenv("TRENDING_CLUSTER_CACHE_TTL_SECONDS", "300")
+)
+
+# Trending galaxy matching: clusters kept per user and casts kept per cluster
+MATCHED_CLUSTERS_LIMIT = 3
+TOP_CASTS_PER_CLUSTER = 3
+
+# Embedding prefilter defaults (ContentDiscoveryConfig can override them):
+# only the FEED_TOP_K feeds (or casts within similar users' feed bundles) most
+# similar to the cast, and at least FEED_MIN_SIMILARITY, reach the discovery LLM
+FEED_TOP_K = 10
+FEED_MIN_SIMILARITY = 0.2
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=int)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def _cluster_topic(
+    topics_per_cast: List[List[str]], casts: List[Dict[str, Any]]
+) -> str:
+    """Label a cluster with the topic most of its casts share"""
+    counts = Counter(
+        topic.lower().strip() for topics in topics_per_cast for topic in topics
+    )
+    if counts:
+        return counts.most_common(1)[0][0]
+    return casts[0]["text"][:50]
+
+
+def _encode_clusters(clusters: List[Dict[str, Any]]) -> bytes:
+    """Clusters as JSON followed by their centroids as packed float32 rows"""
+    meta = encode_json(
+        [{k: v for k, v in c.items() if k != "embedding"} for c in clusters]
+    )
+    vectors = b"".join(encode_vector(c["embedding"]) for c in clusters)
+    return len(meta).to_bytes(4, "little") + meta + vectors
+
+
+def _decode_clusters(data: bytes) -> List[Dict[str, Any]]:
+    size = int.from_bytes(data[:4], "little")
+    clusters = decode_json(data[4 : 4 + size])
+    if clusters:
+        row_bytes = (len(data) - 4 - size) // len(clusters)
+        for i, cluster in enumerate(clusters):
+            start = 4 + size + i * row_bytes
+            cluster["embedding"] = decode_vector(data[start : start + row_bytes])
+    return clusters
+
+
+_cluster_cache = ResponseCache(
+    max_entries=TRENDING_CLUSTER_CACHE_SIZE,
+    ttl_seconds=TRENDING_CLUSTER_CACHE_TTL_SECONDS,
+    remote=redis_tier(
+        "trending_clusters",
+        TRENDING_CLUSTER_CACHE_TTL_SECONDS,
+        encode=_encode_clusters,
+        decode=_decode_clusters,
+    ),
+)
+REGISTRY.register_cache("trending_clusters", lambda: _cluster_cache.get_stats())
 
 
+@timed_node
 async def generate_trending_clusters(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Clusters trending casts by topics using LLM + similarity"""
+    """Clusters trending casts by embedding similarity, labelled with LLM topics.
+
+    At most TRENDING_MAX_CASTS casts are clustered, keeping those with the
+    most engagement. Clusters for an identical list of casts are served from
+    the cluster cache.
+    """
     casts = state["casts"]
+    if len(casts) > TRENDING_MAX_CASTS:
+        logger.warning(
+            f"Clustering the {TRENDING_MAX_CASTS} most engaged of {len(casts)} "
+            "trending casts"
+        )
+        # match_trending_to_user ranks casts by engagement; keep request order
+        kept = sorted(
+            range(len(casts)),
+            key=lambda i: casts[i].get("engagement", 0),
+            reverse=True,
+        )[:TRENDING_MAX_CASTS]
+        casts = state["casts"] = [casts[i] for i in sorted(kept)]
+    if not casts:
+        state["topics"] = []
+        state["cast_embeddings"] = []
+        state["trending_clusters"] = []
+        return state
+
+    payload = json.dumps(
+        [casts, TRENDING_CLUSTER_SIMILARITY], sort_keys=True, default=str
+    )
+    key = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    cached = await _cluster_cache.get(key)
+    if cached is not None:
+        state["trending_clusters"] = cached
+        return state
+
+    await _build_trending_clusters(state)
+    await _cluster_cache.set(key, state["trending_clusters"])
+    return state
 
-    # Step 1: Extract topics per cast using your LLM helper
-    state = await extract_topics_llm(state)  # sets state["topics"]
+
+async def _build_trending_clusters(state: Dict[str, Any]) -> None:
+    """Embed, label and cluster state["casts"] into state["trending_clusters"]"""
+    casts = state["casts"]
+
+    # Step 1: Extract topics (used as cluster labels) and embed every cast
+    await asyncio.gather(extract_topics_llm(state), generate_cast_embeddings(state))
     topics_per_cast = state["topics"]
 
-    # Step 2: Group casts into topic clusters
-    clusters = {}
-    for cast, topics in zip(casts, topics_per_cast):
-        for topic in topics:
-            topic_key = topic.lower().strip()
-            if topic_key not in clusters:
-                clusters[topic_key] = []
-            clusters[topic_key].append(cast)
+    # Step 2: Group casts by embedding similarity; centroids are the averaged
+    # member embeddings, so clusters need no extra embedding calls
+    labels, centroids = cluster_embeddings(
+        np.asarray(state["cast_embeddings"], dtype=np.float32),
+        similarity_threshold=TRENDING_CLUSTER_SIMILARITY,
+    )
 
-    # Optional: generate an embedding per cluster for vector matching
     trending_clusters = []
-    for topic, grouped_casts in clusters.items():
-        combined_texts = " ".join(c["text"] for c in grouped_casts)
-        embedding = await get_embeddings(combined_texts)
+    for cluster_id, centroid in enumerate(centroids):
+        members = np.flatnonzero(labels == cluster_id)
+        grouped_casts = [casts[i] for i in members]
         trending_clusters.append(
             {
-                "topic": topic,
+                "topic": _cluster_topic(
+                    [topics_per_cast[i] for i in members if i < len(topics_per_cast)],
+                    grouped_casts,
+                ),
                 "casts": grouped_casts,
-                "embedding": embedding,
+                "embedding": centroid.tolist(),
             }
         )
 
     state["trending_clusters"] = trending_clusters
-    return state
 
 
+@timed_node
 async def generate_cast_embeddings(state: Dict[str, Any]) -> Dict[str, Any]:
     """Generate an embedding for each cast individually"""
     casts = state["casts"]  # expects: List[Cast]
     texts = [cast["text"] for cast in casts]
 
-    embeddings = []
-    for text in texts:
-        embedding = await get_embeddings(text)
-        embeddings.append(embedding)
+    embeddings = await get_embeddings_batch(texts)
 
     state["cast_embeddings"] = embeddings  # one-to-one with `state["casts"]`
     return state
 
 
+@timed_node
 async def extract_topics_llm(state: Dict[str, Any]) -> Dict[str, Any]:
     """Extract topics per cast using an LLM"""
     casts = state["casts"]
@@ -89,6 +255,43 @@ async def extract_topics_llm(state: Dict[str, Any]) -> Dict[str, Any]:
         else:
             raise ValueError(f"Invalid cast format: {cast}")
 
+    semaphore = asyncio.Semaphore(TOPIC_EXTRACTION_CONCURRENCY)
+    chunk_topics = await asyncio.gather(
+        *[_extract_chunk_topics(chunk, semaphore) for chunk in _chunk_texts(texts)]
+    )
+
+    state["topics"] = [topics for chunk in chunk_topics for topics in chunk]
+    return state
+
+
+def _chunk_texts(texts: List[str]) -> List[List[str]]:
+    """Split texts into consecutive chunks that fit the topic prompt budget"""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and (
+            current_tokens + tokens > TOPIC_CHUNK_TOKEN_BUDGET
+            or len(current) >= TOPIC_CHUNK_MAX_CASTS
+        ):
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _extract_chunk_topics(
+    texts: List[str], semaphore: asyncio.Semaphore
+) -> List[List[str]]:
+    """Extract topics for one chunk, returning exactly one topic list per text.
+
+    If the LLM returns the wrong number of entries the chunk is split in half
+    and retried, down to single posts (which get no topics if still invalid).
+    """
     messages = [
         {
             "role": "system",
@@ -96,27 +299,47 @@ async def extract_topics_llm(state: Dict[str, Any]) -> Dict[str, Any]:
         },
         {
             "role": "user",
-            "content": f"Extract topics from these posts and return them in a JSON array format:\n{json.dumps(texts, indent=2)}",
+            "content": (
+                f"Extract topics from these {len(texts)} posts. Return "
+                f'{{"topics": [[...], ...]}} with exactly {len(texts)} arrays, '
+                f"one per post, in the same order:\n"
+                f"{json.dumps(texts, ensure_ascii=False, separators=(',', ':'))}"
+            ),
         },
     ]
 
-    response = await get_structured_response(
-        model=get_generation_model(),
-        messages=messages,
-        response_format={
-            "type": "object",
-            "properties": {
-                "topics": {
-                    "type": "array",
-                    "items": {"type": "array", "items": {"type": "string"}},
-                }
+    async with semaphore:
+        response = await get_structured_response(
+            model=get_generation_model(),
+            messages=messages,
+            response_format={
+                "type": "object",
+                "properties": {
+                    "topics": {
+                        "type": "array",
+                        "items": {"type": "array", "items": {"type": "string"}},
+                    }
+                },
+                "required": ["topics"],
             },
-            "required": ["topics"],
-        },
-    )
+        )
 
-    state["topics"] = response["topics"]
-    return state
+    topics = response.get("topics")
+    if isinstance(topics, list) and len(topics) == len(texts):
+        return [t if isinstance(t, list) else [] for t in topics]
+
+    count = len(topics) if isinstance(topics, list) else "no"
+    logger.warning(
+        f"Topic extraction returned {count} entries for {len(texts)} posts"
+    )
+    if len(texts) == 1:
+        return [[]]
+    middle = len(texts) // 2
+    halves = await asyncio.gather(
+        _extract_chunk_topics(texts[:middle], semaphore),
+        _extract_chunk_topics(texts[middle:], semaphore),
+    )
+    return halves[0] + halves[1]
 
 
 def build_topic_map(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -146,6 +369,7 @@ def build_topic_map(state: Dict[str, Any]) -> Dict[str, Any]:
 
 
 # User Summary Nodes
+@timed_node
 async def process_user_data(state: Dict[str, Any]) -> Dict[str, Any]:
     """Process raw user data and extract summary"""
     messages = [
@@ -172,10 +396,12 @@ async def process_user_data(state: Dict[str, Any]) -> Dict[str, Any]:
         },
         "required": ["keywords", "tone", "channels", "raw_summary"],
     }
+    # Repeated requests for the same user_data are served from the cache
     response = await get_structured_response(
         model=get_reasoning_model(),
         messages=messages,
         response_format=response_format,
+        cache=True,
     )
 
     state["user_summary"] = {
@@ -185,6 +411,7 @@ async def process_user_data(state: Dict[str, Any]) -> Dict[str, Any]:
     return state
 
 
+@timed_node
 async def generate_user_embedding(state: Dict[str, Any]) -> Dict[str, Any]:
     """Generate embedding from structured keywords, tone, and channels"""
     keyword_objects = state["user_summary"]["keywords"]
@@ -212,8 +439,49 @@ async def generate_user_embedding(state: Dict[str, Any]) -> Dict[str, Any]:
 
 
 # Reply Generation Nodes
+async def resolve_cast_summary(state: Dict[str, Any]) -> Optional[str]:
+    """Get the cast summary, waiting for it if it is still being generated"""
+    summary = state.get("cast_summary")
+    if inspect.isawaitable(summary):
+        try:
+            summary = await summary
+        except Exception as e:
+            logger.warning(f"Cast summary generation failed: {e}")
+            summary = None
+        state["cast_summary"] = summary
+    return summary
+
+
+@timed_node
+async def check_intent_and_prefilter(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the intent check and feed prefiltering concurrently.
+
+    Neither step needs the cast summary, so both start while it is still
+    being generated.
+    """
+    await asyncio.gather(check_reply_intent(state), prefilter_feeds(state))
+    return state
+
+
+@timed_node
 async def check_reply_intent(state: Dict[str, Any]) -> Dict[str, Any]:
-    """Check if the cast warrants a reply"""
+    """Check if the cast warrants a reply.
+
+    When a local intent classifier is configured, obvious no-reply casts are
+    answered from the cast embedding without calling the reasoning model.
+    """
+    classifier = get_intent_classifier()
+    if classifier is not None:
+        reply_probability = classifier.decide(await get_embeddings(state["cast_text"]))
+        if reply_probability is not None:
+            state["intent_analysis"] = {
+                "should_reply": False,
+                "identified_needs": [],
+                "confidence": 1.0 - reply_probability,
+                "source": "local_classifier",
+            }
+            return state
+
     messages = [
         {"role": "system", "content": INTENT_CHECK_PROMPT},
         {"role": "user", "content": state["cast_text"]},
@@ -231,6 +499,9 @@ async def check_reply_intent(state: Dict[str, Any]) -> Dict[str, Any]:
             },
             "required": ["should_reply", "identified_needs", "confidence"],
         },
+        cache=True,  # retried webhooks re-check the same cast
+        # Only decisions the LLM just made become training rows
+        on_fresh=lambda decision: record_intent_decision(state["cast_text"], decision),
     )
 
     state["intent_analysis"] = {
@@ -241,12 +512,94 @@ async def check_reply_intent(state: Dict[str, Any]) -> Dict[str, Any]:
     return state
 
 
+def _feed_entries(feed: Dict[str, Any]) -> List[Tuple[Optional[int], str]]:
+    """Texts a feed entry is scored by: one per cast of a similar user's feed
+    bundle (with its index in userData), or one for the whole entry (None)"""
+    if feed.get("text"):
+        return [(None, feed["text"])]
+    if "userData" in feed:
+        casts = [
+            (i, item["text"])
+            for i, item in enumerate(feed.get("userData") or [])
+            if item.get("text")
+        ]
+        if casts or not feed.get("summary"):
+            return casts
+        return [(None, feed["summary"])]
+    return [(None, json.dumps(feed, ensure_ascii=False)[:2000])]
+
+
+@timed_node
+async def prefilter_feeds(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only the available feeds most similar to the cast.
+
+    Embeds the cast and every feed (batched and cached) and stores the top
+    state["feed_top_k"] entries scoring at least state["feed_min_similarity"],
+    best first, as state["candidate_feeds"] (and their positions in
+    available_feeds as state["candidate_feed_indices"]). A similar user's feed
+    bundle is scored per cast and trimmed to its matching casts. Skipped once
+    the intent check has decided not to reply; runs unconditionally before a
+    fused reply. If embedding fails, every feed is kept.
+    """
+    intent = state.get("intent_analysis")
+    if intent is not None and not intent["should_reply"]:
+        return state
+
+    feeds = state.get("available_feeds", [])
+    top_k = state.get("feed_top_k", FEED_TOP_K)
+    min_similarity = state.get("feed_min_similarity", FEED_MIN_SIMILARITY)
+    if not feeds or top_k <= 0:
+        state["candidate_feeds"] = feeds
+        state["candidate_feed_indices"] = list(range(len(feeds)))
+        return state
+
+    entries = [
+        (feed_index, cast_index, text)
+        for feed_index, feed in enumerate(feeds)
+        for cast_index, text in _feed_entries(feed)
+    ]
+    texts = [state["cast_text"], *[text for _, _, text in entries]]
+    try:
+        vectors = await get_embeddings_batch([truncate_for_embedding(t) for t in texts])
+    except Exception as e:
+        logger.warning(f"Feed prefilter skipped, embedding failed: {e}")
+        state["candidate_feeds"] = feeds
+        state["candidate_feed_indices"] = list(range(len(feeds)))
+        return state
+    matrix = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    scores = matrix[1:] @ matrix[0]
+
+    # Group the best entries by feed, keeping feeds in order of their best entry
+    selected: Dict[int, List[Optional[int]]] = {}
+    for i in _top_k_indices(scores, top_k):
+        if scores[i] >= min_similarity:
+            feed_index, cast_index, _ = entries[i]
+            selected.setdefault(feed_index, []).append(cast_index)
+
+    candidates = []
+    for feed_index, cast_indices in selected.items():
+        feed = feeds[feed_index]
+        if cast_indices != [None]:
+            feed = {**feed, "userData": [feed["userData"][i] for i in cast_indices]}
+        candidates.append(feed)
+    state["candidate_feeds"] = candidates
+    state["candidate_feed_indices"] = list(selected)
+    return state
+
+
+@timed_node
 async def discover_relevant_content(state: Dict[str, Any]) -> Dict[str, Any]:
     """Find relevant content from feeds"""
     if not state["intent_analysis"]["should_reply"]:
         state["discovered_content"] = None
         return state
 
+    feeds = state.get("candidate_feeds", state["available_feeds"])
+    if not feeds:
+        state["discovered_content"] = None
+        return state
+
+    cast_summary = await resolve_cast_summary(state)
     messages = [
         {"role": "system", "content": CONTENT_DISCOVERY_PROMPT},
         {
@@ -254,10 +607,12 @@ async def discover_relevant_content(state: Dict[str, Any]) -> Dict[str, Any]:
             "content": json.dumps(
                 {
                     "cast_text": state["cast_text"],
+                    **({"cast_summary": cast_summary} if cast_summary else {}),
                     "identified_needs": state["intent_analysis"]["identified_needs"],
-                    "feeds": state["available_feeds"],
+                    "feeds": feeds,
                 },
-                indent=2,
+                ensure_ascii=False,
+                separators=(",", ":"),
             ),
         },
     ]
@@ -297,12 +652,14 @@ async def discover_relevant_content(state: Dict[str, Any]) -> Dict[str, Any]:
     return state
 
 
+@timed_node
 async def generate_reply(state: Dict[str, Any]) -> Dict[str, Any]:
     """Generate the final reply"""
     if not state.get("discovered_content"):
         state["reply"] = {"reply_text": "No response needed for this cast.", "link": ""}
         return state
 
+    cast_summary = await resolve_cast_summary(state)
     messages = [
         {"role": "system", "content": REPLY_GENERATION_PROMPT},
         {
@@ -310,6 +667,7 @@ async def generate_reply(state: Dict[str, Any]) -> Dict[str, Any]:
             "content": json.dumps(
                 {
                     "cast_text": state["cast_text"],
+                    **({"cast_summary": cast_summary} if cast_summary else {}),
                     "selected_content": state["discovered_content"]["selected_content"],
                 },
                 indent=2,
@@ -334,7 +692,88 @@ async def generate_reply(state: Dict[str, Any]) -> Dict[str, Any]:
     return state
 
 
+def _validate_fused_reply(response: Dict[str, Any]) -> None:
+    """Raise ValueError if a fused reply response is not usable"""
+    if not isinstance(response.get("should_reply"), bool):
+        raise ValueError("should_reply must be a boolean")
+    if not isinstance(response.get("identified_needs"), list):
+        raise ValueError("identified_needs must be a list")
+    if not isinstance(response.get("confidence"), (int, float)):
+        raise ValueError("confidence must be a number")
+    if not response["should_reply"]:
+        return
+
+    selected = response.get("selected_content")
+    if selected is not None and not (
+        isinstance(selected, dict) and {"title", "url"} <= selected.keys()
+    ):
+        raise ValueError("selected_content is missing required fields")
+    if not isinstance(response.get("reply_text"), str) or not isinstance(
+        response.get("link"), str
+    ):
+        raise ValueError("reply_text and link must be strings")
+    if selected and not response["reply_text"].strip():
+        raise ValueError("reply_text is empty")
+
+
+@timed_node
+async def generate_reply_fused(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Decide intent, select content and write the reply in one LLM call.
+
+    Produces the same intent_analysis / discovered_content / reply keys as
+    the staged nodes. Raises ValueError when the response fails validation so
+    the caller can fall back to the staged graph.
+    """
+    feeds = state.get("candidate_feeds", state["available_feeds"])
+    messages = [
+        {"role": "system", "content": FUSED_REPLY_PROMPT},
+        {
+            "role": "user",
+            "content": json.dumps(
+                {"cast_text": state["cast_text"], "feeds": feeds},
+                ensure_ascii=False,
+                separators=(",", ":"),
+            ),
+        },
+    ]
+
+    response = await get_structured_response(
+        model=get_reasoning_model(),
+        messages=messages,
+        response_format={"type": "object"},
+    )
+    _validate_fused_reply(response)
+
+    state["intent_analysis"] = {
+        "should_reply": response["should_reply"],
+        "identified_needs": response["identified_needs"],
+        "confidence": response["confidence"],
+    }
+
+    if not response["should_reply"]:
+        state["discovered_content"] = None
+        state["reply"] = {"reply_text": "No response needed for this cast.", "link": ""}
+        return state
+
+    if not response.get("selected_content"):
+        state["discovered_content"] = None
+        state["reply"] = {
+            "reply_text": "No relevant content found in the available feeds.",
+            "link": "",
+        }
+        return state
+
+    state["discovered_content"] = {
+        "selected_content": response["selected_content"],
+        "relevance_score": response.get("relevance_score", 0),
+        "key_points": response.get("key_points", []),
+    }
+    state["reply"] = {"reply_text": response["reply_text"], "link": response["link"]}
+    return state
+
+
 # Embeddings Generation Nodes
+@timed_node
 async def prepare_embedding_text(state: Dict[str, Any]) -> Dict[str, Any]:
     """Prepare text for embedding generation"""
     messages = [
@@ -356,6 +795,7 @@ async def prepare_embedding_text(state: Dict[str, Any]) -> Dict[str, Any]:
     return state
 
 
+@timed_node
 async def generate_embedding(state: Dict[str, Any]) -> Dict[str, Any]:
     """Generate embeddings from prepared text"""
     embedding = await get_embeddings(state["prepared_text"])
@@ -364,60 +804,51 @@ async def generate_embedding(state: Dict[str, Any]) -> Dict[str, Any]:
     return state
 
 
+@timed_node
 async def match_trending_to_user(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Filters and scores clusters based on user's interest embedding.
     Input: state with `user_embedding`, `trending_clusters`
     Output: { matched_clusters: [{ topic, score, top_casts }] }
     """
-    user_vec = state["user_embedding"]
     clusters = state["trending_clusters"]
+    if not clusters:
+        state["matched_clusters"] = []
+        return state
 
-    scored_clusters = []
-    for cluster in clusters:
-        score = 1 - cosine(user_vec, cluster["embedding"])
-        sorted_casts = sorted(
-            cluster["casts"], key=lambda c: c.get("engagement", 0), reverse=True
-        )
-        scored_clusters.append(
+    # Cosine similarity for every cluster as one matrix-vector product
+    user_vec = normalize_rows(np.asarray(state["user_embedding"], dtype=np.float32))
+    cluster_matrix = normalize_rows(
+        np.asarray([cluster["embedding"] for cluster in clusters], dtype=np.float32)
+    )
+    scores = cluster_matrix @ user_vec
+
+    top_matches = []
+    for index in _top_k_indices(scores, MATCHED_CLUSTERS_LIMIT):
+        cluster = clusters[index]
+        top_matches.append(
             {
                 "topic": cluster["topic"],
-                "score": score,
-                "top_casts": sorted_casts[:3],
+                "score": float(scores[index]),
+                "top_casts": heapq.nlargest(
+                    TOP_CASTS_PER_CLUSTER,
+                    cluster["casts"],
+                    key=lambda c: c.get("engagement", 0),
+                ),
             }
         )
 
-    top_matches = sorted(scored_clusters, key=lambda c: c["score"], reverse=True)[:3]
     state["matched_clusters"] = top_matches
     return state
 
 
-async def suggest_viral_hooks(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Uses LLM to generate viral reply suggestions for top casts.
-    Input: state["matched_clusters"]
-    Output: state["viral_suggestions"]
-    """
-    matched_clusters = state["matched_clusters"]
-    suggestions = []
-
-    for cluster in matched_clusters:
-        topic = cluster["topic"]
-        cast_suggestions = []
-
-        for cast in cluster["top_casts"]:
-            messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You're an expert in writing viral Farcaster replies. "
-                        "Suggest a single quote-cast or reply idea that can get high engagement",
-                        "while being authentic and insightful.",
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": f"""Topic: {topic}
+async def _suggest_viral_reply(topic: str, cast: Dict[str, Any]) -> str:
+    """Ask the LLM for one viral reply idea for a cast"""
+    messages = [
+        {"role": "system", "content": VIRAL_HOOK_PROMPT},
+        {
+            "role": "user",
+            "content": f"""Topic: {topic}
 Post: "{cast['text']}"
 
 Reply in this JSON format:
@@ -425,33 +856,144 @@ Reply in this JSON format:
   "suggested_reply": "..."
 }}
 """,
-                },
-            ]
+        },
+    ]
 
-            response = await get_structured_response(
-                model=get_reasoning_model(),
-                messages=messages,
-                response_format={
-                    "type": "object",
-                    "properties": {
-                        "suggested_reply": {"type": "string"},
-                    },
-                    "required": ["suggested_reply"],
-                },
-            )
+    response = await get_structured_response(
+        model=get_reasoning_model(),
+        messages=messages,
+        response_format={
+            "type": "object",
+            "properties": {
+                "suggested_reply": {"type": "string"},
+            },
+            "required": ["suggested_reply"],
+        },
+    )
+    return response["suggested_reply"]
 
-            cast_suggestions.append(
-                {
-                    "cast": cast,
-                    "suggested_reply": response["suggested_reply"],
+
+async def _suggest_viral_replies_batched(
+    matched_clusters: List[Dict[str, Any]],
+) -> Dict[str, str]:
+    """Ask the LLM for viral reply ideas for every top cast in a single call.
+
+    Returns suggestions keyed by "<cluster index>-<cast index>".
+    """
+    posts = [
+        {"id": f"{ci}-{ki}", "topic": cluster["topic"], "post": cast["text"]}
+        for ci, cluster in enumerate(matched_clusters)
+        for ki, cast in enumerate(cluster["top_casts"])
+    ]
+    if not posts:
+        return {}
+
+    messages = [
+        {"role": "system", "content": VIRAL_HOOKS_BATCH_PROMPT},
+        {"role": "user", "content": json.dumps({"posts": posts})},
+    ]
+
+    response = await get_structured_response(
+        model=get_reasoning_model(),
+        messages=messages,
+        response_format={
+            "type": "object",
+            "properties": {
+                "suggestions": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "suggested_reply": {"type": "string"},
+                        },
+                        "required": ["id", "suggested_reply"],
+                    },
                 }
+            },
+            "required": ["suggestions"],
+        },
+    )
+
+    return {
+        str(item["id"]): item["suggested_reply"]
+        for item in response.get("suggestions", [])
+        if isinstance(item, dict) and item.get("id") and item.get("suggested_reply")
+    }
+
+
+@timed_node
+async def suggest_viral_hooks(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Uses LLM to generate viral reply suggestions for top casts.
+    Input: state["matched_clusters"], optional state["viral_hooks_mode"]
+    Output: state["viral_suggestions"]
+
+    In "per_cast" mode suggestions for all casts are requested concurrently
+    (bounded by VIRAL_HOOKS_CONCURRENCY). In "batched" mode one call covers
+    every cast and only casts missing from its response fall back to per-cast
+    calls. Casts whose call fails or exceeds VIRAL_HOOK_TIMEOUT are left out
+    of the result.
+    """
+    matched_clusters = state["matched_clusters"]
+    mode = state.get("viral_hooks_mode") or VIRAL_HOOKS_MODE
+    if mode not in VIRAL_HOOKS_MODES:
+        raise ValueError(
+            f"Unknown viral_hooks_mode {mode!r}, expected one of {VIRAL_HOOKS_MODES}"
+        )
+    semaphore = asyncio.Semaphore(VIRAL_HOOKS_CONCURRENCY)
+    started = time.perf_counter()
+
+    batched: Dict[str, str] = {}
+    if mode == "batched":
+        try:
+            batched = await _suggest_viral_replies_batched(matched_clusters)
+        except Exception as e:
+            logger.warning(f"Batched viral reply suggestions failed: {e}")
+
+    async def suggest(key: str, topic: str, cast: Dict[str, Any]) -> Optional[str]:
+        if key in batched:
+            return batched[key]
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    _suggest_viral_reply(topic, cast), timeout=VIRAL_HOOK_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Viral reply suggestion timed out for topic {topic}")
+            except Exception as e:
+                logger.warning(f"Viral reply suggestion failed for topic {topic}: {e}")
+            return None
+
+    replies = await asyncio.gather(
+        *[
+            asyncio.gather(
+                *[
+                    suggest(f"{ci}-{ki}", cluster["topic"], cast)
+                    for ki, cast in enumerate(cluster["top_casts"])
+                ]
             )
+            for ci, cluster in enumerate(matched_clusters)
+        ]
+    )
+    logger.info(
+        f"Viral reply suggestions ({mode}) took {time.perf_counter() - started:.2f}s, "
+        f"{len(batched)} from batched call"
+    )
 
+    suggestions = []
+    for cluster, cluster_replies in zip(matched_clusters, replies, strict=True):
         suggestions.append(
             {
-                "topic": topic,
+                "topic": cluster["topic"],
                 "score": cluster["score"],
-                "cast_suggestions": cast_suggestions,
+                "cast_suggestions": [
+                    {"cast": cast, "suggested_reply": reply}
+                    for cast, reply in zip(
+                        cluster["top_casts"], cluster_replies, strict=True
+                    )
+                    if reply is not None
+                ],
             }
         )
 
@@ -1,21 +1,57 @@
+import asyncio
 import time
-from typing import Dict, Any, Optional
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Dict, Any, List, Optional, Union
 
-from langgraph.graph import Graph, StateGraph
-from pydantic import BaseModel
+from langgraph.graph import END, Graph
+from pydantic import BaseModel, ConfigDict
 
 from .workflows.intent_analysis import IntentAnalysisWorkflow, IntentAnalysisConfig
 from .workflows.content_discovery import ContentDiscoveryWorkflow, ContentDiscoveryConfig
 from .workflows.reply_generation import ReplyGenerationWorkflow, ReplyGenerationConfig
 from .models import CastInput, PipelineResponse
-from .services.logging_service import WorkflowLogger
+from .models.llm import track_token_usage
+from .services.logging_service import MetadataPolicy, WorkflowLogger
+from .services.tracing import span, traced
+
+# Metadata kept per execution: the cast, each step's own output and the
+# response, but not the whole graph state (feeds, embeddings, tasks)
+PIPELINE_LOG_FIELDS = frozenset({
+    "input",
+    "result.intent_analysis",
+    "result.content_discovery",
+    "result.reply_generation",
+    "response",
+})
 
 class PipelineConfig(BaseModel):
     """Configuration for the entire pipeline"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     intent_analysis: IntentAnalysisConfig = IntentAnalysisConfig()
     content_discovery: ContentDiscoveryConfig = ContentDiscoveryConfig()
     reply_generation: ReplyGenerationConfig = ReplyGenerationConfig()
 
+    # Start content discovery alongside intent analysis and cancel it if the
+    # cast turns out not to need a reply
+    speculative_discovery: bool = False
+
+    # Maximum casts processed at once by process_many
+    max_concurrency: int = 16
+
+    # What the workflow logger retains from step results and responses
+    log_metadata: MetadataPolicy = MetadataPolicy(allowed_fields=PIPELINE_LOG_FIELDS)
+
+@dataclass
+class SpeculationStats:
+    """Counters for speculative content discovery"""
+    launched: int = 0
+    used: int = 0
+    cancelled: int = 0
+    saved_seconds: float = 0.0
+    wasted_seconds: float = 0.0
+
 class ReplyPipeline:
     """Main pipeline for processing casts and generating replies"""
     
@@ -28,14 +64,15 @@ class ReplyPipeline:
         self.reply_workflow = ReplyGenerationWorkflow(self.config.reply_generation)
         
         # Initialize logger
-        self.logger = WorkflowLogger("ReplyPipeline")
+        self.logger = WorkflowLogger("ReplyPipeline", self.config.log_metadata)
+        self.speculation_stats = SpeculationStats()
         
         # Create the workflow graph
         self.workflow = self._create_workflow()
     
     def _create_workflow(self) -> Graph:
         """Create the LangGraph workflow"""
-        workflow = StateGraph(Dict)
+        workflow = Graph()
         
         # Add nodes for each step
         workflow.add_node("analyze_intent", self._wrap_node_with_logging(self._analyze_intent, "analyze_intent"))
@@ -48,15 +85,16 @@ class ReplyPipeline:
             self._should_continue_pipeline,
             {
                 True: "discover_content",
-                False: None  # End workflow if no reply needed
+                False: END  # End workflow if no reply needed
             }
         )
         
         # Add remaining edges
         workflow.add_edge("discover_content", "generate_reply")
         
-        # Set entry point
+        # Set entry and end points
         workflow.set_entry_point("analyze_intent")
+        workflow.set_finish_point("generate_reply")
         
         return workflow.compile()
     
@@ -64,19 +102,41 @@ class ReplyPipeline:
         """Wrap a node function with logging"""
         async def wrapped_node(state: Dict[str, Any]) -> Dict[str, Any]:
             self.logger.start_step(step_name)
-            try:
-                result = await node_func(state)
-                self.logger.complete_step(step_name, metadata={"result": result})
-                return result
-            except Exception as e:
-                self.logger.fail_step(step_name, str(e))
-                raise
+            with span(f"node.{step_name}"), track_token_usage() as tokens:
+                try:
+                    result = await node_func(state)
+                    self.logger.complete_step(
+                        step_name, metadata={"result": result}, tokens=tokens
+                    )
+                    return result
+                except Exception as e:
+                    self.logger.fail_step(step_name, str(e), tokens=tokens)
+                    raise
         return wrapped_node
     
     async def _analyze_intent(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze if the cast needs a reply"""
-        result = await self.intent_workflow.process(state["input"])
-        state["intent_analysis"] = result
+        if state.get("speculative"):
+            # Discovery only needs the cast, so start it now; it is cancelled
+            # below if no reply is needed
+            task = asyncio.ensure_future(
+                self.discovery_workflow.process(state["input"])
+            )
+            task.add_done_callback(
+                lambda t: setattr(t, "finished_at", time.perf_counter())
+            )
+            state["speculative_discovery"] = (task, time.perf_counter())
+            self.speculation_stats.launched += 1
+        
+        try:
+            result = await self.intent_workflow.process(state["input"])
+            state["intent_analysis"] = result
+        except BaseException:
+            self._cancel_speculative_discovery(state)
+            raise
+        
+        if not self._should_continue_pipeline(state):
+            self._cancel_speculative_discovery(state)
         return state
     
     def _should_continue_pipeline(self, state: Dict[str, Any]) -> bool:
@@ -85,10 +145,36 @@ class ReplyPipeline:
     
     async def _discover_content(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Discover relevant content for the reply"""
-        result = await self.discovery_workflow.process(state["input"])
+        speculative = state.pop("speculative_discovery", None)
+        if speculative is None:
+            result = await self.discovery_workflow.process(state["input"])
+        else:
+            task, started = speculative
+            waiting_since = time.perf_counter()
+            result = await task
+            # Discovery time that overlapped with intent analysis
+            self.speculation_stats.used += 1
+            finished_at = getattr(task, "finished_at", waiting_since)
+            self.speculation_stats.saved_seconds += (
+                min(waiting_since, finished_at) - started
+            )
         state["content_discovery"] = result
         return state
     
+    def _cancel_speculative_discovery(self, state: Dict[str, Any]) -> None:
+        """Cancel an in-flight speculative discovery (and its HTTP request)"""
+        speculative = state.pop("speculative_discovery", None)
+        if speculative is None:
+            return
+        task, started = speculative
+        task.cancel()
+        self.speculation_stats.cancelled += 1
+        self.speculation_stats.wasted_seconds += time.perf_counter() - started
+    
+    def get_speculation_stats(self) -> Dict[str, Any]:
+        """Get speculative discovery counters"""
+        return asdict(self.speculation_stats)
+    
     async def _generate_reply(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Generate the final reply"""
         input_data = {
@@ -102,10 +188,18 @@ class ReplyPipeline:
         state["reply_generation"] = result
         return state
     
-    async def process(self, cast_input: CastInput) -> PipelineResponse:
-        """Process a cast through the entire pipeline"""
+    @traced("workflow.ReplyPipeline")
+    async def process(
+        self, cast_input: CastInput, speculative: Optional[bool] = None
+    ) -> PipelineResponse:
+        """Process a cast through the entire pipeline.
+        
+        speculative overrides config.speculative_discovery for this call.
+        """
+        if speculative is None:
+            speculative = self.config.speculative_discovery
         # Start workflow tracking
-        workflow_id = f"pipeline_{int(time.time())}"
+        workflow_id = f"pipeline_{int(time.time())}_{uuid.uuid4().hex[:8]}"
         self.logger.start_workflow(workflow_id, metadata={"input": cast_input.model_dump()})
         
         try:
@@ -116,7 +210,8 @@ class ReplyPipeline:
             # Prepare initial state
             initial_state = {
                 "input": cast_input.model_dump(),
-                "start_time": time.time()
+                "start_time": time.time(),
+                "speculative": speculative,
             }
             
             # Execute workflow
@@ -141,4 +236,28 @@ class ReplyPipeline:
         except Exception as e:
             # Log failure
             self.logger.fail_workflow(str(e))
-            raise 
\ No newline at end of file
+            raise 
+    
+    async def process_many(
+        self,
+        cast_inputs: List[CastInput],
+        max_concurrency: Optional[int] = None,
+        speculative: Optional[bool] = None,
+        return_exceptions: bool = False,
+    ) -> List[Union[PipelineResponse, BaseException]]:
+        """Process many casts concurrently, returning results in input order.
+        
+        At most max_concurrency (default config.max_concurrency) casts are in
+        flight at once. With return_exceptions, a failed cast yields its
+        exception in place of a response instead of failing the whole batch.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.config.max_concurrency)
+        
+        async def process_one(cast_input: CastInput) -> PipelineResponse:
+            async with semaphore:
+                return await self.process(cast_input, speculative=speculative)
+        
+        return await asyncio.gather(
+            *(process_one(cast_input) for cast_input in cast_inputs),
+            return_exceptions=return_exceptions,
+        )
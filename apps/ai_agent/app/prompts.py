@@ -145,6 +145,68 @@ IMPORTANT:
 4. The [content] must be the exact content from the selected feed, not a summary or rephrasing
 """
 
+FUSED_REPLY_PROMPT = """
+You are a helpful AI assistant that decides whether to reply to a Farcaster cast and,
+if so, writes the reply from the provided feeds — all in a single JSON response.
+
+<decision_criteria>
+1. RESPOND when the user is clearly seeking technical help or advice, job opportunities
+   or career connections, event information, people with similar interests, project
+   collaborators, educational resources or community connections.
+2. DO NOT RESPOND to generic greetings, simple statements, casual observations, personal
+   updates not inviting discussion, or vague posts with no clear intent or question.
+</decision_criteria>
+
+<content_selection>
+- Only select content from the provided feeds; NEVER fabricate content.
+- Feeds earlier in the list are more relevant to the cast.
+- Avoid content about airdrops and giveaways.
+</content_selection>
+
+<reply_format>
+The reply MUST be: "You should connect with [author_username], who said: '[content]'"
+using the exact content of the selected feed. If the selected content has a
+channel_name, append "Join the conversation in the /[channel_name] channel."
+The link is https://farcaster.xyz/[author_username]/[cast_hash].
+</reply_format>
+
+Return a JSON object with EXACTLY this structure:
+{
+    "should_reply": boolean,
+    "identified_needs": ["string", ...],
+    "confidence": float between 0 and 1,
+    "selected_content": {
+        "title": "string",
+        "url": "string",
+        "relevance_score": float between 0 and 1,
+        "key_points": ["string", ...],
+        "author_username": "string",
+        "cast_hash": "string",
+        "channel_name": "string"
+    } or null when should_reply is false or nothing relevant is found,
+    "relevance_score": float between 0 and 1,
+    "key_points": ["string", ...],
+    "reply_text": "string (empty when should_reply is false)",
+    "link": "string (empty when there is no selected content)"
+}
+"""
+
+# Trending Galaxy Workflow
+VIRAL_HOOK_PROMPT = (
+    "You're an expert in writing viral Farcaster replies. "
+    "Suggest a single quote-cast or reply idea that can get high engagement "
+    "while being authentic and insightful."
+)
+
+VIRAL_HOOKS_BATCH_PROMPT = (
+    "You're an expert in writing viral Farcaster replies. "
+    "For each post you are given, suggest a single quote-cast or reply idea that "
+    "can get high engagement while being authentic and insightful. "
+    'Return a JSON object of the form {"suggestions": [{"id": "...", '
+    '"suggested_reply": "..."}]} with exactly one entry per post, using the '
+    "post's id unchanged."
+)
+
 # Embeddings Workflow
 EMBEDDINGS_PROMPT = """
 Prepare the following input data for embedding generation.
@@ -0,0 +1,69 @@
+"""
+In-process clustering of embedding vectors
+"""
+from typing import Tuple
+
+import numpy as np
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale vectors (along the last axis) to unit length, leaving zero vectors as-is"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def cluster_embeddings(
+    embeddings: np.ndarray,
+    similarity_threshold: float = 0.5,
+    refine_iterations: int = 2,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Group embeddings into clusters of mutually similar vectors.
+
+    Seeds are picked greedily by density: the vector with the most unassigned
+    neighbours above ``similarity_threshold`` (cosine) becomes a cluster with
+    those neighbours. Densities are updated as members are assigned, so
+    seeding costs O(N²) overall however many clusters form. Assignments are
+    then refined k-means style against the averaged centroids.
+
+    Returns (labels, centroids): one cluster index per input row and one
+    unit-length float32 centroid per cluster.
+    """
+    if len(embeddings) == 0:
+        return np.array([], dtype=int), np.empty((0, 0), dtype=np.float32)
+
+    vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    neighbours = (vectors @ vectors.T) >= similarity_threshold
+
+    labels = np.full(len(vectors), -1, dtype=int)
+    unassigned = np.ones(len(vectors), dtype=bool)
+    # Unassigned neighbours per vector, kept up to date as clusters form
+    density = neighbours.sum(axis=1, dtype=np.int64)
+    cluster_count = 0
+    while unassigned.any():
+        seed = int(np.argmax(np.where(unassigned, density, -1)))
+        members = neighbours[seed] & unassigned
+        members[seed] = True
+        labels[members] = cluster_count
+        unassigned[members] = False
+        density -= neighbours[:, members].sum(axis=1, dtype=np.int64)
+        cluster_count += 1
+
+    centroids = _centroids(vectors, labels, cluster_count)
+    for _ in range(refine_iterations):
+        refined = np.argmax(vectors @ centroids.T, axis=1)
+        if np.array_equal(refined, labels):
+            break
+        # Drop clusters that lost all their members and renumber densely
+        _, labels = np.unique(refined, return_inverse=True)
+        centroids = _centroids(vectors, labels, int(labels.max()) + 1)
+
+    return labels, centroids
+
+
+def _centroids(
+    vectors: np.ndarray, labels: np.ndarray, cluster_count: int
+) -> np.ndarray:
+    """Average the vectors of each cluster and re-normalize"""
+    sums = np.zeros((cluster_count, vectors.shape[1]), dtype=np.float32)
+    np.add.at(sums, labels, vectors)
+    return normalize_rows(sums)
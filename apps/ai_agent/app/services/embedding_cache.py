@@ -0,0 +1,158 @@
+"""
+Content-addressed embedding cache with an in-memory LRU, an optional SQLite
+tier and an optional shared Redis tier
+"""
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from .redis_cache import RedisCache
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different inputs share one cache entry"""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class EmbeddingCache:
+    """Caches embedding vectors keyed by (model, dimensions, normalized text hash).
+
+    Lookups hit the in-process LRU first, then the on-disk tier when a
+    ``disk_path`` is configured, then the ``remote`` (Redis) tier shared with
+    other replicas. Vectors are stored on disk and in Redis as float32 blobs.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        disk_path: Optional[str] = None,
+        remote: Optional[RedisCache] = None,
+    ):
+        self.max_entries = max_entries
+        self.disk_path = disk_path or None
+        self.remote = remote
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.stats = {
+            "hits": 0, "disk_hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0,
+        }
+
+    @staticmethod
+    def make_key(model: str, dimensions: Optional[int], text: str) -> str:
+        """Build the content-addressed key for a text"""
+        payload = f"{model}\x00{dimensions or 'default'}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Look up keys, returning only the ones that are cached"""
+        found: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        for key in dict.fromkeys(keys):
+            vector = self._memory.get(key)
+            if vector is None:
+                missing.append(key)
+                continue
+            self._memory.move_to_end(key)
+            self.stats["hits"] += 1
+            found[key] = vector
+
+        if missing and self.disk_path:
+            from_disk = await asyncio.to_thread(self._disk_get, missing)
+            self.stats["disk_hits"] += len(from_disk)
+            for key, vector in from_disk.items():
+                self._remember(key, vector)
+            found.update(from_disk)
+            missing = [key for key in missing if key not in from_disk]
+
+        if missing and self.remote is not None:
+            from_redis = await self.remote.get_many(missing)
+            self.stats["redis_hits"] += len(from_redis)
+            for key, vector in from_redis.items():
+                self._remember(key, vector)
+            if from_redis and self.disk_path:
+                await asyncio.to_thread(self._disk_set, from_redis)
+            found.update(from_redis)
+            missing = [key for key in missing if key not in from_redis]
+
+        self.stats["misses"] += len(missing)
+        return found
+
+    async def set_many(self, items: Dict[str, List[float]]) -> None:
+        """Store vectors in memory and, if configured, on disk and in Redis"""
+        for key, vector in items.items():
+            self._remember(key, vector)
+        if items and self.disk_path:
+            await asyncio.to_thread(self._disk_set, items)
+        if items and self.remote is not None:
+            await self.remote.set_many(items)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get hit/miss/eviction counters and the current LRU size"""
+        return {**self.stats, "size": len(self._memory)}
+
+    def clear(self) -> None:
+        """Drop the in-memory tier (the disk tier is kept)"""
+        self._memory.clear()
+
+    def close(self) -> None:
+        """Close the on-disk tier"""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB)"
+            )
+        return self._db
+
+    def _disk_get(self, keys: List[str]) -> Dict[str, List[float]]:
+        rows = []
+        with self._db_lock:
+            db = self._connection()
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(
+                    db.execute(
+                        "SELECT key, vector FROM embeddings "
+                        f"WHERE key IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                )
+        return {key: array("f", blob).tolist() for key, blob in rows}
+
+    def _disk_set(self, items: Dict[str, List[float]]) -> None:
+        with self._db_lock:
+            db = self._connection()
+            db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()],
+            )
+            db.commit()
@@ -0,0 +1,261 @@
+"""
+Local reply-intent pre-classifier (cast embedding + logistic regression)
+
+Decisions made by the LLM intent check can be logged to a JSONL file
+(INTENT_DECISION_LOG). This module trains a linear model on those decisions
+and exports it; check_reply_intent then answers obvious no-reply casts
+locally and only escalates the rest to the reasoning model.
+
+Train and export:
+    python -m app.services.intent_classifier --log decisions.jsonl --out intent.npz
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .metrics import INTENT_CLASSIFIER_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+INTENT_DECISION_LOG = os.getenv("INTENT_DECISION_LOG", "")
+INTENT_CLASSIFIER_PATH = os.getenv("INTENT_CLASSIFIER_PATH", "")
+
+
+class IntentClassifier:
+    """Logistic regression over cast embeddings predicting should_reply.
+
+    Casts scoring below ``reject_below`` are answered locally as no-reply;
+    everything else is uncertain (or needs identified needs from the LLM)
+    and is escalated.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, reject_below: float):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.reject_below = float(reject_below)
+        self.stats = {"local_no_reply": 0, "escalated": 0}
+
+    def predict_proba(self, vectors: np.ndarray) -> np.ndarray:
+        """Probability that each cast warrants a reply"""
+        logits = np.asarray(vectors, dtype=np.float32) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def decide(self, vector: Sequence[float]) -> Optional[float]:
+        """Return the reply probability if the cast is an obvious no-reply, else None"""
+        if len(vector) != len(self.weights):
+            self._count("escalated")
+            return None
+        probability = float(self.predict_proba(np.asarray([vector]))[0])
+        if probability < self.reject_below:
+            self._count("local_no_reply")
+            return probability
+        self._count("escalated")
+        return None
+
+    def _count(self, decision: str) -> None:
+        self.stats[decision] += 1
+        INTENT_CLASSIFIER_DECISIONS.inc(decision=decision)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get counts of locally answered (saved LLM calls) and escalated casts"""
+        return dict(self.stats)
+
+    @classmethod
+    def train(
+        cls,
+        vectors: np.ndarray,
+        labels: np.ndarray,
+        max_false_skip_rate: float = 0.02,
+        folds: int = 5,
+        epochs: int = 500,
+        learning_rate: float = 0.5,
+        l2: float = 1e-3,
+        seed: int = 0,
+    ) -> "IntentClassifier":
+        """Fit the model and pick the largest safe no-reply threshold.
+
+        The threshold is chosen on out-of-fold predictions (``folds``-fold
+        cross-validation) so that at most ``max_false_skip_rate`` of the casts
+        below it, each scored by a model that never saw it, were ones the LLM
+        decided to reply to. The returned model is fitted on all the data.
+        """
+        x = np.asarray(vectors, dtype=np.float32)
+        y = np.asarray(labels, dtype=np.float32)
+        model = cls(*_fit(x, y, epochs, learning_rate, l2), reject_below=0.0)
+        if folds < 2 or len(y) < folds:
+            return model
+
+        # Stratified folds so every fold sees the rarer "reply" decisions
+        rng = np.random.default_rng(seed)
+        fold_of = np.empty(len(y), dtype=int)
+        for label in (0.0, 1.0):
+            indices = rng.permutation(np.flatnonzero(y == label))
+            fold_of[indices] = np.arange(len(indices)) % folds
+
+        held_out = np.empty(len(y), dtype=np.float32)
+        for fold in range(folds):
+            test = fold_of == fold
+            fold_model = cls(*_fit(x[~test], y[~test], epochs, learning_rate, l2), 0.0)
+            held_out[test] = fold_model.predict_proba(x[test])
+
+        order = np.argsort(held_out)
+        false_skips = np.cumsum(y[order]) / np.arange(1, len(y) + 1)
+        safe = np.flatnonzero(false_skips <= max_false_skip_rate)
+        if len(safe):
+            # Everything up to the last safe prefix is skipped; place the
+            # threshold between it and the next cast
+            last = safe[-1]
+            upper = held_out[order[last + 1]] if last + 1 < len(y) else 1.0
+            model.reject_below = float((held_out[order[last]] + upper) / 2)
+        return model
+
+    def save(self, path: str) -> None:
+        """Export the model to an .npz file"""
+        np.savez(
+            path, weights=self.weights, bias=self.bias, reject_below=self.reject_below
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        """Load a model exported with save()"""
+        data = np.load(path)
+        return cls(data["weights"], float(data["bias"]), float(data["reject_below"]))
+
+
+def _fit(
+    x: np.ndarray, y: np.ndarray, epochs: int, learning_rate: float, l2: float
+) -> Tuple[np.ndarray, float]:
+    """Class-balanced L2-regularized logistic regression by gradient descent"""
+    # Balance classes so the rarer "reply" decisions are not drowned out
+    positives = max(y.sum(), 1.0)
+    negatives = max(len(y) - y.sum(), 1.0)
+    sample_weights = np.where(
+        y == 1, len(y) / (2 * positives), len(y) / (2 * negatives)
+    )
+
+    weights = np.zeros(x.shape[1], dtype=np.float32)
+    bias = 0.0
+    for _ in range(epochs):
+        probabilities = 1.0 / (1.0 + np.exp(-(x @ weights + bias)))
+        error = (probabilities - y) * sample_weights
+        weights -= learning_rate * (x.T @ error / len(y) + l2 * weights)
+        bias -= learning_rate * float(error.mean())
+    return weights, bias
+
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_loaded = False
+
+
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """Get the classifier configured by INTENT_CLASSIFIER_PATH, if any"""
+    global _classifier, _classifier_loaded
+    if not _classifier_loaded:
+        _classifier_loaded = True
+        if INTENT_CLASSIFIER_PATH and os.path.exists(INTENT_CLASSIFIER_PATH):
+            _classifier = IntentClassifier.load(INTENT_CLASSIFIER_PATH)
+            logger.info(f"Loaded intent classifier from {INTENT_CLASSIFIER_PATH}")
+    return _classifier
+
+
+async def record_intent_decision(cast_text: str, decision: Dict[str, Any]) -> None:
+    """Append an LLM intent decision to INTENT_DECISION_LOG for later training"""
+    if not INTENT_DECISION_LOG:
+        return
+    line = json.dumps(
+        {
+            "cast_text": cast_text,
+            "should_reply": bool(decision["should_reply"]),
+            "confidence": decision.get("confidence"),
+        },
+        ensure_ascii=False,
+    )
+    await asyncio.to_thread(_append_line, INTENT_DECISION_LOG, line)
+
+
+def _append_line(path: str, line: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def load_decisions(path: str) -> List[Dict[str, Any]]:
+    """Read logged intent decisions"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def train_from_log(
+    log_path: str,
+    out_path: str,
+    max_false_skip_rate: float = 0.02,
+    holdout_fraction: float = 0.2,
+) -> Dict[str, Any]:
+    """Embed logged casts, train a classifier and export it.
+
+    ``holdout_fraction`` of the decisions are kept out of training; the
+    reported skip and false-skip rates are measured on them.
+    """
+    from ..models.llm import get_embeddings_batch
+
+    decisions = load_decisions(log_path)
+    if not decisions:
+        raise ValueError(f"No intent decisions found in {log_path}")
+
+    vectors = np.asarray(
+        await get_embeddings_batch([d["cast_text"] for d in decisions]),
+        dtype=np.float32,
+    )
+    labels = np.asarray([1.0 if d["should_reply"] else 0.0 for d in decisions])
+    held_out = np.zeros(len(labels), dtype=bool)
+    held_out[
+        np.random.default_rng(0).permutation(len(labels))[
+            : int(len(labels) * holdout_fraction)
+        ]
+    ] = True
+
+    model = IntentClassifier.train(
+        vectors[~held_out], labels[~held_out], max_false_skip_rate
+    )
+    model.save(out_path)
+
+    skipped = model.predict_proba(vectors[held_out]) < model.reject_below
+    return {
+        "samples": len(decisions),
+        "held_out_samples": int(held_out.sum()),
+        "reply_rate": float(labels.mean()),
+        "reject_below": model.reject_below,
+        "held_out_skip_rate": float(skipped.mean()) if skipped.size else 0.0,
+        "held_out_false_skips": int(labels[held_out][skipped].sum()),
+        "held_out_false_skip_rate": (
+            float(labels[held_out][skipped].mean()) if skipped.any() else 0.0
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Train the local intent pre-classifier"
+    )
+    parser.add_argument("--log", default=INTENT_DECISION_LOG, help="JSONL decision log")
+    parser.add_argument(
+        "--out", default=INTENT_CLASSIFIER_PATH or "intent_classifier.npz"
+    )
+    parser.add_argument("--max-false-skip-rate", type=float, default=0.02)
+    parser.add_argument("--holdout-fraction", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        train_from_log(
+            args.log, args.out, args.max_false_skip_rate, args.holdout_fraction
+        )
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,121 @@
 """
 Logging service for workflow state tracking and monitoring
 """
+import atexit
+import contextvars
+import json
 import logging
+import os
+import queue
+import random
+import sys
 import time
-from dataclasses import dataclass, field
-from datetime import datetime
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, FrozenSet, List, Optional
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# "json" for one structured record per line, "text" for the plain format
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+TEXT_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Fraction of successful workflow executions whose events are logged;
+# failures are always logged with the full execution record
+WORKFLOW_LOG_SAMPLE_RATE = float(os.getenv("WORKFLOW_LOG_SAMPLE_RATE", "1.0"))
+
+_STANDARD_RECORD_FIELDS = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", None, None))
+) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as one JSON object, including any `extra` fields"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue records as-is; formatting and I/O happen on the listener thread"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue is in-process, so nothing needs to be made picklable
+        return record
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def configure_logging(
+    level: str = LOG_LEVEL,
+    log_format: str = LOG_FORMAT,
+    stream: Any = None,
+    force: bool = False,
+) -> None:
+    """Write root logging to a stream in the configured format.
+    
+    Like logging.basicConfig this does nothing if the root logger already has
+    handlers, unless force is set. Records are written by the logging thread
+    until start_queued_logging() moves the writing to a background thread.
+    """
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return
+    shutdown_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    
+    output = logging.StreamHandler(stream)
+    output.setFormatter(
+        JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_LOG_FORMAT)
+    )
+    root.addHandler(output)
+    root.setLevel(level)
+
+def start_queued_logging() -> None:
+    """Route root logging through a queue to a writer thread, so logging
+    calls never block on I/O"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    outputs = root.handlers[:]
+    for handler in outputs:
+        root.removeHandler(handler)
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(log_queue, *outputs, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """Flush queued records, stop the writer thread and write directly again"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    root.removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
+
+atexit.register(shutdown_logging)
+
+configure_logging()
 
 class WorkflowStatus(Enum):
     """Status of a workflow step"""
@@ -30,6 +133,7 @@ class WorkflowStep:
     end_time: Optional[float] = None
     error: Optional[str] = None
     metadata: Dict[str, Any] = field(default_factory=dict)
+    tokens: Dict[str, int] = field(default_factory=dict)
 
 @dataclass
 class WorkflowState:
@@ -43,24 +147,171 @@ class WorkflowState:
     status: WorkflowStatus = WorkflowStatus.PENDING
     error: Optional[str] = None
     metadata: Dict[str, Any] = field(default_factory=dict)
+    sampled: bool = True
+    
+    def total_tokens(self) -> Dict[str, int]:
+        """Token usage summed over all steps"""
+        totals: Dict[str, int] = {}
+        for step in self.steps:
+            for key, count in step.tokens.items():
+                totals[key] = totals.get(key, 0) + count
+        return totals
+    
+    def to_record(self) -> Dict[str, Any]:
+        """JSON-friendly copy of the full execution state"""
+        return json.loads(json.dumps(asdict(self), default=_json_default))
+
+def _json_default(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else str(value)
+
+@dataclass(frozen=True)
+class MetadataPolicy:
+    """Controls how much of the metadata passed to WorkflowLogger is retained.
+    
+    allowed_fields holds dotted paths ("result.intent_analysis"); when set,
+    only those subtrees are kept. Long strings and lists are truncated,
+    numeric lists at least vector_min_length long are replaced by a
+    placeholder, and any remaining list or string whose JSON form exceeds
+    max_field_bytes is replaced by a short description.
+    """
+    allowed_fields: Optional[FrozenSet[str]] = None
+    max_string_length: int = 256
+    max_list_items: int = 20
+    max_depth: int = 5
+    elide_vectors: bool = True
+    vector_min_length: int = 32
+    max_field_bytes: int = 4096
+
+def _allowed(path: str, allowed_fields: Optional[FrozenSet[str]]) -> bool:
+    """Whether a dotted path lies inside, or leads to, an allowed field"""
+    if allowed_fields is None:
+        return True
+    return any(
+        path == allowed
+        or path.startswith(allowed + ".")
+        or allowed.startswith(path + ".")
+        for allowed in allowed_fields
+    )
+
+def _is_vector(value: Any, policy: MetadataPolicy) -> bool:
+    if not policy.elide_vectors or len(value) < policy.vector_min_length:
+        return False
+    first = value[0]
+    return isinstance(first, (int, float)) and not isinstance(first, bool)
+
+def summarize_metadata(
+    value: Any, policy: MetadataPolicy, path: str = "", depth: int = 0
+) -> Any:
+    """Reduce a metadata value to a bounded, JSON-friendly copy under policy"""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    elif hasattr(value, "tolist"):
+        value = value.tolist()
+    
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        if len(value) > policy.max_string_length:
+            return value[:policy.max_string_length] + f"... ({len(value)} chars)"
+        return value
+    if depth >= policy.max_depth:
+        return f"<{type(value).__name__}>"
+    if isinstance(value, dict):
+        summary = {}
+        for key, item in value.items():
+            item_path = f"{path}.{key}" if path else str(key)
+            if _allowed(item_path, policy.allowed_fields):
+                summary[key] = summarize_metadata(item, policy, item_path, depth + 1)
+        return summary
+    if isinstance(value, (list, tuple)):
+        if _is_vector(value, policy):
+            return f"<vector dim={len(value)}>"
+        items = [
+            summarize_metadata(item, policy, path, depth + 1)
+            for item in value[:policy.max_list_items]
+        ]
+        if len(value) > policy.max_list_items:
+            items.append(f"... ({len(value) - policy.max_list_items} more)")
+        return items
+    return summarize_metadata(repr(value), policy, path, depth)
+
+def _cap_fields(summary: Dict[str, Any], policy: MetadataPolicy) -> Dict[str, Any]:
+    """Replace any non-dict field whose JSON form exceeds max_field_bytes"""
+    for key, value in summary.items():
+        if isinstance(value, dict):
+            _cap_fields(value, policy)
+            continue
+        size = len(json.dumps(value, default=str))
+        if size > policy.max_field_bytes:
+            summary[key] = f"<elided {type(value).__name__} of {size} bytes>"
+    return summary
+
+def retained_bytes(value: Any, _seen: Optional[set] = None) -> int:
+    """Approximate memory held by an object graph (dicts, lists, dataclasses)"""
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(
+            retained_bytes(k, seen) + retained_bytes(v, seen) for k, v in value.items()
+        )
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(retained_bytes(item, seen) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += retained_bytes(vars(value), seen)
+    return size
+
+def _duration_ms(start: Optional[float], end: Optional[float]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return round((end - start) * 1000, 3)
 
 class WorkflowLogger:
-    """Service for logging workflow execution and state tracking"""
+    """Service for logging workflow execution and state tracking.
+    
+    The workflow state is context-local: every asyncio task (and the tasks it
+    spawns) sees the execution it started, so one logger can track many
+    concurrent executions.
     
-    def __init__(self, workflow_name: str):
+    Events are logged as structured records (workflow_id, step, duration_ms,
+    tokens). Only a sample_rate fraction of executions log their progress;
+    failures are always logged, with the full execution record.
+    """
+    
+    def __init__(
+        self,
+        workflow_name: str,
+        metadata_policy: Optional[MetadataPolicy] = None,
+        sample_rate: Optional[float] = None,
+    ):
         self.logger = logging.getLogger(f"workflow.{workflow_name}")
         self.workflow_name = workflow_name
-        self.current_state: Optional[WorkflowState] = None
+        self.metadata_policy = metadata_policy or MetadataPolicy()
+        self.sample_rate = (
+            WORKFLOW_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        )
+        self._state: contextvars.ContextVar[Optional[WorkflowState]] = (
+            contextvars.ContextVar(f"workflow_state.{workflow_name}", default=None)
+        )
+    
+    @property
+    def current_state(self) -> Optional[WorkflowState]:
+        """State of the execution started in the current context"""
+        return self._state.get()
     
     def start_workflow(self, workflow_id: str, metadata: Optional[Dict[str, Any]] = None) -> WorkflowState:
-        """Start tracking a new workflow execution"""
-        self.current_state = WorkflowState(
+        """Start tracking a new workflow execution in the current context"""
+        state = WorkflowState(
             workflow_id=workflow_id,
             workflow_name=self.workflow_name,
-            metadata=metadata or {}
+            metadata=self._capture(metadata),
+            sampled=random.random() < self.sample_rate,
         )
-        self.logger.info(f"Starting workflow {workflow_id}")
-        return self.current_state
+        self._state.set(state)
+        self._log(logging.INFO, "workflow_started", f"Starting workflow {workflow_id}")
+        return state
     
     def add_step(self, step_name: str, metadata: Optional[Dict[str, Any]] = None) -> WorkflowStep:
         """Add a new step to the workflow"""
@@ -69,10 +320,12 @@ class WorkflowLogger:
         
         step = WorkflowStep(
             name=step_name,
-            metadata=metadata or {}
+            metadata=self._capture(metadata)
         )
         self.current_state.steps.append(step)
-        self.logger.info(f"Added step: {step_name}")
+        self._log(
+            logging.DEBUG, "step_added", f"Added step: {step_name}", step=step_name
+        )
         return step
     
     def start_step(self, step_name: str) -> None:
@@ -86,9 +339,16 @@ class WorkflowLogger:
         
         step.status = WorkflowStatus.IN_PROGRESS
         step.start_time = time.time()
-        self.logger.info(f"Starting step: {step_name}")
+        self._log(
+            logging.INFO, "step_started", f"Starting step: {step_name}", step=step_name
+        )
     
-    def complete_step(self, step_name: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+    def complete_step(
+        self,
+        step_name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        tokens: Optional[Dict[str, int]] = None,
+    ) -> None:
         """Mark a step as completed"""
         if not self.current_state:
             raise RuntimeError("No active workflow")
@@ -100,12 +360,27 @@ class WorkflowLogger:
         step.status = WorkflowStatus.COMPLETED
         step.end_time = time.time()
         if metadata:
-            step.metadata.update(metadata)
+            step.metadata.update(self._capture(metadata))
+        if tokens:
+            step.tokens = dict(tokens)
         
         self.current_state.current_step_index += 1
-        self.logger.info(f"Completed step: {step_name}")
+        self._log(
+            logging.INFO,
+            "step_completed",
+            f"Completed step: {step_name}",
+            step=step_name,
+            duration_ms=_duration_ms(step.start_time, step.end_time),
+            tokens=step.tokens,
+        )
     
-    def fail_step(self, step_name: str, error: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+    def fail_step(
+        self,
+        step_name: str,
+        error: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        tokens: Optional[Dict[str, int]] = None,
+    ) -> None:
         """Mark a step as failed"""
         if not self.current_state:
             raise RuntimeError("No active workflow")
@@ -118,11 +393,21 @@ class WorkflowLogger:
         step.end_time = time.time()
         step.error = error
         if metadata:
-            step.metadata.update(metadata)
+            step.metadata.update(self._capture(metadata))
+        if tokens:
+            step.tokens = dict(tokens)
         
         self.current_state.status = WorkflowStatus.FAILED
         self.current_state.error = error
-        self.logger.error(f"Step failed: {step_name} - {error}")
+        self._log(
+            logging.ERROR,
+            "step_failed",
+            f"Step failed: {step_name} - {error}",
+            step=step_name,
+            duration_ms=_duration_ms(step.start_time, step.end_time),
+            tokens=step.tokens,
+            error=error,
+        )
     
     def complete_workflow(self, metadata: Optional[Dict[str, Any]] = None) -> WorkflowState:
         """Mark the workflow as completed"""
@@ -132,9 +417,17 @@ class WorkflowLogger:
         self.current_state.end_time = time.time()
         self.current_state.status = WorkflowStatus.COMPLETED
         if metadata:
-            self.current_state.metadata.update(metadata)
+            self.current_state.metadata.update(self._capture(metadata))
         
-        self.logger.info(f"Completed workflow {self.current_state.workflow_id}")
+        self._log(
+            logging.INFO,
+            "workflow_completed",
+            f"Completed workflow {self.current_state.workflow_id}",
+            duration_ms=_duration_ms(
+                self.current_state.start_time, self.current_state.end_time
+            ),
+            tokens=self.current_state.total_tokens(),
+        )
         return self.current_state
     
     def fail_workflow(self, error: str, metadata: Optional[Dict[str, Any]] = None) -> WorkflowState:
@@ -146,15 +439,54 @@ class WorkflowLogger:
         self.current_state.status = WorkflowStatus.FAILED
         self.current_state.error = error
         if metadata:
-            self.current_state.metadata.update(metadata)
+            self.current_state.metadata.update(self._capture(metadata))
         
-        self.logger.error(f"Workflow failed: {error}")
+        self._log(
+            logging.ERROR,
+            "workflow_failed",
+            f"Workflow {self.current_state.workflow_id} failed: {error}",
+            duration_ms=_duration_ms(
+                self.current_state.start_time, self.current_state.end_time
+            ),
+            tokens=self.current_state.total_tokens(),
+            error=error,
+            record=self.current_state.to_record(),
+        )
         return self.current_state
     
+    def _log(self, level: int, event: str, message: str, **fields: Any) -> None:
+        """Emit a structured event for the current execution, if sampled"""
+        state = self.current_state
+        if level < logging.WARNING and not state.sampled:
+            return
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(
+            level,
+            message,
+            extra={
+                "event": event,
+                "workflow": self.workflow_name,
+                "workflow_id": state.workflow_id,
+                **fields,
+            },
+        )
+    
+    def get_retained_bytes(self) -> int:
+        """Approximate memory held by the current execution's state"""
+        return retained_bytes(self.current_state) if self.current_state else 0
+    
     def get_workflow_state(self) -> Optional[WorkflowState]:
         """Get the current workflow state"""
         return self.current_state
     
+    def _capture(self, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply the metadata policy to metadata about to be retained"""
+        if not metadata:
+            return {}
+        summary = summarize_metadata(metadata, self.metadata_policy)
+        return _cap_fields(summary, self.metadata_policy)
+    
     def _get_current_step(self) -> WorkflowStep:
         """Get the current step in the workflow"""
         if not self.current_state or not self.current_state.steps:
@@ -0,0 +1,295 @@
+"""
+In-process metrics exposed in the Prometheus text format
+
+Counters, gauges and histograms are plain in-memory values updated from the
+event loop (no locks, no background work), so they are cheap enough to leave
+on in production. ``REGISTRY.render()`` produces the /metrics payload.
+"""
+import functools
+import math
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Latency buckets in seconds, from cache hits up to long reasoning calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """A named metric family with a fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if len(labels) != len(self.label_names):
+            raise ValueError(
+                f"{self.name} expects labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        super().__init__(name, description, label_names)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: Any) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: Any) -> None:
+        self.values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (non-cumulative, +Inf last), sum]
+        self.values: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[Dict[str, Any]]:
+        """Observe the duration of the block; labels set in the yielded dict
+        (e.g. status) are applied when it ends"""
+        labels = dict(labels)
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def get_count(self, **labels: Any) -> int:
+        entry = self.values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                labels = _format_labels(self.label_names, key, le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and cache stats sources for rendering"""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.caches: Dict[str, Callable[[], Dict[str, int]]] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, description: str, label_names: Sequence[str] = ()
+    ) -> Counter:
+        return self._register(Counter(name, description, label_names))
+
+    def gauge(
+        self, name: str, description: str, label_names: Sequence[str] = ()
+    ) -> Gauge:
+        return self._register(Gauge(name, description, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, description, label_names, buckets))
+
+    def register_cache(
+        self, name: str, get_stats: Callable[[], Dict[str, int]]
+    ) -> None:
+        """Report a cache's hits/misses (read from get_stats at scrape time)"""
+        self.caches[name] = get_stats
+
+    def _cache_metrics(self) -> List[_Metric]:
+        hits = Counter("replyguy_cache_hits_total", "Cache hits", ("cache",))
+        misses = Counter("replyguy_cache_misses_total", "Cache misses", ("cache",))
+        ratio = Gauge("replyguy_cache_hit_ratio", "Cache hits / lookups", ("cache",))
+        for name, get_stats in self.caches.items():
+            stats = get_stats()
+            # Tiered caches report hits per tier (hits, disk_hits, ...)
+            hit_count = sum(
+                v for k, v in stats.items() if k == "hits" or k.endswith("_hits")
+            )
+            miss_count = stats.get("misses", 0)
+            hits.inc(hit_count, cache=name)
+            misses.inc(miss_count, cache=name)
+            lookups = hit_count + miss_count
+            ratio.set(hit_count / lookups if lookups else 0, cache=name)
+        return [hits, misses, ratio] if self.caches else []
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in [*self.metrics.values(), *self._cache_metrics()]:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_LATENCY = REGISTRY.histogram(
+    "replyguy_http_request_duration_seconds",
+    "API request latency",
+    ("endpoint", "method", "status"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "replyguy_http_requests_in_flight", "API requests being handled", ("endpoint",)
+)
+NODE_LATENCY = REGISTRY.histogram(
+    "replyguy_node_duration_seconds", "Workflow node latency", ("node", "status")
+)
+LLM_CALLS = REGISTRY.counter(
+    "replyguy_llm_calls_total", "OpenAI API calls", ("model", "kind", "status")
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "replyguy_llm_call_duration_seconds", "OpenAI API call latency", ("model", "kind")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "replyguy_llm_tokens_total",
+    "Tokens reported in OpenAI response usage",
+    ("model", "type"),
+)
+LLM_QUEUE_WAIT = REGISTRY.histogram(
+    "replyguy_llm_queue_wait_seconds",
+    "Time OpenAI calls waited for rate budget and concurrency",
+    ("model", "priority"),
+)
+LLM_COALESCED = REGISTRY.counter(
+    "replyguy_llm_coalesced_calls_total",
+    "Identical LLM calls that shared a request already in flight",
+    ("kind",),
+)
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "replyguy_llm_calls_in_flight", "OpenAI API calls awaiting a response", ("model",)
+)
+INTENT_CLASSIFIER_DECISIONS = REGISTRY.counter(
+    "replyguy_intent_classifier_decisions_total",
+    "Casts the local intent classifier answered as no-reply (an LLM call saved) "
+    "or escalated to the LLM",
+    ("decision",),
+)
+
+
+@contextmanager
+def observe_llm_call(model: str, kind: str) -> Iterator[Callable[[Any], None]]:
+    """Count and time an OpenAI call; call the yielded function with the
+    response's usage to record token counts"""
+    def record_usage(usage: Any) -> None:
+        for token_type in ("prompt", "completion"):
+            count = getattr(usage, f"{token_type}_tokens", None)
+            if count:
+                LLM_TOKENS.inc(count, model=model, type=token_type)
+
+    LLM_IN_FLIGHT.inc(model=model)
+    status = "error"
+    try:
+        with LLM_LATENCY.time(model=model, kind=kind):
+            yield record_usage
+        status = "ok"
+    finally:
+        LLM_IN_FLIGHT.dec(model=model)
+        LLM_CALLS.inc(model=model, kind=kind, status=status)
+
+
+def timed_node(func: Callable) -> Callable:
+    """Record a workflow node's latency by function name"""
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with NODE_LATENCY.time(node=func.__name__, status="error") as labels:
+            result = await func(*args, **kwargs)
+            labels["status"] = "ok"
+            return result
+    return wrapper
@@ -0,0 +1,146 @@
+"""
+Optional Redis tier shared by service replicas
+
+When REDIS_CACHE_URL is set, the in-process caches (embeddings, structured
+responses such as user summaries, trending clusters) look up what they miss
+in Redis and write through to it, so one replica's work is reused by the
+others. Lookups are one MGET and writes one pipelined round trip; Redis
+errors are logged and treated as misses so an outage only costs cache hits.
+Requires the optional ``redis`` package.
+"""
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Redis to share caches through (unset = in-process caches only), the key
+# prefix for this service, and the socket timeout for cache commands
+REDIS_CACHE_URL = os.getenv("REDIS_CACHE_URL", "")
+REDIS_CACHE_PREFIX = os.getenv("REDIS_CACHE_PREFIX", "replyguy:ai_agent:")
+REDIS_CACHE_TIMEOUT_SECONDS = float(os.getenv("REDIS_CACHE_TIMEOUT_SECONDS", "0.25"))
+
+_client: Optional[Any] = None
+
+
+def encode_vector(vector: List[float]) -> bytes:
+    """Pack a vector as little-endian float32 (4 bytes per dimension)"""
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def decode_vector(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype="<f4").tolist()
+
+
+def encode_json(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_json(data: bytes) -> Any:
+    return json.loads(data)
+
+
+class RedisCache:
+    """One namespace of cached values in Redis, encoded with a codec"""
+
+    def __init__(
+        self,
+        client: Any,
+        namespace: str,
+        ttl_seconds: Optional[float] = None,
+        encode: Callable[[Any], bytes] = encode_json,
+        decode: Callable[[bytes], Any] = decode_json,
+    ):
+        self.client = client
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.encode = encode
+        self.decode = decode
+        self.stats = {"hits": 0, "misses": 0, "errors": 0}
+
+    def _redis_key(self, key: str) -> str:
+        return f"{REDIS_CACHE_PREFIX}{self.namespace}:{key}"
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Look up keys with one MGET, returning only the ones that are cached"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        try:
+            values = await self.client.mget([self._redis_key(key) for key in keys])
+            found = {
+                key: self.decode(value)
+                for key, value in zip(keys, values, strict=True)
+                if value is not None
+            }
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Redis cache lookup failed ({self.namespace}): {e}")
+            return {}
+
+        self.stats["hits"] += len(found)
+        self.stats["misses"] += len(keys) - len(found)
+        return found
+
+    async def set_many(self, items: Dict[str, Any]) -> None:
+        """Store values in one pipelined round trip"""
+        if not items:
+            return
+        encoded = {
+            self._redis_key(key): self.encode(value) for key, value in items.items()
+        }
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            if self.ttl_seconds:
+                ttl = max(int(self.ttl_seconds), 1)
+                for key, value in encoded.items():
+                    pipe.set(key, value, ex=ttl)
+            else:
+                pipe.mset(encoded)
+            await pipe.execute()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Redis cache write failed ({self.namespace}): {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.stats)
+
+
+def get_redis_client() -> Optional[Any]:
+    """Get the shared Redis client, or None when no Redis tier is configured"""
+    global _client
+    if _client is None and REDIS_CACHE_URL:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            logger.warning(
+                "REDIS_CACHE_URL is set but the redis package is not installed"
+            )
+            return None
+        _client = redis.from_url(
+            REDIS_CACHE_URL,
+            socket_timeout=REDIS_CACHE_TIMEOUT_SECONDS,
+            socket_connect_timeout=REDIS_CACHE_TIMEOUT_SECONDS,
+        )
+    return _client
+
+
+def redis_tier(
+    namespace: str, ttl_seconds: Optional[float] = None, **codec: Any
+) -> Optional[RedisCache]:
+    """Build the Redis tier for a cache, or None when Redis is not configured"""
+    client = get_redis_client()
+    if client is None:
+        return None
+    return RedisCache(client, namespace, ttl_seconds, **codec)
+
+
+async def close_redis_client() -> None:
+    """Close the shared Redis client's connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
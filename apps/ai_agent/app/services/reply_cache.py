@@ -0,0 +1,131 @@
+"""
+Semantic cache of reply decisions for near-duplicate casts
+"""
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .clustering import normalize_rows
+
+# Result keys a cached entry replays
+CACHED_RESULT_KEYS = ("intent_analysis", "discovered_content", "reply", "reply_mode")
+
+
+def feed_key(feed: Dict[str, Any]) -> str:
+    """Identify a feed entry by its content"""
+    payload = json.dumps(feed, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray
+    feeds: FrozenSet[str]
+    result: Dict[str, Any]
+    created_at: float
+
+
+class SemanticReplyCache:
+    """Caches reply workflow results keyed by cast embedding.
+
+    A lookup hits when a live entry's cast embedding has cosine similarity of
+    at least ``similarity_threshold`` with the new cast and at least
+    ``min_feed_overlap`` of the candidate feeds the entry's reply was chosen
+    from are still available. Entries expire after ``ttl_seconds``; beyond
+    ``max_entries`` the least recently used entry is evicted.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.97,
+        min_feed_overlap: float = 0.8,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.min_feed_overlap = min_feed_overlap
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def get(
+        self, embedding: Sequence[float], feeds: Iterable[Dict[str, Any]]
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Find a cached result for a cast; returns (result, similarity) or None"""
+        self._drop_expired()
+        if not self._entries:
+            self.stats["misses"] += 1
+            return None
+
+        ids = list(self._entries)
+        matrix = np.stack([self._entries[i].vector for i in ids])
+        scores = matrix @ normalize_rows(np.asarray(embedding, dtype=np.float32))
+        available = {feed_key(feed) for feed in feeds}
+        for index in np.argsort(-scores):
+            score = float(scores[index])
+            if score < self.similarity_threshold:
+                break
+            entry = self._entries[ids[index]]
+            overlap = len(entry.feeds & available)
+            if entry.feeds and overlap < self.min_feed_overlap * len(entry.feeds):
+                continue
+            self._entries.move_to_end(ids[index])
+            self.stats["hits"] += 1
+            return copy.deepcopy(entry.result), score
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, embedding: Sequence[float], result: Dict[str, Any]) -> None:
+        """Cache a workflow result for the cast with this embedding (unless
+        it decided to reply but found no relevant content)"""
+        if "reply" not in result:
+            return
+        # A decision to reply depends on the feeds: a reply built from
+        # discovered content is keyed by the feeds it was chosen from, and
+        # "nothing relevant found" is not cached at all, since any new feed
+        # could change it
+        feeds = []
+        if result.get("discovered_content"):
+            feeds = result.get("available_feeds") or []
+            if "candidate_feed_indices" in result:
+                # Candidates may be trimmed copies of bundles; lookups see the
+                # untrimmed feeds, so key by those
+                feeds = [feeds[i] for i in result["candidate_feed_indices"]]
+        elif (result.get("intent_analysis") or {}).get("should_reply"):
+            return
+        self._entries[self._next_id] = _Entry(
+            vector=normalize_rows(np.asarray(embedding, dtype=np.float32)),
+            feeds=frozenset(feed_key(feed) for feed in feeds),
+            result=copy.deepcopy({key: result.get(key) for key in CACHED_RESULT_KEYS}),
+            created_at=time.monotonic(),
+        )
+        self._next_id += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get hit/miss/expiry/eviction counters and the current size"""
+        return {**self.stats, "size": len(self._entries)}
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self._entries.clear()
+
+    def _drop_expired(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired: List[int] = [
+            i for i, entry in self._entries.items() if entry.created_at < cutoff
+        ]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        self.stats["expired"] += len(expired)
@@ -0,0 +1,105 @@
+"""
+Exact-match cache of structured LLM responses with TTL and LRU eviction, and
+an optional shared Redis tier
+"""
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .redis_cache import RedisCache
+
+
+class ResponseCache:
+    """Caches parsed responses keyed by a canonical hash of the request.
+
+    Entries expire ``ttl_seconds`` after they are stored; beyond
+    ``max_entries`` the least recently used entry is evicted. Values are
+    copied in and out so callers may mutate what they get back. Local misses
+    are looked up in the ``remote`` (Redis) tier, which is written through.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 600,
+        remote: Optional[RedisCache] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.remote = remote
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+        }
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[Dict[str, Any]],
+        response_format: Dict[str, Any],
+        temperature: float,
+    ) -> str:
+        """Hash a request; key order inside dicts doesn't change the key"""
+        payload = json.dumps(
+            [model, messages, response_format, temperature],
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Get a live cached value, or None"""
+        value = self._get_local(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return copy.deepcopy(value)
+        if self.remote is not None:
+            found = await self.remote.get_many([key])
+            if key in found:
+                self.stats["redis_hits"] += 1
+                self._set_local(key, found[key])
+                return copy.deepcopy(found[key])
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        """Store a value for ttl_seconds"""
+        self._set_local(key, copy.deepcopy(value))
+        if self.remote is not None:
+            await self.remote.set_many({key: value})
+
+    def _get_local(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get hit/miss/expiry/eviction counters and the current size"""
+        return {**self.stats, "size": len(self._entries)}
+
+    def clear(self) -> None:
+        """Drop all entries"""
+        self._entries.clear()
@@ -0,0 +1,195 @@
+"""
+Lightweight in-process tracing with Chrome trace export
+
+A request opens a trace with ``trace_request``; code running inside it (and
+in tasks started from it) records nested timed spans with ``span``. Outside a
+trace ``span`` is a no-op. Finished traces can be written as Chrome trace
+event JSON (TRACE_DIR) and opened in chrome://tracing or ui.perfetto.dev as a
+flame chart.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Directory to write one trace file per request to (unset = no export), and
+# the minimum request duration worth exporting
+TRACE_DIR = os.getenv("TRACE_DIR", "")
+TRACE_MIN_DURATION_MS = float(os.getenv("TRACE_MIN_DURATION_MS", "0"))
+
+
+@dataclass
+class Span:
+    """A timed operation within a trace"""
+    name: str
+    start: float
+    lane: int = 0
+    end: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attributes: Any) -> None:
+        """Attach attributes (model, tokens, cache hit, ...) to the span"""
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end is None:
+            return None
+        return (self.end - self.start) * 1000
+
+
+class _NoopSpan:
+    """Stand-in returned by span() when no trace is active"""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans recorded for one request.
+
+    Spans are placed in lanes by the asyncio task that opened them, so spans
+    from concurrent tasks show up as separate rows in the flame chart.
+    """
+
+    def __init__(self, name: str, trace_id: Optional[str] = None):
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self._origin = time.perf_counter()
+        self._lanes: Dict[int, int] = {}
+
+    def _lane(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return self._lanes.setdefault(id(task), len(self._lanes))
+
+    @property
+    def duration_ms(self) -> float:
+        """Duration of the root span (or of the trace so far)"""
+        if self.spans and self.spans[0].end is not None:
+            return self.spans[0].duration_ms
+        return (time.perf_counter() - self._origin) * 1000
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Convert the spans to the Chrome trace event format"""
+        events: List[Dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": self.name}}
+        ]
+        now = time.perf_counter()
+        for span in self.spans:
+            end = span.end if span.end is not None else now
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": round((span.start - self._origin) * 1e6, 1),
+                    "dur": round((end - span.start) * 1e6, 1),
+                    "pid": 1,
+                    "tid": span.lane,
+                    "args": span.attributes,
+                }
+            )
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "trace_id": self.trace_id,
+                "name": self.name,
+                "started_at": self.started_at,
+            },
+        }
+
+    def export(self, directory: str) -> str:
+        """Write the trace as a Chrome trace JSON file and return its path"""
+        os.makedirs(directory, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", self.name).strip("_") or "trace"
+        path = os.path.join(
+            directory, f"{int(self.started_at)}-{safe_name}-{self.trace_id}.json"
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+        return path
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+
+def get_current_trace() -> Optional[Trace]:
+    """Get the trace of the current request, if any"""
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """Record a span around the block in the current trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+
+    current = Span(name, time.perf_counter(), lane=trace._lane(), attributes=attributes)
+    trace.spans.append(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current.end = time.perf_counter()
+
+
+def traced(name: str) -> Callable:
+    """Decorate an async function to run inside a span"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_node(name: str, func: Callable) -> Callable:
+    """Wrap a LangGraph node so each run is recorded as a node.<name> span"""
+    return traced(f"node.{name}")(func)
+
+
+@asynccontextmanager
+async def trace_request(name: str, **attributes: Any) -> AsyncIterator[Trace]:
+    """Trace everything inside the block, exporting it to TRACE_DIR afterwards"""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        with span(name, **attributes):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+        if TRACE_DIR and trace.duration_ms >= TRACE_MIN_DURATION_MS:
+            try:
+                path = await asyncio.to_thread(trace.export, TRACE_DIR)
+                logger.info(
+                    f"Wrote trace {trace.trace_id} "
+                    f"({trace.duration_ms:.0f}ms) to {path}"
+                )
+            except OSError as e:
+                logger.warning(f"Failed to export trace {trace.trace_id}: {e}")
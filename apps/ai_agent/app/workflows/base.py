@@ -3,15 +3,34 @@ Base workflow implementation
 """
 from typing import Dict, Any, List
 
+from langchain_openai import ChatOpenAI
 from langgraph.graph import Graph
 
+from ..models.llm import get_generation_model
+from ..services.tracing import traced
+
 class WorkflowConfig:
     """Base configuration for workflows"""
-    pass
+
+    def __init__(self, **settings: Any):
+        self.__dict__.update(settings)
+
+    def create_model(self) -> ChatOpenAI:
+        """Create the chat model described by this config"""
+        return ChatOpenAI(
+            model=getattr(self, "model_name", get_generation_model()),
+            max_tokens=getattr(self, "max_tokens", None),
+        )
 
 class BaseWorkflow:
     """Base class for all workflows"""
     
+    def __init_subclass__(cls, **kwargs: Any):
+        super().__init_subclass__(**kwargs)
+        # Record every run of a workflow as a workflow.<ClassName> span
+        if "process" in cls.__dict__:
+            cls.process = traced(f"workflow.{cls.__name__}")(cls.__dict__["process"])
+    
     def __init__(self, config: WorkflowConfig):
         self.config = config
         self.graph = None
@@ -1,20 +1,27 @@
 from typing import Any, Dict, List
 
 from langchain.prompts import ChatPromptTemplate
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
+from ..nodes import FEED_MIN_SIMILARITY, FEED_TOP_K
 from .base import BaseWorkflow, WorkflowConfig
 
 
 class ContentDiscoveryConfig(BaseModel):
     """Configuration for content discovery workflow"""
 
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     model: WorkflowConfig = WorkflowConfig(max_tokens=1000)
 
     max_candidates: int = 5
     min_relevance_score: float = 0.6
     similarity_threshold: float = 0.8
 
+    # Embedding prefilter applied before the discovery LLM (see prefilter_feeds)
+    feed_top_k: int = FEED_TOP_K
+    feed_min_similarity: float = FEED_MIN_SIMILARITY
+
 
 class ContentDiscoveryWorkflow(BaseWorkflow):
     """Workflow for discovering relevant content and replies"""
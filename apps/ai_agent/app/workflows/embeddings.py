@@ -1,11 +1,21 @@
 """
 Embeddings Generation Workflow
 """
-from typing import Dict, Any
+import os
+from typing import Any, Dict, List
 
 from langgraph.graph import Graph
 
-from ..models.llm import get_embeddings
+from ..models.llm import (
+    EMBEDDINGS_MAX_INPUT_TOKENS,
+    exceeds_embedding_input_limit,
+    get_embeddings,
+    get_embeddings_batch,
+)
+from ..services.tracing import traced, traced_node
+
+# Most texts accepted by one batch request
+EMBEDDINGS_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDINGS_BATCH_MAX_INPUTS", "2048"))
 
 class EmbeddingsWorkflow:
     """Workflow for generating embeddings"""
@@ -24,7 +34,8 @@ class EmbeddingsWorkflow:
         graph = Graph()
         
         # Add nodes
-        graph.add_node("generate_embedding", nodes["generate_embedding"])
+        for name, node in nodes.items():
+            graph.add_node(name, traced_node(name, node))
         
         # Set entry and end points
         graph.set_entry_point("generate_embedding")
@@ -33,6 +44,7 @@ class EmbeddingsWorkflow:
         # Compile
         return graph.compile()
     
+    @traced("workflow.EmbeddingsWorkflow")
     async def run(self, text: str) -> Dict[str, Any]:
         """Run the workflow"""
         # Generate embedding directly from text
@@ -42,4 +54,39 @@ class EmbeddingsWorkflow:
                 "vector": embedding,
                 "dimensions": len(embedding)
             }
-        } 
\ No newline at end of file
+        } 
+    
+    @traced("workflow.EmbeddingsWorkflow.batch")
+    async def run_batch(self, texts: List[Any]) -> Dict[str, Any]:
+        """Embed many texts, returning one item per input in input order.
+        
+        Duplicates are embedded once, cached texts are served locally and
+        the rest go upstream in concurrent size-limited requests. An invalid
+        or over-long text only fails its own item; a request failing for any
+        other reason fails the items it carried.
+        """
+        items: List[Dict[str, Any]] = [{"index": i} for i in range(len(texts))]
+        valid = []
+        for i, text in enumerate(texts):
+            if not isinstance(text, str) or not text.strip():
+                items[i]["error"] = "input must be a non-empty string"
+            elif exceeds_embedding_input_limit(text):
+                items[i]["error"] = (
+                    f"input exceeds the {EMBEDDINGS_MAX_INPUT_TOKENS}-token limit"
+                )
+            else:
+                valid.append(i)
+        
+        vectors = await get_embeddings_batch(
+            [texts[i] for i in valid], return_exceptions=True
+        )
+        for i, vector in zip(valid, vectors, strict=True):
+            if isinstance(vector, BaseException):
+                items[i]["error"] = str(vector) or type(vector).__name__
+            else:
+                items[i].update(vector=vector, dimensions=len(vector))
+        
+        return {
+            "embeddings": items,
+            "errors": sum("error" in item for item in items),
+        }
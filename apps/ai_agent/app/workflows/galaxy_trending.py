@@ -9,6 +9,7 @@ from ..nodes import (
     match_trending_to_user,
     suggest_viral_hooks,
 )
+from ..services.tracing import traced, traced_node
 
 
 class TrendingGalaxyWorkflow:
@@ -19,9 +20,18 @@ class TrendingGalaxyWorkflow:
 
     def _build_graph(self) -> Graph:
         graph = Graph()
-        graph.add_node("generate_trending_clusters", generate_trending_clusters)
-        graph.add_node("match_to_user_galaxy", match_trending_to_user)
-        graph.add_node("generate_viral_reply_ideas", suggest_viral_hooks)
+        graph.add_node(
+            "generate_trending_clusters",
+            traced_node("generate_trending_clusters", generate_trending_clusters),
+        )
+        graph.add_node(
+            "match_to_user_galaxy",
+            traced_node("match_to_user_galaxy", match_trending_to_user),
+        )
+        graph.add_node(
+            "generate_viral_reply_ideas",
+            traced_node("generate_viral_reply_ideas", suggest_viral_hooks),
+        )
 
         graph.add_edge("generate_trending_clusters", "match_to_user_galaxy")
         graph.add_edge("match_to_user_galaxy", "generate_viral_reply_ideas")
@@ -31,5 +41,6 @@ class TrendingGalaxyWorkflow:
 
         return graph.compile()
 
+    @traced("workflow.TrendingGalaxyWorkflow")
     async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         return await self.graph.ainvoke(inputs)
@@ -1,12 +1,14 @@
 from typing import Any, Dict, List
 
 from langchain.prompts import ChatPromptTemplate
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 from .base import BaseWorkflow, WorkflowConfig
 
 class IntentAnalysisConfig(BaseModel):
     """Configuration for intent analysis workflow"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     model: WorkflowConfig = WorkflowConfig(
         model_name="o4-mini",
         max_tokens=500
@@ -1,12 +1,50 @@
 """
 Reply Generation Workflow
 """
-from typing import Dict, Any
+import asyncio
+import inspect
+import logging
+import os
+import time
+from typing import Dict, Any, Optional
 
 from langgraph.graph import Graph
 
-from ..nodes import check_reply_intent, discover_relevant_content, generate_reply
+from ..models.llm import get_embeddings
+from ..nodes import (
+    check_intent_and_prefilter,
+    discover_relevant_content,
+    generate_reply,
+    generate_reply_fused,
+    prefilter_feeds,
+)
+from ..services.metrics import REGISTRY
+from ..services.reply_cache import SemanticReplyCache
+from ..services.tracing import span, traced_node
 from .base import BaseWorkflow, WorkflowConfig
+from .content_discovery import ContentDiscoveryConfig
+
+logger = logging.getLogger(__name__)
+
+# "staged" (intent -> discovery -> reply graph) or "fused" (one LLM call,
+# falling back to the staged graph); can be overridden per request
+REPLY_MODES = ("staged", "fused")
+REPLY_MODE = os.getenv("REPLY_MODE", "staged")
+if REPLY_MODE not in REPLY_MODES:
+    logger.warning(
+        f"Unknown REPLY_MODE {REPLY_MODE!r}, expected one of {REPLY_MODES}; "
+        "using staged"
+    )
+    REPLY_MODE = "staged"
+
+# Semantic reply cache: a cast whose embedding is within REPLY_CACHE_SIMILARITY
+# (cosine) of a recently answered one, with at least REPLY_CACHE_MIN_FEED_OVERLAP
+# of that reply's candidate feeds still available, reuses its intent decision
+# and reply. REPLY_CACHE_SIZE entries at most (0 disables the cache)
+REPLY_CACHE_SIZE = int(os.getenv("REPLY_CACHE_SIZE", "0"))
+REPLY_CACHE_TTL_SECONDS = float(os.getenv("REPLY_CACHE_TTL_SECONDS", "3600"))
+REPLY_CACHE_SIMILARITY = float(os.getenv("REPLY_CACHE_SIMILARITY", "0.97"))
+REPLY_CACHE_MIN_FEED_OVERLAP = float(os.getenv("REPLY_CACHE_MIN_FEED_OVERLAP", "0.8"))
 
 class ReplyGenerationConfig(WorkflowConfig):
     """Configuration for reply generation workflow"""
@@ -15,14 +53,31 @@ class ReplyGenerationConfig(WorkflowConfig):
 class ReplyGenerationWorkflow(BaseWorkflow):
     """Workflow for generating contextual replies"""
     
-    def __init__(self, config: ReplyGenerationConfig = ReplyGenerationConfig()):
+    def __init__(
+        self,
+        config: ReplyGenerationConfig = ReplyGenerationConfig(),
+        discovery_config: Optional[ContentDiscoveryConfig] = None,
+        reply_cache: Optional[SemanticReplyCache] = None,
+    ):
         super().__init__(config)
+        self.discovery_config = discovery_config or ContentDiscoveryConfig()
         self.graph = self._build_graph()
+        self.fused_graph = self._build_fused_graph()
+        if reply_cache is None and REPLY_CACHE_SIZE > 0:
+            reply_cache = SemanticReplyCache(
+                max_entries=REPLY_CACHE_SIZE,
+                ttl_seconds=REPLY_CACHE_TTL_SECONDS,
+                similarity_threshold=REPLY_CACHE_SIMILARITY,
+                min_feed_overlap=REPLY_CACHE_MIN_FEED_OVERLAP,
+            )
+        self.reply_cache = reply_cache
+        if reply_cache is not None:
+            REGISTRY.register_cache("replies", reply_cache.get_stats)
     
     def _get_workflow_steps(self) -> list[str]:
         """Get the list of steps in the workflow"""
         return [
-            "check_intent",
+            "check_intent_and_prefilter",
             "discover_content",
             "generate_reply"
         ]
@@ -31,7 +86,7 @@ class ReplyGenerationWorkflow(BaseWorkflow):
         """Build the workflow graph"""
         # Create nodes
         nodes = {
-            "check_intent": check_reply_intent,
+            "check_intent_and_prefilter": check_intent_and_prefilter,
             "discover_content": discover_relevant_content,
             "generate_reply": generate_reply
         }
@@ -40,35 +95,160 @@ class ReplyGenerationWorkflow(BaseWorkflow):
         graph = Graph()
         
         # Add nodes
-        graph.add_node("check_intent", nodes["check_intent"])
-        graph.add_node("discover_content", nodes["discover_content"])
-        graph.add_node("generate_reply", nodes["generate_reply"])
+        for name, node in nodes.items():
+            graph.add_node(name, traced_node(name, node))
         
         # Add edges
-        graph.add_edge("check_intent", "discover_content")
+        graph.add_edge("check_intent_and_prefilter", "discover_content")
         graph.add_edge("discover_content", "generate_reply")
         
         # Set entry and end points
-        graph.set_entry_point("check_intent")
+        graph.set_entry_point("check_intent_and_prefilter")
         graph.set_finish_point("generate_reply")
         
         # Compile
         return graph.compile()
     
-    async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Run the workflow"""
+    def _build_fused_graph(self) -> Graph:
+        """Build the single-LLM-call graph used in fused mode"""
+        graph = Graph()
+        
+        graph.add_node(
+            "prefilter_feeds", traced_node("prefilter_feeds", prefilter_feeds)
+        )
+        graph.add_node(
+            "generate_reply_fused",
+            traced_node("generate_reply_fused", generate_reply_fused),
+        )
+        
+        graph.add_edge("prefilter_feeds", "generate_reply_fused")
+        
+        graph.set_entry_point("prefilter_feeds")
+        graph.set_finish_point("generate_reply_fused")
+        
+        return graph.compile()
+    
+    async def process(
+        self, input_data: Dict[str, Any], use_reply_cache: bool = True
+    ) -> Dict[str, Any]:
+        """Run the workflow.
+        
+        input_data["mode"] selects "staged" or "fused" (default REPLY_MODE).
+        A fused run whose output fails validation falls back to the staged
+        graph; result["reply_mode"] records which path produced the reply.
+        
+        input_data["cast_summary"] may be a string or an awaitable still in
+        flight; only the steps that use the summary wait for it.
+        
+        With a reply cache (and use_reply_cache), a near-duplicate of a
+        recently answered cast reuses that result; result["reply_cache"]
+        records whether it did.
+        """
+        cast_summary = input_data.get("cast_summary")
+        if inspect.isawaitable(cast_summary):
+            cast_summary = asyncio.ensure_future(cast_summary)
+        
         # Prepare the initial state
         initial_state = {
             "cast_text": input_data["cast_text"],
-            "available_feeds": input_data.get("available_feeds", [])
+            "cast_summary": cast_summary,
+            "available_feeds": input_data.get("available_feeds", []),
+            "feed_top_k": self.discovery_config.feed_top_k,
+            "feed_min_similarity": self.discovery_config.feed_min_similarity,
         }
         
+        mode = input_data.get("mode") or REPLY_MODE
+        if mode not in REPLY_MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {REPLY_MODES}")
+        try:
+            if self.reply_cache is None or not use_reply_cache:
+                return await self._run(initial_state, mode)
+            return await self._run_cached(initial_state, mode)
+        finally:
+            # Don't leave a summary nobody waited for running in the background
+            if isinstance(cast_summary, asyncio.Future) and not cast_summary.done():
+                cast_summary.cancel()
+    
+    async def _run_cached(
+        self, initial_state: Dict[str, Any], mode: str
+    ) -> Dict[str, Any]:
+        """Serve the result from the reply cache, or run and cache it"""
+        # The prefilter embeds the cast too, so this is an embedding cache hit there
+        embedding = await get_embeddings(initial_state["cast_text"])
+        with span("reply_cache.lookup") as current:
+            cached = self.reply_cache.get(embedding, initial_state["available_feeds"])
+            current.set(hit=cached is not None)
+        if cached is not None:
+            result, similarity = cached
+            result = {**initial_state, **result}
+            result["reply_cache"] = {"hit": True, "similarity": round(similarity, 4)}
+            return self._finalize(result)
+        
+        result = await self._run(initial_state, mode)
+        self.reply_cache.put(embedding, result)
+        result["reply_cache"] = {"hit": False}
+        return result
+    
+    async def _run(self, initial_state: Dict[str, Any], mode: str) -> Dict[str, Any]:
+        """Run the fused or staged graph"""
+        if mode == "fused":
+            try:
+                result = await self.fused_graph.ainvoke(dict(initial_state))
+                result["reply_mode"] = "fused"
+                return self._finalize(result)
+            except ValueError as e:
+                logger.warning(
+                    f"Fused reply failed validation, using staged graph: {e}"
+                )
+                mode = "fused_fallback"
+        
         # Execute the workflow
         result = await self.graph.ainvoke(initial_state)
+        result["reply_mode"] = mode if mode == "fused_fallback" else "staged"
         
         # Return the raw result
+        return self._finalize(result)
+    
+    def _finalize(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace an unresolved cast summary with its value (or drop it)"""
+        summary = result.get("cast_summary")
+        if isinstance(summary, asyncio.Future):
+            if summary.done() and not summary.cancelled() and not summary.exception():
+                result["cast_summary"] = summary.result()
+            else:
+                result.pop("cast_summary")
         return result
     
+    async def compare_modes(
+        self, input_data: Dict[str, Any], fused_first: bool = False
+    ) -> Dict[str, Any]:
+        """Run the staged and fused modes on the same input and compare them.
+
+        Both runs bypass the reply cache, so neither replays the other's result.
+        The second run finds the cast and feed embeddings cached by the first;
+        alternate fused_first across cases so neither mode always gets them.
+        """
+        timings = {}
+        results = {}
+        order = ("fused", "staged") if fused_first else ("staged", "fused")
+        for mode in order:
+            started = time.perf_counter()
+            results[mode] = await self.process(
+                {**input_data, "mode": mode}, use_reply_cache=False
+            )
+            timings[mode] = time.perf_counter() - started
+        
+        staged, fused = results["staged"], results["fused"]
+        return {
+            "latency": timings,
+            "order": list(order),
+            "fused_mode": fused["reply_mode"],
+            "intent_agrees": staged["intent_analysis"]["should_reply"]
+            == fused["intent_analysis"]["should_reply"],
+            "link_agrees": staged["reply"]["link"] == fused["reply"]["link"],
+            "results": results,
+        }
+    
     def get_config(self) -> Dict[str, Any]:
         """Get the workflow configuration"""
         return self.config.__dict__ 
\ No newline at end of file
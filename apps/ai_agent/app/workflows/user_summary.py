@@ -6,6 +6,7 @@ from typing import Dict, Any
 from langgraph.graph import Graph
 
 from ..nodes import process_user_data, generate_user_embedding
+from ..services.tracing import traced, traced_node
 
 class UserSummaryWorkflow:
     """Workflow for generating user summaries and embeddings"""
@@ -25,8 +26,8 @@ class UserSummaryWorkflow:
         graph = Graph()
         
         # Add nodes
-        graph.add_node("process_data", nodes["process_data"])
-        graph.add_node("generate_embedding", nodes["generate_embedding"])
+        for name, node in nodes.items():
+            graph.add_node(name, traced_node(name, node))
         
         # Add edges
         graph.add_edge("process_data", "generate_embedding")
@@ -38,6 +39,7 @@ class UserSummaryWorkflow:
         # Compile
         return graph.compile()
     
+    @traced("workflow.UserSummaryWorkflow")
     async def run(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
         """Run the workflow"""
         return await self.graph.ainvoke(inputs) 
\ No newline at end of file
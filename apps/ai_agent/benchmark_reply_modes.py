@@ -0,0 +1,93 @@
+"""
+Benchmark the staged and fused reply generation modes against each other
+
+Usage:
+    poetry run python benchmark_reply_modes.py [casts.json]
+
+casts.json holds a list of {"cast_text": ..., "available_feeds": [...]} objects;
+without it a few built-in samples are used.
+"""
+import asyncio
+import json
+import statistics
+import sys
+from typing import Any, Dict, List
+
+from app.workflows.reply_generation import ReplyGenerationWorkflow
+
+SAMPLE_FEEDS = [
+    {
+        "text": (
+            "Just published a comprehensive guide on Frame deployment "
+            "strategies across different marketplaces."
+        ),
+        "author": "web3_expert",
+        "hash": "0x123",
+        "channel": "frames",
+    },
+    {
+        "text": (
+            "Hiring a senior Solidity engineer for our DeFi protocol on Base, DM me."
+        ),
+        "author": "defi_founder",
+        "hash": "0x456",
+        "channel": None,
+    },
+]
+
+SAMPLE_CASES = [
+    {"cast_text": "gm everyone", "available_feeds": SAMPLE_FEEDS},
+    {
+        "cast_text": "Any good guides for deploying my first Frame?",
+        "available_feeds": SAMPLE_FEEDS,
+    },
+    {
+        "cast_text": "Looking for Solidity roles, open to DeFi teams",
+        "available_feeds": SAMPLE_FEEDS,
+    },
+]
+
+
+async def run_benchmark(cases: List[Dict[str, Any]]) -> None:
+    workflow = ReplyGenerationWorkflow()
+    comparisons = []
+    for i, case in enumerate(cases):
+        # Alternate which mode runs second on warm embedding caches
+        comparison = await workflow.compare_modes(case, fused_first=i % 2 == 1)
+        comparisons.append(comparison)
+        print(
+            f"{case['cast_text'][:50]!r}: "
+            f"staged {comparison['latency']['staged']:.2f}s, "
+            f"fused {comparison['latency']['fused']:.2f}s "
+            f"({comparison['fused_mode']}), "
+            f"intent agrees: {comparison['intent_agrees']}, "
+            f"link agrees: {comparison['link_agrees']}"
+        )
+
+    staged = [c["latency"]["staged"] for c in comparisons]
+    fused = [c["latency"]["fused"] for c in comparisons]
+    fallbacks = sum(c["fused_mode"] == "fused_fallback" for c in comparisons)
+    intent_agreement = statistics.mean(c["intent_agrees"] for c in comparisons)
+    link_agreement = statistics.mean(c["link_agrees"] for c in comparisons)
+    print("\n=== Summary ===")
+    print(f"Cases: {len(comparisons)}")
+    print(
+        f"Staged latency: mean {statistics.mean(staged):.2f}s, "
+        f"median {statistics.median(staged):.2f}s"
+    )
+    print(
+        f"Fused latency:  mean {statistics.mean(fused):.2f}s, "
+        f"median {statistics.median(fused):.2f}s"
+    )
+    print(f"Fused fallbacks: {fallbacks}")
+    print(f"Intent agreement: {intent_agreement:.0%}")
+    print(f"Link agreement: {link_agreement:.0%}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            benchmark_cases = json.load(f)
+    else:
+        benchmark_cases = SAMPLE_CASES
+    asyncio.run(run_benchmark(benchmark_cases))
@@ -2,22 +2,96 @@
 Main FastAPI application
 """
 
+import asyncio
+from contextlib import asynccontextmanager
 from typing import Dict
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 
+from app.models.llm import (
+    call_priority,
+    close_client,
+    get_generation_model,
+    get_structured_response,
+    init_client,
+)
+from app.nodes import VIRAL_HOOKS_MODES
 from app.prompts import CAST_SUMMARY_PROMPT
-from app.workflows.embeddings import EmbeddingsWorkflow
+from app.services.logging_service import shutdown_logging, start_queued_logging
+from app.services.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_LATENCY, REGISTRY
+from app.services.tracing import trace_request
+from app.workflows.embeddings import EMBEDDINGS_BATCH_MAX_INPUTS, EmbeddingsWorkflow
 from app.workflows.galaxy_trending import TrendingGalaxyWorkflow
-from app.workflows.reply_generation import ReplyGenerationWorkflow
+from app.workflows.reply_generation import REPLY_MODES, ReplyGenerationWorkflow
 from app.workflows.user_summary import UserSummaryWorkflow
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared OpenAI connection pool and queue log writes for the
+    lifetime of the app"""
+    start_queued_logging()
+    await init_client()
+    yield
+    await close_client()
+    shutdown_logging()
+
+
 app = FastAPI(
     title="AI Reply Service",
     description="AI-powered reply recommendation service",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
+# Priority class for the LLM calls each endpoint makes: replies are served to
+# a waiting user, galaxy and user summaries are background refreshes
+ENDPOINT_PRIORITIES = {
+    "/api/generate-reply": "high",
+    "/api/galaxy-trending": "background",
+    "/api/user-summary": "background",
+}
+
+
+def _endpoint_label(path: str) -> str:
+    """Route path for metric labels; unknown paths share one label so they
+    can't inflate metric cardinality"""
+    if any(getattr(route, "path", None) == path for route in app.routes):
+        return path
+    return "unmatched"
+
+
+@app.middleware("http")
+async def instrument_api_requests(request: Request, call_next):
+    """Trace each API request (exported to TRACE_DIR when set), record its
+    latency and in-flight count, and set the priority of its LLM calls"""
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+
+    endpoint = _endpoint_label(request.url.path)
+    HTTP_IN_FLIGHT.inc(endpoint=endpoint)
+    try:
+        with HTTP_REQUEST_LATENCY.time(
+            endpoint=endpoint, method=request.method, status=500
+        ) as labels:
+            async with trace_request(request.url.path, method=request.method) as trace:
+                with call_priority(ENDPOINT_PRIORITIES.get(endpoint, "normal")):
+                    response = await call_next(request)
+                trace.spans[0].set(status_code=response.status_code)
+            labels["status"] = response.status_code
+    finally:
+        HTTP_IN_FLIGHT.dec(endpoint=endpoint)
+    response.headers["X-Trace-Id"] = trace.trace_id
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """Prometheus metrics"""
+    return REGISTRY.render()
+
+
 # Workflow Instances
 user_summary_workflow = UserSummaryWorkflow()
 reply_workflow = ReplyGenerationWorkflow()
@@ -38,9 +112,18 @@ async def generate_user_summary(request: Dict) -> Dict:
 @app.post("/api/generate-reply")
 async def generate_reply(request: Dict) -> Dict:
     """Generate a reply for a cast"""
+    reply_mode = request.get("reply_mode")
+    if reply_mode and reply_mode not in REPLY_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"reply_mode must be one of {', '.join(REPLY_MODES)}",
+        )
     try:
-        # First generate a summary of the cast
-        cast_summary = await generate_cast_summary(request["cast"]["text"])
+        # Start summarizing the cast; the workflow checks intent and prefilters
+        # feeds meanwhile and only the steps that use the summary wait for it
+        cast_summary = asyncio.ensure_future(
+            generate_cast_summary(request["cast"]["text"])
+        )
 
         # Combine similar and trending feeds into available_feeds
         available_feeds = []
@@ -54,6 +137,7 @@ async def generate_reply(request: Dict) -> Dict:
                 "cast_text": request["cast"]["text"],
                 "cast_summary": cast_summary,
                 "available_feeds": available_feeds,
+                "mode": reply_mode,
             }
         )
         return result
@@ -74,9 +158,34 @@ async def generate_embedding(request: Dict) -> Dict:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/generate-embedding/batch")
+async def generate_embedding_batch(request: Dict) -> Dict:
+    """Generate embeddings for a list of texts, with per-item errors"""
+    texts = request.get("input_data")
+    if not isinstance(texts, list):
+        raise HTTPException(
+            status_code=400, detail="input_data must be a list of texts"
+        )
+    if len(texts) > EMBEDDINGS_BATCH_MAX_INPUTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"input_data is limited to {EMBEDDINGS_BATCH_MAX_INPUTS} texts",
+        )
+    try:
+        return await embeddings_workflow.run_batch(texts)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e)) from e
+
+
 @app.post("/api/galaxy-trending")
 async def galaxy_trending(request: Dict) -> Dict:
     """Process trending cast galaxy from user feed"""
+    viral_hooks_mode = request.get("viral_hooks_mode")
+    if viral_hooks_mode and viral_hooks_mode not in VIRAL_HOOKS_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"viral_hooks_mode must be one of {', '.join(VIRAL_HOOKS_MODES)}",
+        )
     try:
         casts = request.get("casts", [])
         user_summary = request.get("user_summary", {})
@@ -84,6 +193,7 @@ async def galaxy_trending(request: Dict) -> Dict:
         inputs = {
             "casts": casts,
             "user_summary": user_summary,
+            "viral_hooks_mode": viral_hooks_mode,
         }
         result = await trending_galaxy_workflow.run(inputs)
         return {"status": "success", "data": result}
@@ -96,10 +206,25 @@ async def generate_cast_summary(cast_text: str) -> str:
     """Generate a summary of the cast text using the base model"""
     try:
         # Call the base model to generate a summary using the prompt
-        response = await base_model.generate(
-            CAST_SUMMARY_PROMPT.format(cast_text=cast_text)
+        response = await get_structured_response(
+            model=get_generation_model(),
+            messages=[
+                {
+                    "role": "system",
+                    "content": CAST_SUMMARY_PROMPT.format(cast_text=cast_text),
+                },
+                {
+                    "role": "user",
+                    "content": 'Respond with a JSON object: {"summary": "..."}',
+                },
+            ],
+            response_format={
+                "type": "object",
+                "properties": {"summary": {"type": "string"}},
+                "required": ["summary"],
+            },
         )
-        return response.strip()
+        return response["summary"].strip()
     except Exception as e:
         # If summary generation fails, return a basic summary
         return f"User's cast about: {cast_text[:100]}..."
@@ -28,7 +28,12 @@ def event_loop():
 @pytest.fixture(autouse=True)
 async def setup_test_env():
     """Setup any necessary test environment variables or configurations."""
-    # Add any test environment setup here
+    from app import nodes
+    from app.models import llm
+
+    # Don't let cached LLM responses or clusters leak between tests
+    llm._response_cache.clear()
+    nodes._cluster_cache.clear()
     yield
     # Add any cleanup here 
 
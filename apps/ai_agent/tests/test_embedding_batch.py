@@ -0,0 +1,115 @@
+"""
+Tests for the batch embedding endpoint
+"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from openai import BadRequestError
+
+from app.models import llm
+from app.services.embedding_cache import EmbeddingCache
+from app.workflows.embeddings import EmbeddingsWorkflow
+
+
+def rejected(message):
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    return BadRequestError(
+        message, response=httpx.Response(400, request=request), body=None
+    )
+
+
+class FlakyEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **kwargs):
+        texts = kwargs["input"]
+        self.calls.append(texts)
+        if "boom" in texts:
+            raise RuntimeError("upstream failed")
+        if any(len(text) > 100 for text in texts):
+            raise rejected("input too long")
+        return SimpleNamespace(
+            data=[
+                SimpleNamespace(index=i, embedding=[float(len(text)), 1.0])
+                for i, text in enumerate(texts)
+            ]
+        )
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    embeddings = FlakyEmbeddings()
+    client = SimpleNamespace(embeddings=embeddings)
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "_embedding_cache", EmbeddingCache())
+    monkeypatch.setattr(llm, "_schedulers", {})
+    return embeddings
+
+
+def test_batch_endpoint_dedupes_and_reports_per_item_errors(embeddings, monkeypatch):
+    import main
+
+    monkeypatch.setattr(llm, "EMBEDDINGS_MAX_BATCH_SIZE", 2)
+    llm._embedding_cache._remember(llm._embedding_cache_key("gm"), [9.0, 9.0])
+    client = TestClient(main.app)
+
+    response = client.post(
+        "/api/generate-embedding/batch",
+        json={"input_data": ["frames", "base", "gm", "boom", "frames", "", 42]},
+    )
+
+    assert response.status_code == 200
+    items = response.json()["embeddings"]
+    assert [item["index"] for item in items] == list(range(7))
+    assert items[0] == {"index": 0, "vector": [6.0, 1.0], "dimensions": 2}
+    assert items[1]["vector"] == [4.0, 1.0]
+    assert items[2]["vector"] == [9.0, 9.0]  # served from the local cache
+    assert items[3] == {"index": 3, "error": "upstream failed"}
+    assert items[4]["vector"] == items[0]["vector"]
+    assert "error" in items[5] and "error" in items[6]
+    assert response.json()["errors"] == 3
+    # Unique uncached texts only, in upstream batches of at most two
+    assert sorted(embeddings.calls) == [["boom"], ["frames", "base"]]
+
+
+def test_batch_endpoint_rejects_non_list_input():
+    import main
+
+    response = TestClient(main.app).post(
+        "/api/generate-embedding/batch", json={"input_data": "just one text"}
+    )
+
+    assert response.status_code == 400
+
+
+async def test_rejected_texts_only_fail_their_own_item(embeddings, monkeypatch):
+    monkeypatch.setattr(llm, "EMBEDDINGS_MAX_INPUT_TOKENS", 1000)
+    texts = ["a", "b", "x" * 900, "c", "y" * 5000]
+
+    result = await EmbeddingsWorkflow().run_batch(texts)
+
+    items = result["embeddings"]
+    assert result["errors"] == 2
+    assert [items[i]["vector"][0] for i in (0, 1, 3)] == [1.0, 1.0, 1.0]
+    # Rejected upstream: the request is split until the bad text is isolated
+    assert "input too long" in items[2]["error"]
+    # Over the token limit: never sent upstream
+    assert "token limit" in items[4]["error"]
+    assert all("y" * 5000 not in call for call in embeddings.calls)
+
+
+async def test_rejected_text_only_fails_its_own_coalesced_caller(embeddings):
+    results = await asyncio.gather(
+        llm.get_embeddings("short text"),
+        llm.get_embeddings("x" * 200),
+        return_exceptions=True,
+    )
+
+    assert results[0] == [10.0, 1.0]
+    assert isinstance(results[1], BadRequestError)
+    # Both texts were coalesced into one request before it was split
+    assert embeddings.calls[0] == ["short text", "x" * 200]
@@ -0,0 +1,260 @@
+"""
+Tests for the Trending Galaxy nodes
+"""
+import asyncio
+import json
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import nodes
+from app.services.clustering import cluster_embeddings
+
+MATCHED_CLUSTERS = [
+    {
+        "topic": "ai agents",
+        "score": 0.9,
+        "top_casts": [{"text": "agents are eating SaaS"}, {"text": "slow cast"}],
+    },
+    {
+        "topic": "frames",
+        "score": 0.7,
+        "top_casts": [{"text": "frames v2 is live"}],
+    },
+]
+
+
+@pytest.fixture
+def fake_viral_llm(monkeypatch):
+    calls = {"in_flight": 0, "max_in_flight": 0, "count": 0}
+
+    async def fake_response(model, messages, response_format, temperature=1.0):
+        calls["count"] += 1
+        calls["in_flight"] += 1
+        calls["max_in_flight"] = max(calls["max_in_flight"], calls["in_flight"])
+        post = messages[-1]["content"].split('Post: "')[1].split('"')[0]
+        try:
+            await asyncio.sleep(1 if post == "slow cast" else 0.05)
+        finally:
+            calls["in_flight"] -= 1
+        return {"suggested_reply": f"reply to {post}"}
+
+    monkeypatch.setattr(nodes, "get_structured_response", fake_response)
+    return calls
+
+
+async def test_viral_hooks_run_concurrently_in_order(fake_viral_llm, monkeypatch):
+    monkeypatch.setattr(nodes, "VIRAL_HOOK_TIMEOUT", 0.5)
+
+    state = await nodes.suggest_viral_hooks({"matched_clusters": MATCHED_CLUSTERS})
+
+    suggestions = state["viral_suggestions"]
+    assert [s["topic"] for s in suggestions] == ["ai agents", "frames"]
+    # The slow call times out without holding back the rest of the galaxy
+    assert [c["suggested_reply"] for c in suggestions[0]["cast_suggestions"]] == [
+        "reply to agents are eating SaaS"
+    ]
+    assert suggestions[1]["cast_suggestions"][0]["suggested_reply"] == (
+        "reply to frames v2 is live"
+    )
+    assert fake_viral_llm["max_in_flight"] == 3
+
+
+async def test_viral_hooks_respect_concurrency_limit(fake_viral_llm, monkeypatch):
+    monkeypatch.setattr(nodes, "VIRAL_HOOKS_CONCURRENCY", 1)
+    monkeypatch.setattr(nodes, "VIRAL_HOOK_TIMEOUT", 0.5)
+
+    await nodes.suggest_viral_hooks({"matched_clusters": MATCHED_CLUSTERS})
+
+    assert fake_viral_llm["max_in_flight"] == 1
+
+
+async def test_batched_viral_hooks_fall_back_for_missing_items(monkeypatch):
+    calls = []
+
+    async def fake_response(model, messages, response_format, temperature=1.0):
+        calls.append(messages)
+        if messages[0]["content"] == nodes.VIRAL_HOOKS_BATCH_PROMPT:
+            # The batched response skips the second cast of the first cluster
+            return {
+                "suggestions": [
+                    {"id": "0-0", "suggested_reply": "batched 0-0"},
+                    {"id": "1-0", "suggested_reply": "batched 1-0"},
+                ]
+            }
+        return {"suggested_reply": "fallback"}
+
+    monkeypatch.setattr(nodes, "get_structured_response", fake_response)
+
+    state = await nodes.suggest_viral_hooks(
+        {"matched_clusters": MATCHED_CLUSTERS, "viral_hooks_mode": "batched"}
+    )
+
+    replies = [
+        [c["suggested_reply"] for c in s["cast_suggestions"]]
+        for s in state["viral_suggestions"]
+    ]
+    assert replies == [["batched 0-0", "fallback"], ["batched 1-0"]]
+    assert len(calls) == 2
+
+
+async def test_unknown_viral_hooks_mode_is_rejected():
+    import main
+
+    with pytest.raises(ValueError):
+        await nodes.suggest_viral_hooks(
+            {"matched_clusters": MATCHED_CLUSTERS, "viral_hooks_mode": "bacthed"}
+        )
+    response = TestClient(main.app).post(
+        "/api/galaxy-trending", json={"casts": [], "viral_hooks_mode": "bacthed"}
+    )
+    assert response.status_code == 400
+
+
+async def test_match_trending_to_user_ranks_by_cosine_similarity():
+    clusters = [
+        {
+            "topic": f"topic {i}",
+            "embedding": [float(i), 1.0, 0.0],
+            "casts": [{"text": f"cast {j}", "engagement": j} for j in range(5)],
+        }
+        for i in range(10)
+    ]
+    clusters.append({"topic": "empty", "embedding": [0.0, 0.0, 0.0], "casts": []})
+
+    state = await nodes.match_trending_to_user(
+        {"user_embedding": [1.0, 0.0, 0.0], "trending_clusters": clusters}
+    )
+
+    matched = state["matched_clusters"]
+    assert [c["topic"] for c in matched] == ["topic 9", "topic 8", "topic 7"]
+    assert matched[0]["score"] == pytest.approx(9 / (82 ** 0.5))
+    assert [c["engagement"] for c in matched[0]["top_casts"]] == [4, 3, 2]
+
+
+async def test_match_trending_to_user_without_clusters():
+    state = await nodes.match_trending_to_user(
+        {"user_embedding": [1.0, 0.0], "trending_clusters": []}
+    )
+
+    assert state["matched_clusters"] == []
+
+
+def test_cluster_embeddings_groups_similar_vectors():
+    embeddings = np.array(
+        [
+            [1.0, 0.05, 0.0],
+            [0.0, 1.0, 0.0],
+            [0.95, 0.0, 0.1],
+            [0.0, 0.9, 0.1],
+            [0.0, 0.0, 1.0],
+        ]
+    )
+
+    labels, centroids = cluster_embeddings(embeddings, similarity_threshold=0.8)
+
+    assert labels[0] == labels[2]
+    assert labels[1] == labels[3]
+    assert len({labels[0], labels[1], labels[4]}) == 3
+    assert centroids.shape == (3, 3)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0)
+
+
+def test_cluster_embeddings_scales_to_large_unstructured_input():
+    rng = np.random.default_rng(0)
+    unrelated = rng.normal(size=(2000, 256))
+    topics = np.repeat(rng.normal(size=(4, 256)), 500, axis=0)
+    grouped = topics + rng.normal(size=(2000, 256)) * 0.1
+
+    started = time.perf_counter()
+    unrelated_labels, _ = cluster_embeddings(unrelated, similarity_threshold=0.5)
+    grouped_labels, grouped_centroids = cluster_embeddings(
+        grouped, similarity_threshold=0.5
+    )
+
+    # Loose enough for slow CI; O(k·N²) seeding is far slower on this input
+    assert time.perf_counter() - started < 30
+    # Nothing is similar enough to group, so every vector is its own cluster
+    assert len(np.unique(unrelated_labels)) == 2000
+    assert len(grouped_centroids) == 4
+    assert all(len(set(grouped_labels[i : i + 500])) == 1 for i in range(0, 2000, 500))
+
+
+async def test_trending_casts_are_capped(monkeypatch):
+    async def fake_build(state):
+        state["trending_clusters"] = [{"topic": "t", "casts": state["casts"]}]
+
+    monkeypatch.setattr(nodes, "TRENDING_MAX_CASTS", 3)
+    monkeypatch.setattr(nodes, "_build_trending_clusters", fake_build)
+
+    engagement = [5, 40, 1, 30, 20]
+    state = await nodes.generate_trending_clusters(
+        {"casts": [{"text": str(i), "engagement": e} for i, e in enumerate(engagement)]}
+    )
+
+    # The most engaged casts are kept, in request order
+    clustered = state["trending_clusters"][0]["casts"]
+    assert [cast["text"] for cast in clustered] == ["1", "3", "4"]
+
+
+async def test_generate_trending_clusters_uses_cast_embeddings(monkeypatch):
+    casts = [
+        {"text": "base is cheap"},
+        {"text": "frames everywhere"},
+        {"text": "base fees are tiny"},
+    ]
+    vectors = {
+        "base is cheap": [1.0, 0.0],
+        "frames everywhere": [0.0, 1.0],
+        "base fees are tiny": [0.9, 0.1],
+    }
+    embedded = []
+
+    async def fake_embeddings_batch(texts):
+        embedded.append(texts)
+        return [vectors[text] for text in texts]
+
+    async def fake_response(model, messages, response_format, temperature=1.0):
+        return {"topics": [["Base"], ["frames"], ["base", "fees"]]}
+
+    monkeypatch.setattr(nodes, "get_embeddings_batch", fake_embeddings_batch)
+    monkeypatch.setattr(nodes, "get_structured_response", fake_response)
+
+    state = await nodes.generate_trending_clusters({"casts": casts})
+
+    clusters = sorted(state["trending_clusters"], key=lambda c: c["topic"])
+    assert [c["topic"] for c in clusters] == ["base", "frames"]
+    assert [c["text"] for c in clusters[0]["casts"]] == [
+        "base is cheap",
+        "base fees are tiny",
+    ]
+    assert clusters[0]["embedding"][0] > clusters[0]["embedding"][1]
+    # One batched embedding call for the casts, none per cluster
+    assert embedded == [[c["text"] for c in casts]]
+
+
+async def test_extract_topics_llm_chunks_and_realigns(monkeypatch):
+    casts = [{"text": f"post {i}"} for i in range(7)]
+    prompts = []
+
+    async def fake_response(model, messages, response_format, temperature=1.0):
+        posts = json.loads(messages[-1]["content"].split("\n", 1)[1])
+        prompts.append(posts)
+        if "post 4" in posts and len(posts) > 1:
+            # Misaligned answer for this chunk forces a split and retry
+            return {"topics": [["oops"]]}
+        return {"topics": [[post.replace(" ", "-")] for post in posts]}
+
+    monkeypatch.setattr(nodes, "get_structured_response", fake_response)
+    monkeypatch.setattr(nodes, "TOPIC_CHUNK_MAX_CASTS", 3)
+
+    state = await nodes.extract_topics_llm({"casts": casts})
+
+    assert state["topics"] == [[f"post-{i}"] for i in range(7)]
+    assert prompts[:3] == [
+        ["post 0", "post 1", "post 2"],
+        ["post 3", "post 4", "post 5"],
+        ["post 6"],
+    ]
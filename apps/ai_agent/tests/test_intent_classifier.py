@@ -0,0 +1,124 @@
+"""
+Tests for the local intent pre-classifier
+"""
+import json
+
+import numpy as np
+import pytest
+
+from app import nodes
+from app.services import intent_classifier
+from app.services.intent_classifier import IntentClassifier
+from app.services.metrics import INTENT_CLASSIFIER_DECISIONS
+
+
+def make_training_data(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # "Reply" casts lean towards the first axis, greetings towards the second
+    replies = rng.normal([1.0, 0.0, 0.0, 0.0], 0.2, size=(60, 4))
+    greetings = rng.normal([0.0, 1.0, 0.0, 0.0], 0.2, size=(140, 4))
+    vectors = np.vstack([replies, greetings])
+    labels = np.concatenate([np.ones(60), np.zeros(140)])
+    return vectors, labels
+
+
+def test_trained_classifier_skips_obvious_no_reply_casts(tmp_path):
+    vectors, labels = make_training_data()
+    model = IntentClassifier.train(vectors, labels, max_false_skip_rate=0.0)
+
+    assert model.decide([0.0, 1.0, 0.0, 0.0]) is not None
+    assert model.decide([1.0, 0.0, 0.0, 0.0]) is None
+    # Vectors of the wrong size are always escalated
+    assert model.decide([1.0, 0.0]) is None
+    assert model.get_stats() == {"local_no_reply": 1, "escalated": 2}
+
+    path = str(tmp_path / "intent.npz")
+    model.save(path)
+    loaded = IntentClassifier.load(path)
+    assert loaded.reject_below == pytest.approx(model.reject_below)
+    assert np.allclose(loaded.weights, model.weights)
+
+
+def test_threshold_holds_on_unseen_casts():
+    rng = np.random.default_rng(1)
+    direction = rng.normal(size=64)
+
+    def noisy_data(n):
+        vectors = rng.normal(size=(n, 64)) / 8
+        labels = (vectors @ direction * 4 + rng.normal(size=n) > 0).astype(float)
+        return vectors, labels
+
+    vectors, labels = noisy_data(300)
+    unseen_vectors, unseen_labels = noisy_data(2000)
+    model = IntentClassifier.train(vectors, labels, max_false_skip_rate=0.05)
+
+    skipped = model.predict_proba(unseen_vectors) < model.reject_below
+    if skipped.any():
+        assert unseen_labels[skipped].mean() <= 0.1
+
+
+async def test_train_from_log_reports_held_out_false_skips(tmp_path, monkeypatch):
+    from app.models import llm
+
+    vectors, labels = make_training_data()
+    log_path = tmp_path / "decisions.jsonl"
+    log_path.write_text(
+        "".join(
+            json.dumps({"cast_text": str(i), "should_reply": bool(label)}) + "\n"
+            for i, label in enumerate(labels)
+        )
+    )
+
+    async def fake_embeddings_batch(texts):
+        return [vectors[int(text)].tolist() for text in texts]
+
+    monkeypatch.setattr(llm, "get_embeddings_batch", fake_embeddings_batch)
+
+    report = await intent_classifier.train_from_log(
+        str(log_path), str(tmp_path / "intent.npz"), max_false_skip_rate=0.0
+    )
+
+    assert report["held_out_samples"] == 40
+    assert report["held_out_false_skips"] == 0
+    assert 0.5 < report["held_out_skip_rate"] < 0.9
+
+
+async def test_check_reply_intent_answers_locally(monkeypatch):
+    vectors, labels = make_training_data()
+    model = IntentClassifier.train(vectors, labels, max_false_skip_rate=0.0)
+    llm_calls = []
+
+    async def fake_embeddings(text):
+        return [0.0, 1.0, 0.0, 0.0] if text == "gm" else [1.0, 0.0, 0.0, 0.0]
+
+    async def fake_response(model, messages, response_format, **kwargs):
+        llm_calls.append(messages)
+        return {"should_reply": True, "identified_needs": ["help"], "confidence": 0.9}
+
+    monkeypatch.setattr(nodes, "get_intent_classifier", lambda: model)
+    monkeypatch.setattr(nodes, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(nodes, "get_structured_response", fake_response)
+
+    local = await nodes.check_reply_intent({"cast_text": "gm"})
+    escalated = await nodes.check_reply_intent(
+        {"cast_text": "how do I deploy a frame?"}
+    )
+
+    assert local["intent_analysis"]["should_reply"] is False
+    assert local["intent_analysis"]["source"] == "local_classifier"
+    assert escalated["intent_analysis"]["should_reply"] is True
+    assert len(llm_calls) == 1
+    assert INTENT_CLASSIFIER_DECISIONS.get(decision="local_no_reply") >= 1
+
+
+async def test_intent_decisions_are_logged_for_training(tmp_path, monkeypatch):
+    log_path = str(tmp_path / "decisions.jsonl")
+    monkeypatch.setattr(intent_classifier, "INTENT_DECISION_LOG", log_path)
+
+    await intent_classifier.record_intent_decision(
+        "gm", {"should_reply": False, "confidence": 0.95}
+    )
+
+    assert intent_classifier.load_decisions(log_path) == [
+        {"cast_text": "gm", "should_reply": False, "confidence": 0.95}
+    ]
@@ -0,0 +1,399 @@
+"""
+Tests for the async LLM client layer
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import llm
+from app.models.embedding_batcher import EmbeddingBatcher
+from app.services import response_cache
+from app.services.embedding_cache import EmbeddingCache
+from app.services.response_cache import ResponseCache
+
+
+class FakeCompletions:
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        content = json.dumps({"echo": kwargs["messages"][-1]["content"]})
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(
+                prompt_tokens=10, completion_tokens=5, total_tokens=15
+            ),
+        )
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        texts = kwargs["input"]
+        # Return items out of order to check that results are re-sorted by index
+        return SimpleNamespace(
+            data=[
+                SimpleNamespace(index=i, embedding=[float(len(text)), float(i)])
+                for i, text in reversed(list(enumerate(texts)))
+            ]
+        )
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=FakeCompletions()),
+        embeddings=FakeEmbeddings(),
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "_embedding_cache", EmbeddingCache())
+    monkeypatch.setattr(llm, "_schedulers", {})
+    return client
+
+
+async def test_structured_responses_run_concurrently(fake_client):
+    results = await asyncio.gather(
+        *[
+            llm.get_structured_response(
+                model=llm.REASONING_MODEL,
+                messages=[{"role": "user", "content": f"cast {i}"}],
+                response_format={},
+            )
+            for i in range(5)
+        ]
+    )
+
+    assert [r["echo"] for r in results] == [f"cast {i}" for i in range(5)]
+    assert fake_client.chat.completions.max_in_flight == 5
+
+
+async def test_requests_use_per_model_timeouts(fake_client):
+    await llm.get_structured_response(
+        model=llm.REASONING_MODEL,
+        messages=[{"role": "user", "content": "hi"}],
+        response_format={},
+    )
+    await llm.get_embeddings("hi")
+
+    assert fake_client.chat.completions.calls[0]["timeout"] == llm.get_model_timeout(
+        llm.REASONING_MODEL
+    )
+    assert fake_client.embeddings.calls[0]["timeout"] == llm.get_model_timeout(
+        llm.EMBEDDINGS_MODEL
+    )
+
+
+async def test_token_usage_is_tracked_per_block(fake_client):
+    messages = [{"role": "user", "content": "hi"}]
+
+    with llm.track_token_usage() as outer:
+        await llm.get_structured_response(llm.GENERATION_MODEL, messages, {})
+        with llm.track_token_usage() as inner:
+            await asyncio.gather(
+                llm.get_structured_response(llm.GENERATION_MODEL, messages, {}),
+                llm.get_structured_response(
+                    llm.GENERATION_MODEL, [{"role": "user", "content": "hello"}], {}
+                ),
+            )
+
+    assert inner == {"prompt_tokens": 20, "completion_tokens": 10, "total_tokens": 30}
+    assert outer == {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+
+
+async def test_opted_in_structured_responses_are_cached(fake_client):
+    a, b = {"type": "string"}, {"type": "number"}
+    schema = {"type": "object", "properties": {"a": a, "b": b}}
+    reordered = {"properties": {"b": b, "a": a}, "type": "object"}
+    messages = [{"role": "user", "content": "same cast"}]
+    ask = llm.get_structured_response
+
+    first = await ask(llm.REASONING_MODEL, messages, schema, cache=True)
+    first["echo"] = "mutated by caller"
+    second = await ask(llm.REASONING_MODEL, messages, reordered, cache=True)
+    await ask(llm.REASONING_MODEL, messages, schema)
+    await ask(llm.GENERATION_MODEL, messages, schema, cache=True)
+
+    assert second == {"echo": "same cast"}
+    # The uncached call and the other model each made their own request
+    assert len(fake_client.chat.completions.calls) == 3
+    stats = llm.get_response_cache_stats()
+    assert stats["hits"] == 1 and stats["size"] == 2
+
+
+async def test_on_fresh_runs_once_per_upstream_call(fake_client):
+    messages = [{"role": "user", "content": "should I reply?"}]
+    fresh = []
+
+    async def on_fresh(response):
+        fresh.append(response)
+
+    async def ask():
+        return await llm.get_structured_response(
+            llm.REASONING_MODEL, messages, {}, cache=True, on_fresh=on_fresh
+        )
+
+    await asyncio.gather(ask(), ask())
+    await ask()
+
+    assert len(fake_client.chat.completions.calls) == 1
+    assert fresh == [{"echo": "should I reply?"}]
+
+
+async def test_response_cache_ttl_and_lru(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(max_entries=2, ttl_seconds=10)
+
+    await cache.set("a", {"v": 1})
+    await cache.set("b", {"v": 2})
+    assert await cache.get("a") == {"v": 1}
+    await cache.set("c", {"v": 3})  # evicts "b", the least recently used
+    assert await cache.get("b") is None
+    now[0] += 11
+    assert await cache.get("a") is None
+
+    assert cache.get_stats() == {
+        "hits": 1, "redis_hits": 0, "misses": 2,
+        "expired": 1, "evictions": 1, "size": 1,
+    }
+
+
+async def test_identical_in_flight_calls_share_one_request(fake_client):
+    messages = [{"role": "user", "content": "same cast"}]
+    before = llm.get_coalesced_call_stats()
+
+    results = await asyncio.gather(
+        *[
+            llm.get_structured_response(llm.REASONING_MODEL, messages, {})
+            for _ in range(3)
+        ],
+        llm.get_structured_response(
+            llm.REASONING_MODEL, [{"role": "user", "content": "other"}], {}
+        ),
+    )
+    results[0]["echo"] = "mutated by caller"
+    vectors = await asyncio.gather(
+        llm.get_embeddings_batch(["gm", "frames"]),
+        llm.get_embeddings_batch(["frames", "base"]),
+        llm.get_embeddings("base"),
+    )
+
+    assert len(fake_client.chat.completions.calls) == 2
+    assert results[1] == results[2] == {"echo": "same cast"}
+    assert [len(call["input"]) for call in fake_client.embeddings.calls] == [2, 1]
+    assert vectors[0][1] == vectors[1][0] and vectors[1][1] == vectors[2]
+    after = llm.get_coalesced_call_stats()
+    assert after["chat"] - before["chat"] == 2
+    assert after["embeddings"] - before["embeddings"] == 2
+
+
+async def test_shared_call_errors_reach_every_caller(monkeypatch):
+    attempts = []
+
+    async def create(**kwargs):
+        attempts.append(kwargs)
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    messages = [{"role": "user", "content": "boom"}]
+
+    results = await asyncio.gather(
+        *[
+            llm.get_structured_response(llm.REASONING_MODEL, messages, {})
+            for _ in range(3)
+        ],
+        return_exceptions=True,
+    )
+
+    assert len(attempts) == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_upstream_call_is_cancelled_with_its_last_waiter(monkeypatch):
+    started, cancelled = [], []
+
+    async def create(**kwargs):
+        started.append(kwargs)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(kwargs)
+            raise
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "_schedulers", {})
+    messages = [{"role": "user", "content": "summarize"}]
+
+    def ask():
+        return asyncio.ensure_future(
+            llm.get_structured_response(llm.REASONING_MODEL, messages, {})
+        )
+
+    first, second = ask(), ask()
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.sleep(0.01)
+    # Another caller still waits for the shared call
+    assert len(started) == 1 and cancelled == []
+
+    second.cancel()
+    await asyncio.sleep(0.01)
+    assert len(cancelled) == 1
+
+
+async def test_batch_joining_a_failing_call_returns_its_error(monkeypatch):
+    async def create(**kwargs):
+        await asyncio.sleep(0.02)
+        if "boom" in kwargs["input"]:
+            raise RuntimeError("upstream failed")
+        return SimpleNamespace(
+            data=[
+                SimpleNamespace(index=i, embedding=[1.0])
+                for i in range(len(kwargs["input"]))
+            ]
+        )
+
+    client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "_embedding_cache", EmbeddingCache())
+    monkeypatch.setattr(llm, "_schedulers", {})
+
+    single = asyncio.ensure_future(llm.get_embeddings("boom"))
+    await asyncio.sleep(0)
+    batch = await llm.get_embeddings_batch(["boom", "frames"], return_exceptions=True)
+
+    assert isinstance(batch[0], RuntimeError)
+    assert batch[1] == [1.0]
+    with pytest.raises(RuntimeError):
+        await single
+    with pytest.raises(RuntimeError):
+        await llm.get_embeddings_batch(["boom"])
+
+
+async def test_single_call_joining_a_failing_batch_raises(monkeypatch):
+    async def create(**kwargs):
+        await asyncio.sleep(0.02)
+        raise RuntimeError("upstream failed")
+
+    client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "_embedding_cache", EmbeddingCache())
+    monkeypatch.setattr(llm, "_schedulers", {})
+
+    batch = asyncio.ensure_future(
+        llm.get_embeddings_batch(["boom", "frames"], return_exceptions=True)
+    )
+    await asyncio.sleep(0)
+
+    with pytest.raises(RuntimeError):
+        await llm.get_embeddings("boom")
+    assert all(isinstance(result, RuntimeError) for result in await batch)
+
+
+async def test_client_lifecycle():
+    client = await llm.init_client()
+    assert llm.get_client() is client
+
+    await llm.close_client()
+    assert llm._client is None
+
+
+async def test_embeddings_batch_preserves_order_and_chunks(fake_client, monkeypatch):
+    monkeypatch.setattr(llm, "EMBEDDINGS_MAX_BATCH_SIZE", 2)
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+    vectors = await llm.get_embeddings_batch(texts)
+
+    assert [v[0] for v in vectors] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert [len(call["input"]) for call in fake_client.embeddings.calls] == [2, 2, 1]
+
+
+def test_truncate_for_embedding_bounds_utf8_bytes(monkeypatch):
+    monkeypatch.setattr(llm, "EMBEDDINGS_MAX_INPUT_TOKENS", 10)
+
+    assert llm.truncate_for_embedding("short") == "short"
+    assert llm.truncate_for_embedding("x" * 50) == "x" * 10
+    # Never splits a multi-byte character
+    assert llm.truncate_for_embedding("é" * 50) == "é" * 5
+
+
+async def test_concurrent_single_embeddings_are_coalesced(fake_client):
+    texts = ["gm", "who is building on base?", "gm", "frames"]
+
+    vectors = await asyncio.gather(*[llm.get_embeddings(text) for text in texts])
+
+    assert [v[0] for v in vectors] == [float(len(text)) for text in texts]
+    assert len(fake_client.embeddings.calls) == 1
+    # Duplicate texts inside a window are only sent upstream once
+    assert fake_client.embeddings.calls[0]["input"] == [
+        "gm",
+        "who is building on base?",
+        "frames",
+    ]
+
+
+async def test_coalesced_embedding_errors_reach_every_caller():
+    async def failing_batch(texts):
+        raise RuntimeError("upstream down")
+
+    batcher = EmbeddingBatcher(failing_batch, max_wait=0.001)
+    results = await asyncio.gather(
+        batcher.embed("a"), batcher.embed("b"), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+async def test_embedding_cache_serves_repeated_texts(fake_client):
+    first = await llm.get_embeddings_batch(["gm", "frames", "gm"])
+    second = await llm.get_embeddings_batch(["frames  ", "gm"])
+    single = await llm.get_embeddings("gm")
+
+    assert second == [first[1], first[0]]
+    assert single == first[0]
+    assert len(fake_client.embeddings.calls) == 1
+    assert fake_client.embeddings.calls[0]["input"] == ["gm", "frames"]
+
+    stats = llm.get_embedding_cache_stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 2
+
+
+async def test_embedding_cache_lru_eviction_and_disk_tier(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(max_entries=1, disk_path=path)
+    await cache.set_many({"a": [0.5, 1.0], "b": [0.25, 2.0]})
+
+    assert cache.get_stats()["evictions"] == 1
+    assert await cache.get_many(["a"]) == {"a": [0.5, 1.0]}
+    assert cache.get_stats()["disk_hits"] == 1
+    cache.close()
+
+    # A fresh cache (e.g. after a restart) reads from the same file
+    restarted = EmbeddingCache(disk_path=path)
+    assert await restarted.get_many(["a", "b", "c"]) == {
+        "a": [0.5, 1.0],
+        "b": [0.25, 2.0],
+    }
+    assert restarted.get_stats()["misses"] == 1
+    restarted.close()
@@ -0,0 +1,182 @@
+"""
+Tests for the workflow logging service
+"""
+import asyncio
+import io
+import json
+import logging
+import queue
+from logging.handlers import QueueListener
+
+import pytest
+
+from app.services.logging_service import (
+    JsonFormatter,
+    MetadataPolicy,
+    NonBlockingQueueHandler,
+    WorkflowLogger,
+    WorkflowStatus,
+    configure_logging,
+    shutdown_logging,
+    start_queued_logging,
+    summarize_metadata,
+)
+
+
+@pytest.fixture
+def json_log():
+    """Capture workflow.* records through the queue handler as parsed JSON"""
+    stream = io.StringIO()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, output)
+    handler = NonBlockingQueueHandler(log_queue)
+    workflow_logger = logging.getLogger("workflow")
+    workflow_logger.addHandler(handler)
+    workflow_logger.setLevel(logging.INFO)
+    listener.start()
+
+    def records():
+        listener.stop()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    yield records
+    workflow_logger.removeHandler(handler)
+    workflow_logger.setLevel(logging.NOTSET)
+
+
+@pytest.fixture
+def root_logger():
+    """Restore the root logger's handlers and level after the test"""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    shutdown_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_shutdown_restores_direct_output(root_logger):
+    stream = io.StringIO()
+    configure_logging(level="INFO", log_format="text", stream=stream, force=True)
+    start_queued_logging()
+    assert isinstance(root_logger.handlers[0], NonBlockingQueueHandler)
+    logging.getLogger("app").info("queued")
+
+    shutdown_logging()
+    logging.getLogger("app").info("after shutdown")
+
+    assert not any(
+        isinstance(h, NonBlockingQueueHandler) for h in root_logger.handlers
+    )
+    lines = stream.getvalue().splitlines()
+    assert [line.rsplit(" - ", 1)[1] for line in lines] == ["queued", "after shutdown"]
+
+
+async def test_workflow_logger_tracks_concurrent_executions():
+    logger = WorkflowLogger("test")
+
+    async def run(workflow_id, delay):
+        logger.start_workflow(workflow_id)
+        for step in ("first", "second"):
+            logger.add_step(step)
+        for step in ("first", "second"):
+            logger.start_step(step)
+            await asyncio.sleep(delay)
+            logger.complete_step(step, metadata={"workflow": workflow_id})
+        return logger.complete_workflow()
+
+    states = await asyncio.gather(*(run(f"wf{i}", 0.001 * (i % 3)) for i in range(20)))
+
+    assert [s.workflow_id for s in states] == [f"wf{i}" for i in range(20)]
+    for state in states:
+        assert state.status == WorkflowStatus.COMPLETED
+        workflow_ids = [step.metadata["workflow"] for step in state.steps]
+        assert workflow_ids == [state.workflow_id] * 2
+    # Executions started in other tasks are not visible here
+    assert logger.get_workflow_state() is None
+
+
+def test_summarize_metadata_applies_policy():
+    policy = MetadataPolicy(
+        allowed_fields=frozenset({"result.reply", "result.feeds"}),
+        max_string_length=10,
+        max_list_items=2,
+    )
+    metadata = {
+        "result": {
+            "reply": {"text": "x" * 50, "embedding": [0.5] * 1536},
+            "feeds": ["a", "b", "c", "d"],
+            "available_feeds": ["dropped"],
+        },
+        "input": "dropped",
+    }
+
+    summary = summarize_metadata(metadata, policy)
+
+    assert summary == {
+        "result": {
+            "reply": {
+                "text": "x" * 10 + "... (50 chars)",
+                "embedding": "<vector dim=1536>",
+            },
+            "feeds": ["a", "b", "... (2 more)"],
+        }
+    }
+
+
+def test_workflow_logger_caps_field_size():
+    policy = MetadataPolicy(max_list_items=1000, max_field_bytes=100)
+    logger = WorkflowLogger("test", policy)
+    metadata = {"small": {"ids": [1, 2]}, "big": ["feed"] * 500}
+    logger.start_workflow("wf", metadata=metadata)
+
+    assert logger.get_workflow_state().metadata == {
+        "small": {"ids": [1, 2]},
+        "big": "<elided list of 4000 bytes>",
+    }
+
+
+def run_workflow(logger, fail=False):
+    logger.start_workflow("wf-1")
+    logger.add_step("analyze")
+    logger.start_step("analyze")
+    if fail:
+        logger.fail_step("analyze", "boom", tokens={"total_tokens": 7})
+        return logger.fail_workflow("boom")
+    logger.complete_step("analyze", tokens={"prompt_tokens": 10, "total_tokens": 12})
+    return logger.complete_workflow()
+
+
+def test_workflow_logger_emits_structured_records(json_log):
+    run_workflow(WorkflowLogger("json", sample_rate=1.0))
+
+    records = json_log()
+
+    assert [r["event"] for r in records] == [
+        "workflow_started",
+        "step_started",
+        "step_completed",
+        "workflow_completed",
+    ]
+    completed = records[2]
+    assert completed["workflow_id"] == "wf-1"
+    assert completed["step"] == "analyze"
+    assert completed["duration_ms"] >= 0
+    assert completed["tokens"] == {"prompt_tokens": 10, "total_tokens": 12}
+    assert records[3]["tokens"] == {"prompt_tokens": 10, "total_tokens": 12}
+
+
+def test_unsampled_executions_only_log_failures(json_log):
+    logger = WorkflowLogger("sampled", sample_rate=0.0)
+    run_workflow(logger)
+    run_workflow(logger, fail=True)
+
+    records = json_log()
+
+    assert [r["event"] for r in records] == ["step_failed", "workflow_failed"]
+    record = records[1]["record"]
+    assert record["status"] == "failed"
+    assert record["steps"][0]["error"] == "boom"
+    assert record["steps"][0]["tokens"] == {"total_tokens": 7}
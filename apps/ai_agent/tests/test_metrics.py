@@ -0,0 +1,96 @@
+"""
+Tests for the in-process metrics and the /metrics endpoint
+"""
+import json
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app import nodes
+from app.models import llm
+from app.services.embedding_cache import EmbeddingCache
+from app.services.metrics import LLM_CALLS, LLM_TOKENS, NODE_LATENCY, MetricsRegistry
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    calls = registry.counter("test_calls_total", "Calls", ("model",))
+    latency = registry.histogram("test_latency_seconds", "Latency", buckets=(0.1, 1))
+    registry.register_cache("demo", lambda: {"hits": 3, "disk_hits": 1, "misses": 4})
+
+    calls.inc(model="gpt")
+    calls.inc(2, model="gpt")
+    latency.observe(0.05)
+    latency.observe(0.1)
+    latency.observe(5)
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE test_calls_total counter" in lines
+    assert 'test_calls_total{model="gpt"} 3' in lines
+    assert 'test_latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_latency_seconds_count 3" in lines
+    assert 'replyguy_cache_hits_total{cache="demo"} 4' in lines
+    assert 'replyguy_cache_hit_ratio{cache="demo"} 0.5' in lines
+
+
+async def test_llm_calls_record_counts_and_tokens(monkeypatch):
+    async def create_completion(**kwargs):
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    message=SimpleNamespace(content=json.dumps({"ok": True}))
+                )
+            ],
+            usage=SimpleNamespace(
+                prompt_tokens=30, completion_tokens=12, total_tokens=42
+            ),
+        )
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create_completion))
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    model = llm.GENERATION_MODEL
+    calls_before = LLM_CALLS.get(model=model, kind="chat", status="ok")
+    prompt_before = LLM_TOKENS.get(model=model, type="prompt")
+    completion_before = LLM_TOKENS.get(model=model, type="completion")
+
+    await llm.get_structured_response(model, [{"role": "user", "content": "hi"}], {})
+
+    assert LLM_CALLS.get(model=model, kind="chat", status="ok") == calls_before + 1
+    assert LLM_TOKENS.get(model=model, type="prompt") == prompt_before + 30
+    assert LLM_TOKENS.get(model=model, type="completion") == completion_before + 12
+
+
+async def test_node_latency_is_recorded():
+    before = NODE_LATENCY.get_count(node="match_trending_to_user", status="ok")
+
+    await nodes.match_trending_to_user(
+        {"user_embedding": [1.0], "trending_clusters": []}
+    )
+
+    assert (
+        NODE_LATENCY.get_count(node="match_trending_to_user", status="ok") == before + 1
+    )
+
+
+def test_metrics_endpoint(monkeypatch):
+    import main
+
+    monkeypatch.setattr(llm, "_embedding_cache", EmbeddingCache())
+    client = TestClient(main.app)
+
+    assert client.post("/api/unknown", json={}).status_code == 404
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    body = response.text
+    assert (
+        'replyguy_http_request_duration_seconds_count{endpoint="unmatched",method="POST",status="404"}'
+        in body
+    )
+    assert 'replyguy_http_requests_in_flight{endpoint="unmatched"} 0' in body
+    assert 'replyguy_cache_hit_ratio{cache="embeddings"} 0' in body
@@ -0,0 +1,196 @@
+"""
+Tests for the ReplyPipeline and speculative content discovery
+"""
+import asyncio
+
+import pytest
+
+from app.models import CastInput
+from app.pipeline import PipelineConfig, ReplyPipeline
+from app.services.logging_service import MetadataPolicy, WorkflowLogger
+
+CAST = CastInput(cast_text="Any good guides for Frames?", user_id="1", cast_id="0x1")
+
+CANDIDATE = {
+    "text": "Frame deployment guide",
+    "user_id": "2",
+    "cast_id": "0x2",
+    "relevance_score": 0.9,
+    "confidence": 0.8,
+}
+
+
+def make_pipeline(
+    should_reply, intent_delay=0.1, discovery_delay=0.1, speculative=True
+):
+    pipeline = ReplyPipeline(PipelineConfig(speculative_discovery=speculative))
+    calls = {"discovery_started": 0, "discovery_cancelled": 0}
+
+    async def analyze(input_data):
+        await asyncio.sleep(intent_delay)
+        return {"should_reply": should_reply, "confidence": 0.9, "reasoning": "test"}
+
+    async def discover(input_data):
+        calls["discovery_started"] += 1
+        try:
+            await asyncio.sleep(discovery_delay)
+        except asyncio.CancelledError:
+            calls["discovery_cancelled"] += 1
+            raise
+        return {"candidates": [CANDIDATE]}
+
+    async def reply(input_data):
+        return {
+            "reply_text": {
+                **CANDIDATE,
+                "text": f"re: {input_data['reference_content']}",
+            }
+        }
+
+    pipeline.intent_workflow.process = analyze
+    pipeline.discovery_workflow.process = discover
+    pipeline.reply_workflow.process = reply
+    return pipeline, calls
+
+
+async def test_speculative_discovery_overlaps_intent():
+    pipeline, calls = make_pipeline(
+        should_reply=True, intent_delay=0.2, discovery_delay=0.2
+    )
+
+    response = await pipeline.process(CAST)
+
+    assert response.selected_reply.text == "re: Frame deployment guide"
+    assert calls["discovery_started"] == 1
+    # Discovery ran alongside intent analysis rather than after it
+    assert response.processing_time < 0.35
+    stats = pipeline.get_speculation_stats()
+    assert (stats["launched"], stats["used"], stats["cancelled"]) == (1, 1, 0)
+    assert stats["saved_seconds"] == pytest.approx(0.2, abs=0.05)
+
+
+async def test_speculative_discovery_cancelled_when_no_reply_needed():
+    pipeline, calls = make_pipeline(
+        should_reply=False, intent_delay=0.05, discovery_delay=1
+    )
+
+    response = await pipeline.process(CAST)
+    await asyncio.sleep(0)
+
+    assert response.intent_analysis.should_reply is False
+    assert response.recommended_replies is None
+    assert calls["discovery_cancelled"] == 1
+    stats = pipeline.get_speculation_stats()
+    assert (stats["launched"], stats["used"], stats["cancelled"]) == (1, 0, 1)
+    assert stats["wasted_seconds"] == pytest.approx(0.05, abs=0.05)
+
+
+async def test_speculation_can_be_disabled_per_call():
+    pipeline, calls = make_pipeline(should_reply=False)
+
+    await pipeline.process(CAST, speculative=False)
+
+    assert calls["discovery_started"] == 0
+    assert pipeline.get_speculation_stats()["launched"] == 0
+
+
+async def test_process_many_shares_pipeline_and_keeps_order():
+    pipeline = ReplyPipeline(PipelineConfig(max_concurrency=8))
+    in_flight = {"now": 0, "max": 0}
+
+    async def analyze(input_data):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        try:
+            # Later casts finish first so executions interleave
+            await asyncio.sleep(0.05 - int(input_data["cast_id"]) * 0.001)
+        finally:
+            in_flight["now"] -= 1
+        return {"should_reply": True, "confidence": 0.9, "reasoning": "test"}
+
+    async def discover(input_data):
+        await asyncio.sleep(0.01)
+        return {"candidates": [{**CANDIDATE, "text": input_data["cast_text"]}]}
+
+    async def reply(input_data):
+        return {"reply_text": {**CANDIDATE, "text": input_data["reference_content"]}}
+
+    pipeline.intent_workflow.process = analyze
+    pipeline.discovery_workflow.process = discover
+    pipeline.reply_workflow.process = reply
+
+    casts = [
+        CastInput(cast_text=f"cast {i}", user_id="1", cast_id=str(i)) for i in range(40)
+    ]
+    responses = await pipeline.process_many(casts)
+
+    replies = [r.selected_reply.text for r in responses]
+    assert replies == [f"cast {i}" for i in range(40)]
+    assert in_flight["max"] == 8
+
+
+async def test_process_many_returns_exceptions_in_place():
+    pipeline, _ = make_pipeline(should_reply=True, intent_delay=0, discovery_delay=0)
+    analyze = pipeline.intent_workflow.process
+
+    async def flaky_analyze(input_data):
+        if input_data["cast_id"] == "bad":
+            raise RuntimeError("intent failed")
+        return await analyze(input_data)
+
+    pipeline.intent_workflow.process = flaky_analyze
+    casts = [
+        CastInput(cast_text="ok", user_id="1", cast_id="good"),
+        CastInput(cast_text="bad", user_id="1", cast_id="bad"),
+    ]
+
+    responses = await pipeline.process_many(casts, return_exceptions=True)
+
+    assert responses[0].selected_reply is not None
+    assert isinstance(responses[1], RuntimeError)
+
+
+async def test_logged_metadata_is_bounded():
+    unbounded = MetadataPolicy(
+        max_string_length=10**9,
+        max_list_items=10**9,
+        max_depth=100,
+        elide_vectors=False,
+        max_field_bytes=10**9,
+    )
+    retained = {}
+    for name, policy in (("unbounded", unbounded), ("default", None)):
+        config = PipelineConfig(speculative_discovery=True)
+        if policy:
+            config.log_metadata = policy
+        pipeline, _ = make_pipeline(
+            should_reply=True, intent_delay=0, discovery_delay=0
+        )
+        pipeline.config = config
+        pipeline.logger = WorkflowLogger("ReplyPipeline", config.log_metadata)
+        discover = pipeline.discovery_workflow.process
+
+        async def discover_with_vectors(input_data, discover=discover):
+            result = await discover(input_data)
+            result["candidates"] = [
+                {
+                    **CANDIDATE,
+                    "text": "long feed text " * 200,
+                    "embedding": [0.1] * 1536,
+                }
+                for _ in range(30)
+            ]
+            return result
+
+        pipeline.discovery_workflow.process = discover_with_vectors
+        await pipeline.process(CAST)
+        retained[name] = pipeline.logger.get_retained_bytes()
+
+        state = pipeline.logger.get_workflow_state()
+        if name == "default":
+            result = state.steps[1].metadata["result"]
+            # Only the step outputs are kept, not the rest of the graph state
+            assert set(result) == {"intent_analysis", "content_discovery"}
+            assert result["content_discovery"]["candidates"].startswith("<elided list")
+
+    assert retained["default"] * 20 < retained["unbounded"]
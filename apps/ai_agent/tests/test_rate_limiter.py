@@ -0,0 +1,248 @@
+"""
+Tests for OpenAI rate limiting and adaptive concurrency
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIConnectionError, RateLimitError
+
+from app.models import llm
+from app.models.rate_limiter import RequestScheduler, TokenBucket
+from app.services.metrics import LLM_CALLS, LLM_QUEUE_WAIT
+
+
+def rate_limit_error(retry_after="0"):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(
+        429, headers={"retry-after": retry_after}, request=request
+    )
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+async def test_token_bucket_queues_until_budget_refills():
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)  # 10 per second
+
+    started = time.monotonic()
+    await asyncio.gather(*(bucket.acquire() for _ in range(5)))
+
+    # Two fit the burst, the other three wait ~0.1s each
+    assert time.monotonic() - started == pytest.approx(0.3, abs=0.08)
+
+
+async def test_scheduler_caps_concurrency_and_queues():
+    scheduler = RequestScheduler("test", initial_concurrency=2, max_concurrency=2)
+    in_flight = {"now": 0, "max": 0}
+
+    async def call(i):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.02)
+        in_flight["now"] -= 1
+        return i
+
+    results = await asyncio.gather(
+        *(scheduler.run(lambda i=i: call(i)) for i in range(8))
+    )
+
+    assert results == list(range(8))
+    assert in_flight["max"] == 2
+    assert scheduler.get_stats()["queued"] == 0
+
+
+async def test_scheduler_retries_429s_and_backs_off():
+    scheduler = RequestScheduler("test", initial_concurrency=8, max_concurrency=16)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) <= 2:
+            raise rate_limit_error()
+        return "ok"
+
+    assert await scheduler.run(call) == "ok"
+
+    stats = scheduler.get_stats()
+    assert stats["rate_limited"] == 2
+    # Both 429s arrived within the cooldown, so the limit was halved once
+    # and then grew back slightly on the success
+    assert 4 < stats["concurrency_limit"] < 4.5
+
+
+async def test_scheduler_gives_up_after_max_retries():
+    scheduler = RequestScheduler("test", max_rate_limit_retries=1)
+
+    async def call():
+        raise rate_limit_error()
+
+    with pytest.raises(RateLimitError):
+        await scheduler.run(call)
+    assert scheduler.get_stats()["in_flight"] == 0
+
+
+async def test_scheduler_is_the_only_retry_layer():
+    scheduler = RequestScheduler("test", max_error_retries=1)
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise APIConnectionError(request=request)
+        return "ok"
+
+    async def down():
+        raise APIConnectionError(request=request)
+
+    assert await scheduler.run(flaky) == "ok"
+    with pytest.raises(APIConnectionError):
+        await scheduler.run(down)
+    assert scheduler.get_stats()["retried_errors"] == 2
+    assert scheduler.get_stats()["in_flight"] == 0
+    # The client doesn't retry on its own, holding a slot and hiding 429s
+    assert llm._build_client().max_retries == 0
+
+
+async def test_latency_backoff_can_be_disabled():
+    scheduler = RequestScheduler("test", initial_concurrency=8, latency_backoff_ratio=0)
+
+    scheduler._observe_latency(0.01)
+    scheduler._observe_latency(5.0)  # e.g. a 2048-text embedding batch
+
+    assert scheduler.get_stats()["slow_calls"] == 0
+    assert scheduler.concurrency.limit > 8
+    assert llm.get_scheduler(llm.EMBEDDINGS_MODEL).latency_backoff_ratio == 0
+
+
+async def test_scheduler_reconciles_estimated_tokens():
+    scheduler = RequestScheduler("test", tokens_per_minute=60_000)
+    budget = scheduler.tokens.tokens
+
+    async def call():
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=100))
+
+    await scheduler.run(call, estimated_tokens=1000)
+
+    assert scheduler.tokens.tokens == pytest.approx(budget - 100, abs=20)
+
+
+async def test_high_priority_calls_run_ahead_of_queued_background_calls():
+    scheduler = RequestScheduler("test", initial_concurrency=1, max_concurrency=1)
+    order = []
+
+    async def call(name):
+        order.append(name)
+        await asyncio.sleep(0.01)
+
+    background = [
+        asyncio.ensure_future(
+            scheduler.run(lambda i=i: call(f"bg{i}"), priority="background")
+        )
+        for i in range(3)
+    ]
+    await asyncio.sleep(0)  # bg0 takes the slot, bg1 and bg2 queue
+    high = asyncio.ensure_future(scheduler.run(lambda: call("high"), priority="high"))
+    await asyncio.gather(*background, high)
+
+    assert order == ["bg0", "high", "bg1", "bg2"]
+    stats = scheduler.get_stats()
+    waits = stats["queue_wait_seconds"]
+    assert waits["background"] > waits["high"]
+
+
+async def test_lower_priorities_leave_reserved_slots_free():
+    scheduler = RequestScheduler(
+        "test",
+        initial_concurrency=4,
+        max_concurrency=4,
+        priority_shares={"normal": 0.75, "background": 0.5},
+    )
+    release = asyncio.Event()
+
+    async def call():
+        await release.wait()
+
+    priorities = ["background"] * 4 + ["normal"] * 2
+    tasks = [
+        asyncio.ensure_future(scheduler.run(call, priority=priority))
+        for priority in priorities
+    ]
+    await asyncio.sleep(0)
+
+    # Background may use half the slots, normal a further quarter
+    assert scheduler.get_stats()["in_flight_by_priority"] == {
+        "high": 0, "normal": 1, "background": 2,
+    }
+    high = asyncio.ensure_future(scheduler.run(call, priority="high"))
+    await asyncio.sleep(0)
+    assert scheduler.get_stats()["in_flight_by_priority"]["high"] == 1
+
+    release.set()
+    await asyncio.gather(*tasks, high)
+    assert scheduler.get_stats()["in_flight"] == 0
+
+
+async def test_call_priority_applies_to_llm_calls(monkeypatch):
+    async def create(**kwargs):
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='{"ok": true}'))],
+            usage=SimpleNamespace(
+                prompt_tokens=5, completion_tokens=5, total_tokens=10
+            ),
+        )
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "_schedulers", {})
+    model = llm.GENERATION_MODEL
+    before = LLM_QUEUE_WAIT.get_count(model=model, priority="high")
+
+    with llm.call_priority("high"):
+        await llm.get_structured_response(
+            model, [{"role": "user", "content": "hi"}], {}
+        )
+    assert llm.get_call_priority() == "normal"
+
+    assert LLM_QUEUE_WAIT.get_count(model=model, priority="high") == before + 1
+    with pytest.raises(ValueError):
+        with llm.call_priority("urgent"):
+            pass
+
+
+async def test_structured_response_survives_rate_limits(monkeypatch):
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise rate_limit_error()
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='{"ok": true}'))],
+            usage=SimpleNamespace(
+                prompt_tokens=5, completion_tokens=5, total_tokens=10
+            ),
+        )
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "_schedulers", {})
+    model = llm.GENERATION_MODEL
+    errors = LLM_CALLS.get(model=model, kind="chat", status="error")
+    successes = LLM_CALLS.get(model=model, kind="chat", status="ok")
+
+    result = await llm.get_structured_response(
+        model, [{"role": "user", "content": "hi"}], {}
+    )
+
+    assert result == {"ok": True}
+    assert len(calls) == 2
+    # Each upstream attempt is metered on its own
+    assert LLM_CALLS.get(model=model, kind="chat", status="error") == errors + 1
+    assert LLM_CALLS.get(model=model, kind="chat", status="ok") == successes + 1
+    assert llm.get_rate_limiter_stats()[llm.GENERATION_MODEL]["rate_limited"] == 1
@@ -0,0 +1,146 @@
+"""
+Tests for the shared Redis cache tier, against an in-memory Redis stand-in
+"""
+import pytest
+
+from app import nodes
+from app.services.embedding_cache import EmbeddingCache
+from app.services.redis_cache import RedisCache, decode_vector, encode_vector
+from app.services.response_cache import ResponseCache
+
+
+class FakeRedis:
+    """The subset of the redis.asyncio client the cache uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.commands = []
+        self.fail = False
+
+    async def mget(self, keys):
+        self._call("MGET")
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def _call(self, command):
+        if self.fail:
+            raise ConnectionError("redis is down")
+        self.commands.append(command)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queued = []
+
+    def set(self, key, value, ex=None):
+        self.queued.append(("SET", {key: value}, ex))
+
+    def mset(self, mapping):
+        self.queued.append(("MSET", mapping, None))
+
+    async def execute(self):
+        self.redis._call("+".join(command for command, _, _ in self.queued))
+        for _, mapping, ex in self.queued:
+            for key, value in mapping.items():
+                assert isinstance(value, bytes)
+                self.redis.data[key] = value
+                self.redis.ttls[key] = ex
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+def embedding_tier(redis):
+    return RedisCache(
+        redis, "embeddings", 3600, encode=encode_vector, decode=decode_vector
+    )
+
+
+async def test_embeddings_are_shared_between_replicas_as_float32(redis):
+    replica_a = EmbeddingCache(remote=embedding_tier(redis))
+    replica_b = EmbeddingCache(remote=embedding_tier(redis))
+
+    await replica_a.set_many({"k1": [0.5, -1.25, 3.0], "k2": [0.1, 0.2, 0.3]})
+    found = await replica_b.get_many(["k1", "k2", "k3"])
+
+    # One pipelined round trip to write, one MGET to read
+    assert redis.commands == ["SET+SET", "MGET"]
+    assert all(len(value) == 3 * 4 for value in redis.data.values())
+    assert set(redis.ttls.values()) == {3600}
+    assert found["k1"] == [0.5, -1.25, 3.0]
+    assert found["k2"] == pytest.approx([0.1, 0.2, 0.3], abs=1e-7)
+    assert replica_b.get_stats()["redis_hits"] == 2
+    assert replica_b.get_stats()["misses"] == 1
+
+    # Now in replica B's own LRU
+    await replica_b.get_many(["k1"])
+    assert redis.commands == ["SET+SET", "MGET"]
+
+
+async def test_responses_are_shared_between_replicas(redis):
+    replica_a = ResponseCache(remote=RedisCache(redis, "responses", 600))
+    replica_b = ResponseCache(remote=RedisCache(redis, "responses", 600))
+
+    await replica_a.set("key", {"keywords": [{"topic": "frames", "weight": 0.9}]})
+    value = await replica_b.get("key")
+    value["keywords"].clear()
+
+    assert await replica_b.get("key") == {
+        "keywords": [{"topic": "frames", "weight": 0.9}]
+    }
+    assert replica_b.get_stats()["redis_hits"] == 1
+    assert replica_b.get_stats()["hits"] == 1
+
+
+async def test_redis_errors_degrade_to_misses(redis):
+    tier = embedding_tier(redis)
+    cache = EmbeddingCache(remote=tier)
+    redis.fail = True
+
+    await cache.set_many({"k1": [1.0]})
+    cache.clear()
+
+    assert await cache.get_many(["k1"]) == {}
+    assert tier.get_stats()["errors"] == 2
+
+
+async def test_trending_clusters_are_shared_between_replicas(redis, monkeypatch):
+    calls = []
+
+    async def fake_response(model, messages, response_format, **kwargs):
+        calls.append("topics")
+        return {"topics": [["frames"], ["frames"], ["pizza"]]}
+
+    async def fake_embeddings_batch(texts):
+        calls.append("embeddings")
+        return [[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]]
+
+    def replica_cache():
+        return ResponseCache(
+            remote=RedisCache(
+                redis,
+                "trending_clusters",
+                300,
+                encode=nodes._encode_clusters,
+                decode=nodes._decode_clusters,
+            )
+        )
+
+    monkeypatch.setattr(nodes, "get_structured_response", fake_response)
+    monkeypatch.setattr(nodes, "get_embeddings_batch", fake_embeddings_batch)
+    casts = [{"text": "frames a"}, {"text": "frames b"}, {"text": "pizza"}]
+
+    monkeypatch.setattr(nodes, "_cluster_cache", replica_cache())
+    first = await nodes.generate_trending_clusters({"casts": casts})
+    monkeypatch.setattr(nodes, "_cluster_cache", replica_cache())
+    second = await nodes.generate_trending_clusters({"casts": casts})
+
+    assert sorted(calls) == ["embeddings", "topics"]
+    assert second["trending_clusters"] == first["trending_clusters"]
+    assert len(second["trending_clusters"]) == 2
@@ -0,0 +1,185 @@
+"""
+Tests for the semantic reply cache
+"""
+import pytest
+
+from app import nodes
+from app.services import reply_cache as reply_cache_module
+from app.services.reply_cache import SemanticReplyCache
+from app.workflows import reply_generation
+from app.workflows.reply_generation import ReplyGenerationWorkflow
+
+VECTORS = {
+    "gm, who's building on base?": [1.0, 0.0, 0.0],
+    "gm!! who's building on Base?": [0.99, 0.05, 0.0],
+    "what's your favourite pizza?": [0.0, 0.0, 1.0],
+    "frames on base tutorial": [0.9, 0.1, 0.0],
+    "base onchain summer recap": [0.8, 0.2, 0.0],
+}
+FEEDS = [{"text": "frames on base tutorial"}, {"text": "base onchain summer recap"}]
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    prompts = []
+
+    async def fake_embeddings(text):
+        return VECTORS[text]
+
+    async def fake_embeddings_batch(texts):
+        return [VECTORS[text] for text in texts]
+
+    async def fake_response(model, messages, response_format, **kwargs):
+        system = messages[0]["content"]
+        prompts.append(system)
+        if system == nodes.INTENT_CHECK_PROMPT:
+            return {
+                "should_reply": True,
+                "identified_needs": ["builders"],
+                "confidence": 0.9,
+            }
+        if system == nodes.CONTENT_DISCOVERY_PROMPT:
+            return {
+                "selected_content": {
+                    "title": "Frames tutorial",
+                    "url": "https://example.com/frames",
+                    "relevance_score": 0.9,
+                    "key_points": [],
+                },
+                "relevance_score": 0.9,
+                "key_points": [],
+            }
+        return {"reply_text": "Check out this tutorial", "link": "https://example.com/frames"}
+
+    monkeypatch.setattr(reply_generation, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(nodes, "get_embeddings_batch", fake_embeddings_batch)
+    monkeypatch.setattr(nodes, "get_structured_response", fake_response)
+    monkeypatch.setattr(nodes, "get_intent_classifier", lambda: None)
+    return prompts
+
+
+async def test_near_duplicate_cast_reuses_reply(fake_llm):
+    cache = SemanticReplyCache(similarity_threshold=0.95)
+    workflow = ReplyGenerationWorkflow(reply_cache=cache)
+
+    first = await workflow.process(
+        {"cast_text": "gm, who's building on base?", "available_feeds": FEEDS}
+    )
+    second = await workflow.process(
+        {"cast_text": "gm!! who's building on Base?", "available_feeds": FEEDS[::-1]}
+    )
+    assert len(fake_llm) == 3  # intent, discovery and reply for the first cast only
+    unrelated = await workflow.process(
+        {"cast_text": "what's your favourite pizza?", "available_feeds": FEEDS}
+    )
+
+    assert first["reply_cache"] == {"hit": False}
+    assert second["reply_cache"]["hit"] is True
+    assert second["reply_cache"]["similarity"] > 0.99
+    assert second["cast_text"] == "gm!! who's building on Base?"
+    assert second["reply"] == first["reply"]
+    assert second["intent_analysis"] == first["intent_analysis"]
+    assert unrelated["reply_cache"] == {"hit": False}
+    # No feed matched the unrelated cast, so its reply is not cached
+    assert unrelated["discovered_content"] is None
+    assert cache.get_stats() == {
+        "hits": 1, "misses": 2, "expired": 0, "evictions": 0, "size": 1,
+    }
+
+
+async def test_changed_feeds_miss_the_cache(fake_llm):
+    cache = SemanticReplyCache(similarity_threshold=0.95, min_feed_overlap=0.8)
+    workflow = ReplyGenerationWorkflow(reply_cache=cache)
+
+    await workflow.process(
+        {"cast_text": "gm, who's building on base?", "available_feeds": FEEDS}
+    )
+    result = await workflow.process(
+        {"cast_text": "gm, who's building on base?", "available_feeds": FEEDS[:1]}
+    )
+
+    assert result["reply_cache"] == {"hit": False}
+    assert len(fake_llm) == 6
+
+
+async def test_reply_from_a_trimmed_bundle_is_reused(fake_llm):
+    cache = SemanticReplyCache(similarity_threshold=0.95)
+    workflow = ReplyGenerationWorkflow(reply_cache=cache)
+    bundle = {
+        "summary": "base builder",
+        "userData": [
+            {"text": "frames on base tutorial"},
+            {"text": "what's your favourite pizza?"},
+        ],
+    }
+
+    first = await workflow.process(
+        {"cast_text": "gm, who's building on base?", "available_feeds": [bundle]}
+    )
+    second = await workflow.process(
+        {"cast_text": "gm!! who's building on Base?", "available_feeds": [bundle]}
+    )
+
+    # The reply was chosen from a copy of the bundle trimmed to one cast
+    assert first["candidate_feeds"][0]["userData"] == bundle["userData"][:1]
+    assert second["reply_cache"]["hit"] is True
+    assert len(fake_llm) == 3
+
+
+def test_reply_without_discovered_content_is_not_cached():
+    cache = SemanticReplyCache(similarity_threshold=0.9)
+    no_content = {
+        "intent_analysis": {
+            "should_reply": True,
+            "identified_needs": [],
+            "confidence": 0.9,
+        },
+        "discovered_content": None,
+        "reply": {"reply_text": "No response needed for this cast.", "link": ""},
+    }
+    no_reply = {**no_content, "intent_analysis": {"should_reply": False}}
+
+    cache.put([1.0, 0.0], no_content)
+    cache.put([0.0, 1.0], no_reply)
+
+    assert cache.get([1.0, 0.0], []) is None
+    assert cache.get([0.0, 1.0], [{"text": "new feed"}]) is not None
+
+
+async def test_compare_modes_bypasses_the_cache(fake_llm):
+    cache = SemanticReplyCache(similarity_threshold=0.95)
+    workflow = ReplyGenerationWorkflow(reply_cache=cache)
+
+    comparison = await workflow.compare_modes(
+        {"cast_text": "gm, who's building on base?", "available_feeds": FEEDS}
+    )
+
+    assert "reply_cache" not in comparison["results"]["fused"]
+    assert comparison["fused_mode"] in ("fused", "fused_fallback")
+    assert comparison["order"] == ["staged", "fused"]
+    assert cache.get_stats()["size"] == 0
+
+    comparison = await workflow.compare_modes(
+        {"cast_text": "gm, who's building on base?", "available_feeds": FEEDS},
+        fused_first=True,
+    )
+    assert comparison["order"] == ["fused", "staged"]
+
+
+def test_entries_expire_and_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(reply_cache_module.time, "monotonic", lambda: now[0])
+    cache = SemanticReplyCache(max_entries=2, ttl_seconds=60, similarity_threshold=0.9)
+    result = {"reply": {"reply_text": "hi", "link": ""}, "discovered_content": None}
+
+    cache.put([1.0, 0.0], result)
+    cache.put([0.0, 1.0], result)
+    assert cache.get([1.0, 0.0], []) is not None
+    cache.put([0.7, 0.7], result)  # evicts [0.0, 1.0], the least recently used
+
+    assert cache.get([0.0, 1.0], []) is None
+    now[0] += 61
+    assert cache.get([1.0, 0.0], []) is None
+    assert cache.get_stats() == {
+        "hits": 1, "misses": 2, "expired": 2, "evictions": 1, "size": 0,
+    }
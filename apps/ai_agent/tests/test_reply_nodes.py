@@ -0,0 +1,287 @@
+"""
+Tests for the reply generation nodes
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import nodes
+from app.workflows.reply_generation import ReplyGenerationWorkflow
+
+VECTORS = {
+    "anyone building frames on base?": [1.0, 0.0, 0.0],
+    "frames on base tutorial": [0.9, 0.1, 0.0],
+    "base frames starter kit": [0.8, 0.3, 0.0],
+    "my cat is cute": [0.0, 0.0, 1.0],
+    "builder summary frames": [0.7, 0.7, 0.0],
+}
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    batches = []
+
+    async def fake_embeddings_batch(texts):
+        batches.append(texts)
+        return [VECTORS.get(text, [0.0, 1.0, 0.0]) for text in texts]
+
+    monkeypatch.setattr(nodes, "get_embeddings_batch", fake_embeddings_batch)
+    return batches
+
+
+async def test_prefilter_feeds_keeps_top_k_similar_feeds(fake_embeddings):
+    feeds = [
+        {"text": "my cat is cute"},
+        {"text": "base frames starter kit"},
+        {"text": "frames on base tutorial"},
+        {"userData": [{"text": "frames"}], "summary": "builder summary"},
+    ]
+    state = {
+        "cast_text": "anyone building frames on base?",
+        "intent_analysis": {"should_reply": True},
+        "available_feeds": feeds,
+        "feed_top_k": 2,
+        "feed_min_similarity": 0.2,
+    }
+
+    state = await nodes.prefilter_feeds(state)
+
+    assert state["candidate_feeds"] == [feeds[2], feeds[1]]
+    assert len(fake_embeddings) == 1
+    assert fake_embeddings[0][4] == "frames"
+
+
+async def test_prefilter_feeds_trims_bundles_to_matching_casts(fake_embeddings):
+    bundle = {
+        "summary": "builder",
+        "userData": [
+            {"text": "my cat is cute"},
+            {"text": "base frames starter kit"},
+            {"text": "frames on base tutorial"},
+        ],
+    }
+    state = {
+        "cast_text": "anyone building frames on base?",
+        "intent_analysis": {"should_reply": True},
+        "available_feeds": [bundle, {"text": "my cat is cute"}],
+        "feed_top_k": 5,
+        "feed_min_similarity": 0.2,
+    }
+
+    state = await nodes.prefilter_feeds(state)
+
+    assert state["candidate_feeds"] == [
+        {
+            "summary": "builder",
+            "userData": [bundle["userData"][2], bundle["userData"][1]],
+        }
+    ]
+    assert state["candidate_feed_indices"] == [0]
+    assert len(bundle["userData"]) == 3
+
+
+async def test_prefilter_feeds_keeps_every_feed_when_embedding_fails(monkeypatch):
+    async def failing_embeddings_batch(texts):
+        raise RuntimeError("input too long")
+
+    monkeypatch.setattr(nodes, "get_embeddings_batch", failing_embeddings_batch)
+    feeds = [{"userData": [{"text": "x" * 400}] * 100, "summary": "builder"}]
+    state = {
+        "cast_text": "anyone building frames on base?",
+        "intent_analysis": {"should_reply": True},
+        "available_feeds": feeds,
+    }
+
+    state = await nodes.prefilter_feeds(state)
+
+    assert state["candidate_feeds"] == feeds
+
+
+async def test_prefilter_feeds_applies_min_similarity(fake_embeddings):
+    feeds = [{"text": "my cat is cute"}]
+    state = {
+        "cast_text": "anyone building frames on base?",
+        "intent_analysis": {"should_reply": True},
+        "available_feeds": feeds,
+        "feed_top_k": 5,
+        "feed_min_similarity": 0.2,
+    }
+
+    state = await nodes.prefilter_feeds(state)
+
+    assert state["candidate_feeds"] == []
+
+
+async def test_prefilter_feeds_skipped_when_not_replying(fake_embeddings):
+    state = {
+        "cast_text": "gm",
+        "intent_analysis": {"should_reply": False},
+        "available_feeds": [{"text": "my cat is cute"}],
+    }
+
+    state = await nodes.prefilter_feeds(state)
+
+    assert "candidate_feeds" not in state
+    assert fake_embeddings == []
+
+
+INTENT_REPLY = {"should_reply": True, "identified_needs": ["help"], "confidence": 0.8}
+
+FUSED_REPLY = {
+    "should_reply": True,
+    "identified_needs": ["frame tutorials"],
+    "confidence": 0.9,
+    "selected_content": {
+        "title": "Frames tutorial",
+        "url": "",
+        "relevance_score": 0.8,
+        "key_points": ["step by step"],
+        "author_username": "dev",
+        "cast_hash": "0x1",
+        "channel_name": "",
+    },
+    "relevance_score": 0.8,
+    "key_points": ["step by step"],
+    "reply_text": "You should connect with dev, who said: 'frames on base tutorial'",
+    "link": "https://farcaster.xyz/dev/0x1",
+}
+
+
+def fake_reply_llm(monkeypatch, fused_response):
+    prompts = []
+
+    async def fake_response(model, messages, response_format, **kwargs):
+        system = messages[0]["content"]
+        prompts.append(system)
+        if system == nodes.FUSED_REPLY_PROMPT:
+            return fused_response
+        if system == nodes.INTENT_CHECK_PROMPT:
+            return INTENT_REPLY
+        if system == nodes.CONTENT_DISCOVERY_PROMPT:
+            return {
+                "selected_content": FUSED_REPLY["selected_content"],
+                "relevance_score": 0.8,
+                "key_points": [],
+            }
+        return {"reply_text": "staged reply", "link": "https://farcaster.xyz/dev/0x1"}
+
+    monkeypatch.setattr(nodes, "get_structured_response", fake_response)
+    monkeypatch.setattr(nodes, "get_intent_classifier", lambda: None)
+    return prompts
+
+
+async def test_fused_mode_uses_a_single_llm_call(fake_embeddings, monkeypatch):
+    prompts = fake_reply_llm(monkeypatch, FUSED_REPLY)
+
+    result = await ReplyGenerationWorkflow().process(
+        {
+            "cast_text": "anyone building frames on base?",
+            "available_feeds": [{"text": "frames on base tutorial"}],
+            "mode": "fused",
+        }
+    )
+
+    assert result["reply_mode"] == "fused"
+    assert result["intent_analysis"]["should_reply"] is True
+    assert result["reply"]["link"] == "https://farcaster.xyz/dev/0x1"
+    assert prompts == [nodes.FUSED_REPLY_PROMPT]
+
+
+async def test_invalid_fused_output_falls_back_to_staged_graph(
+    fake_embeddings, monkeypatch
+):
+    prompts = fake_reply_llm(monkeypatch, {"should_reply": "maybe"})
+
+    result = await ReplyGenerationWorkflow().process(
+        {
+            "cast_text": "anyone building frames on base?",
+            "available_feeds": [{"text": "frames on base tutorial"}],
+            "mode": "fused",
+        }
+    )
+
+    assert result["reply_mode"] == "fused_fallback"
+    assert result["reply"]["reply_text"] == "staged reply"
+    assert prompts == [
+        nodes.FUSED_REPLY_PROMPT,
+        nodes.INTENT_CHECK_PROMPT,
+        nodes.CONTENT_DISCOVERY_PROMPT,
+        nodes.REPLY_GENERATION_PROMPT,
+    ]
+
+
+async def test_unknown_reply_mode_is_rejected():
+    import main
+
+    with pytest.raises(ValueError):
+        await ReplyGenerationWorkflow().process(
+            {"cast_text": "gm", "available_feeds": [], "mode": "fussed"}
+        )
+    response = TestClient(main.app).post(
+        "/api/generate-reply",
+        json={"cast": {"text": "gm"}, "reply_mode": "fussed"},
+    )
+    assert response.status_code == 400
+
+
+async def test_summary_runs_alongside_intent_check(fake_embeddings, monkeypatch):
+    payloads = []
+
+    async def slow_response(model, messages, response_format, **kwargs):
+        payloads.append(messages[-1]["content"])
+        if messages[0]["content"] == nodes.INTENT_CHECK_PROMPT:
+            await asyncio.sleep(0.2)
+            return INTENT_REPLY
+        if messages[0]["content"] == nodes.CONTENT_DISCOVERY_PROMPT:
+            return {
+                "selected_content": FUSED_REPLY["selected_content"],
+                "relevance_score": 0.8,
+                "key_points": [],
+            }
+        return {"reply_text": "staged reply", "link": ""}
+
+    async def slow_summary():
+        await asyncio.sleep(0.2)
+        return "asks about frames on base"
+
+    monkeypatch.setattr(nodes, "get_structured_response", slow_response)
+    monkeypatch.setattr(nodes, "get_intent_classifier", lambda: None)
+
+    started = time.perf_counter()
+    result = await ReplyGenerationWorkflow().process(
+        {
+            "cast_text": "anyone building frames on base?",
+            "cast_summary": slow_summary(),
+            "available_feeds": [{"text": "frames on base tutorial"}],
+        }
+    )
+
+    assert time.perf_counter() - started < 0.35
+    assert result["cast_summary"] == "asks about frames on base"
+    assert '"cast_summary":"asks about frames on base"' in payloads[1]
+
+
+async def test_unused_summary_is_cancelled(fake_embeddings, monkeypatch):
+    summary_finished = []
+
+    async def no_reply(model, messages, response_format, **kwargs):
+        return {"should_reply": False, "identified_needs": [], "confidence": 0.9}
+
+    async def slow_summary():
+        await asyncio.sleep(0.5)
+        summary_finished.append(True)
+        return "greeting"
+
+    monkeypatch.setattr(nodes, "get_structured_response", no_reply)
+    monkeypatch.setattr(nodes, "get_intent_classifier", lambda: None)
+
+    result = await ReplyGenerationWorkflow().process(
+        {"cast_text": "gm", "cast_summary": slow_summary(), "available_feeds": []}
+    )
+    await asyncio.sleep(0.6)
+
+    assert "cast_summary" not in result
+    assert result["reply"]["reply_text"] == "No response needed for this cast."
+    assert summary_finished == []
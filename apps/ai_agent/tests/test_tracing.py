@@ -0,0 +1,99 @@
+"""
+Tests for request tracing and Chrome trace export
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.models import llm
+from app.services import tracing
+from app.services.embedding_cache import EmbeddingCache
+from app.services.tracing import span, trace_request
+from app.workflows.user_summary import UserSummaryWorkflow
+
+USER_SUMMARY = {
+    "keywords": [{"topic": "frames", "weight": 0.9}],
+    "tone": "builder",
+    "channels": ["dev"],
+    "raw_summary": "Builds frames",
+}
+
+
+async def test_spans_nest_and_export_as_chrome_trace(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+
+    async def child(name):
+        with span(name, item=name):
+            await asyncio.sleep(0.01)
+
+    async with trace_request("/api/test", method="POST") as trace:
+        with span("outer") as outer:
+            outer.set(cache_hit=False)
+            await asyncio.gather(child("a"), child("b"))
+
+    # Outside a trace spans are no-ops
+    with span("ignored") as ignored:
+        ignored.set(anything=1)
+
+    [path] = tmp_path.iterdir()
+    exported = json.loads(path.read_text())
+    assert exported["otherData"]["trace_id"] == trace.trace_id
+
+    events = {e["name"]: e for e in exported["traceEvents"] if e["ph"] == "X"}
+    assert list(events) == ["/api/test", "outer", "a", "b"]
+    assert events["/api/test"]["args"] == {"method": "POST"}
+    assert events["outer"]["args"] == {"cache_hit": False}
+    assert events["a"]["dur"] >= 10_000
+    # Concurrent children run in their own tasks and get their own rows
+    assert len({events[name]["tid"] for name in ("outer", "a", "b")}) == 3
+    root, outer_event = events["/api/test"], events["outer"]
+    assert root["ts"] <= outer_event["ts"]
+    assert outer_event["ts"] + outer_event["dur"] <= root["ts"] + root["dur"]
+
+
+async def test_workflow_nodes_and_llm_calls_are_traced(monkeypatch):
+    async def create_completion(**kwargs):
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    message=SimpleNamespace(content=json.dumps(USER_SUMMARY))
+                )
+            ],
+            usage=SimpleNamespace(
+                prompt_tokens=30, completion_tokens=12, total_tokens=42
+            ),
+        )
+
+    async def create_embeddings(**kwargs):
+        return SimpleNamespace(
+            data=[
+                SimpleNamespace(index=i, embedding=[1.0, 0.0])
+                for i in range(len(kwargs["input"]))
+            ]
+        )
+
+    client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create_completion)),
+        embeddings=SimpleNamespace(create=create_embeddings),
+    )
+    monkeypatch.setattr(llm, "get_client", lambda: client)
+    monkeypatch.setattr(llm, "_embedding_cache", EmbeddingCache())
+    monkeypatch.setattr(llm, "EMBEDDINGS_COALESCE_WINDOW_MS", 0)
+
+    async with trace_request("/api/user-summary") as trace:
+        await UserSummaryWorkflow().run({"user_data": {"casts": ["gm"]}})
+
+    spans = {s.name: s for s in trace.spans}
+    assert list(spans) == [
+        "/api/user-summary",
+        "workflow.UserSummaryWorkflow",
+        "node.process_data",
+        "llm.chat",
+        "node.generate_embedding",
+        "llm.embeddings",
+        "llm.embeddings_request",
+    ]
+    assert spans["llm.chat"].attributes["model"] == llm.REASONING_MODEL
+    assert spans["llm.chat"].attributes["total_tokens"] == 42
+    assert spans["llm.embeddings"].attributes["cache_hit"] is False
+    assert all(s.end is not None for s in trace.spans)